@@ -0,0 +1,192 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from tracing import Counter, Gauge, Histogram, register
+
+# Requests answered at once, and how many may wait for a slot before new ones are turned away
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+# The same limits per API key, so one busy key can't take every slot
+ADMISSION_PER_KEY_ACTIVE = int(os.getenv("ADMISSION_PER_KEY_ACTIVE", "4"))
+ADMISSION_PER_KEY_QUEUE = int(os.getenv("ADMISSION_PER_KEY_QUEUE", "8"))
+# A queued request that waits longer than this gives up
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+# OpenAI calls in flight across all requests
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))
+
+ADMISSIONS = register(Counter("sovereign_admission_total", "Admission decisions.", ("result",)))
+ADMISSION_WAIT = register(Histogram("sovereign_admission_wait_seconds", "Time queued requests waited for a slot.", ()))
+ADMISSION_STATE = register(Gauge("sovereign_admission_requests", "Requests running and waiting.", ("state",)))
+
+class Overloaded(Exception):
+    """
+    Raised when a request can't be queued (queue full) or waited too long for a slot.
+    """
+
+def _key_id(api_key: str) -> str:
+    # Keys are only used for grouping; don't keep them in memory verbatim
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+class Ticket:
+    """
+    One request's place in the admission controller. `granted` once it may run; always release() when done
+    (releasing again is a no-op).
+    """
+
+    def __init__(self, controller, key: str):
+        self.controller = controller
+        self.key = key
+        self.granted = False
+        self.released = False
+        self.queued_at = time.perf_counter()
+        self._future = None
+
+    def position(self) -> int:
+        return self.controller._position(self)
+
+    async def wait(self, timeout: float = ADMISSION_QUEUE_TIMEOUT) -> float:
+        """
+        Wait until the request may run. Returns the seconds spent queued.
+        """
+        if not self.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._future), timeout)
+            except asyncio.TimeoutError:
+                self.release()
+                ADMISSIONS.inc(("timeout",))
+                raise Overloaded(f"Timed out after {timeout:.0f}s waiting for capacity")
+        return time.perf_counter() - self.queued_at
+
+    def release(self):
+        self.controller._release(self)
+
+class AdmissionController:
+    """
+    Bounded admission in front of the query pipeline.
+
+    A request runs immediately when a global slot and one of its key's slots are free. Otherwise it
+    waits in a FIFO queue; when a slot frees up, the oldest waiting request whose key is under its
+    limit runs next. When the global queue or the key's queue is full the request is refused at once
+    (the caller answers 503), so overload shows up as fast rejections rather than slow failures.
+
+    All methods are called from the event loop thread.
+    """
+
+    def __init__(self, max_active: int = ADMISSION_MAX_ACTIVE, max_queue: int = ADMISSION_MAX_QUEUE,
+                 per_key_active: int = ADMISSION_PER_KEY_ACTIVE, per_key_queue: int = ADMISSION_PER_KEY_QUEUE):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.per_key_active = per_key_active
+        self.per_key_queue = per_key_queue
+        self._active = 0
+        self._active_by_key = {}
+        self._waiting = deque()
+        self._waiting_by_key = {}
+
+    def _can_run(self, key: str) -> bool:
+        return self._active < self.max_active and self._active_by_key.get(key, 0) < self.per_key_active
+
+    def _grant(self, ticket: Ticket):
+        ticket.granted = True
+        self._active += 1
+        self._active_by_key[ticket.key] = self._active_by_key.get(ticket.key, 0) + 1
+
+    def _update_gauges(self):
+        ADMISSION_STATE.set(("active",), self._active)
+        ADMISSION_STATE.set(("waiting",), len(self._waiting))
+
+    def admit(self, api_key: str) -> Ticket:
+        """
+        Admit a request, queue it, or raise Overloaded without waiting.
+        """
+        ticket = Ticket(self, _key_id(api_key))
+        # Anything still waiting is blocked on its own key's limit (see _dispatch), so there is no one to overtake
+        if self._can_run(ticket.key):
+            self._grant(ticket)
+            ADMISSIONS.inc(("admitted",))
+        elif len(self._waiting) >= self.max_queue:
+            ADMISSIONS.inc(("rejected",))
+            raise Overloaded("Server is at capacity, please retry shortly")
+        elif self._waiting_by_key.get(ticket.key, 0) >= self.per_key_queue:
+            ADMISSIONS.inc(("rejected_key",))
+            raise Overloaded("Too many concurrent requests for this API key, please retry shortly")
+        else:
+            ticket._future = asyncio.get_running_loop().create_future()
+            self._waiting.append(ticket)
+            self._waiting_by_key[ticket.key] = self._waiting_by_key.get(ticket.key, 0) + 1
+            ADMISSIONS.inc(("queued",))
+        self._update_gauges()
+        return ticket
+
+    def _position(self, ticket: Ticket) -> int:
+        try:
+            return self._waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def _remove_waiting(self, ticket: Ticket):
+        self._waiting.remove(ticket)
+        self._waiting_by_key[ticket.key] -= 1
+        if not self._waiting_by_key[ticket.key]:
+            del self._waiting_by_key[ticket.key]
+
+    def _dispatch(self):
+        for ticket in list(self._waiting):
+            if self._active >= self.max_active:
+                break
+            if self._can_run(ticket.key):
+                self._remove_waiting(ticket)
+                self._grant(ticket)
+                ADMISSION_WAIT.observe((), time.perf_counter() - ticket.queued_at)
+                if not ticket._future.done():
+                    ticket._future.set_result(None)
+
+    def _release(self, ticket: Ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted:
+            self._active -= 1
+            self._active_by_key[ticket.key] -= 1
+            if not self._active_by_key[ticket.key]:
+                del self._active_by_key[ticket.key]
+            self._dispatch()
+        else:
+            self._remove_waiting(ticket)
+        self._update_gauges()
+
+    def stats(self) -> dict:
+        return {"active": self._active, "waiting": len(self._waiting), "keys": len(self._active_by_key)}
+
+_CONTROLLER = None
+_LLM_SEMAPHORE = None
+_EMBEDDING_SEMAPHORE = threading.BoundedSemaphore(EMBEDDING_CONCURRENCY)
+
+def get_admission_controller() -> AdmissionController:
+    global _CONTROLLER
+    if _CONTROLLER is None:
+        _CONTROLLER = AdmissionController()
+    return _CONTROLLER
+
+def llm_slot() -> asyncio.Semaphore:
+    """
+    Process-wide limit on concurrent LLM calls: `async with llm_slot(): ...`
+    """
+    global _LLM_SEMAPHORE
+    if _LLM_SEMAPHORE is None:
+        _LLM_SEMAPHORE = asyncio.Semaphore(LLM_CONCURRENCY)
+    return _LLM_SEMAPHORE
+
+@contextmanager
+def embedding_slot():
+    """
+    Process-wide limit on concurrent embedding calls. These run in executor threads, hence a thread semaphore.
+    """
+    with _EMBEDDING_SEMAPHORE:
+        yield
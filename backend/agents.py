@@ -1,13 +1,23 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from intent_router import FAST_ROUTER
+from repository import TICKER_TO_CIK, STORED_METRICS, canonical_metric_name, find_annual_value, annual_report_years
+from tracing import span, run_in_executor
+from admission import llm_slot
 import os
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# What a query is treated as when classification fails
+FALLBACK_INTENT = {"type": "rag", "companies": [], "metric": None, "year": 0}
+
 class QueryClassifier:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, router=FAST_ROUTER):
+        # Local fast path for unambiguous metric/comparison queries; None disables it
+        self.router = router
         self.llm = ChatOpenAI(
             model="gpt-4o",
             temperature=0,
@@ -31,11 +41,15 @@ class QueryClassifier:
         - "type": One of ["metric", "rag", "comparison"]
         - "companies": List of stock tickers usually found in the query (e.g., ["AAPL", "MSFT"]). If Apple is mentioned, use AAPL.
         - "metric": The financial metric requested (e.g., "Revenues", "NetIncomeLoss"). If unsure, guess the closest XBRL tag or standard name. None if not a metric query.
+        - "metrics": List of ALL financial metrics requested, in the order asked (e.g., ["Revenues", "NetIncomeLoss", "Assets"]). [] if none.
         - "year": The fiscal year requested as an integer (e.g., 2023). If asking for "latest" or "recent", return 2024. If not specified, return 0.
+        - "years": List of ALL specific fiscal years mentioned (e.g., [2022, 2023]). [] if none.
+        - "year_range": {{"start": 2019, "end": 2023}} for a range ("2019 to 2023", "last 5 years" counting back from 2024), otherwise null.
         
         Examples:
-        - "What was Apple's revenue in 2023?" -> {{"type": "metric", "companies": ["AAPL"], "metric": "Revenues", "year": 2023}}
-        - "What are the risks for Apple?" -> {{"type": "rag", "companies": ["AAPL"], "metric": null, "year": 2024}}
+        - "What was Apple's revenue in 2023?" -> {{"type": "metric", "companies": ["AAPL"], "metric": "Revenues", "metrics": ["Revenues"], "year": 2023, "years": [2023], "year_range": null}}
+        - "What are the risks for Apple?" -> {{"type": "rag", "companies": ["AAPL"], "metric": null, "metrics": [], "year": 2024, "years": [], "year_range": null}}
+        - "Analyze the Revenue, Net Income, and Total Assets for MSFT" -> {{"type": "metric", "companies": ["MSFT"], "metric": "Revenues", "metrics": ["Revenues", "NetIncomeLoss", "Assets"], "year": 0, "years": [], "year_range": null}}
         
         Return ONLY valid JSON.
         """
@@ -51,58 +65,234 @@ class QueryClassifier:
         """
         Classify the user query and return a structured dict.
         """
+        routed = self.router.route(query) if self.router else None
+        if routed:
+            return routed
         try:
             return self.chain.invoke({"query": query})
         except Exception as e:
             print(f"Classification failed: {e}")
             # Fallback
-            return {"type": "rag", "companies": [], "metric": None, "year": 0}
+            return dict(FALLBACK_INTENT)
+
+    async def aclassify(self, query: str) -> dict:
+        """
+        Async variant of classify, so it can run alongside the guardrail without blocking the event loop.
+        """
+        with span("classifier") as attrs:
+            routed = self.router.route(query) if self.router else None
+            if routed:
+                attrs["source"] = "fast_path"
+                return routed
+            attrs["source"] = "llm"
+            try:
+                async with llm_slot():
+                    return await self.chain.ainvoke({"query": query})
+            except Exception as e:
+                print(f"Classification failed: {e}")
+                attrs["fallback"] = True
+                # Fallback
+                return dict(FALLBACK_INTENT)
+
+    async def aclassify_many(self, queries: list, max_concurrency: int = 8) -> list:
+        """
+        aclassify for a list of queries, at most max_concurrency at once: fast path where it applies,
+        otherwise an LLM call under llm_slot like any other. Results follow the query order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def classify(query):
+            async with semaphore:
+                return await self.aclassify(query)
+
+        return list(await asyncio.gather(*(classify(q) for q in queries)))
+
+# Default comparison window. This prevents 2025/future years which have no data yet.
+DEFAULT_COMPARISON_YEARS = [2021, 2022, 2023]
+
+# Widest year range a plan may expand to (one companyfacts download covers them all, but the table doesn't)
+MAX_PLAN_YEARS = 10
+
+def build_query_plan(intent: dict) -> dict:
+    """
+    Companies x metrics x years for a metric/comparison intent.
+
+    Accepts the classifier's list fields ("metrics", "years", "year_range") and falls back to the
+    single "metric"/"year" fields, so older intents (and the fast path) still produce a plan.
+    A comparison over a single year also charts the two years before it, as comparisons always have.
+    """
+    companies = []
+    for company in intent.get("companies") or []:
+        if company and company.upper() not in companies:
+            companies.append(company.upper())
+
+    metrics = []
+    for metric in (intent.get("metrics") or []) + [intent.get("metric")]:
+        if metric and canonical_metric_name(metric) not in metrics:
+            metrics.append(canonical_metric_name(metric))
+
+    years = {int(y) for y in intent.get("years") or [] if y}
+    year_range = intent.get("year_range") or {}
+    if year_range.get("start") and year_range.get("end"):
+        start, end = sorted((int(year_range["start"]), int(year_range["end"])))
+        years.update(range(max(start, end - MAX_PLAN_YEARS + 1), end + 1))
+    if not years and intent.get("year"):
+        years = {int(intent["year"])}
+    # A comparison in a single year (from "year" or "years", both are filled in) charts the two years before it too
+    if intent.get("type") == "comparison" and len(years) == 1 and not year_range.get("start"):
+        year = years.pop()
+        years = {year - 2, year - 1, year}
+
+    return {
+        "companies": companies,
+        "metrics": metrics,
+        "years": sorted(years)[-MAX_PLAN_YEARS:] or list(DEFAULT_COMPARISON_YEARS)
+    }
+
+def _format_value(value) -> str:
+    if value is None:
+        return "—"
+    # Per-share figures need the cents; everything else is whole dollars
+    return f"${value:,.2f}" if abs(value) < 1000 else f"${value:,.0f}"
 
 class AnalysisAgent:
-    def generate_comparison_data(self, repo, companies, metric, years=None):
+    @staticmethod
+    def _chart(metric, years, companies, values, pending=()):
         """
-        Generates a structured dictionary for charting.
+        Chart payload in the shape FinancialChart expects. Cells of companies still loading are None.
         """
-        import json
         datasets = []
-        
-        # Ensure we have a list of years. Default to [2021, 2022, 2023] if not provided.
-        # This prevents 2025/future years which have no data yet.
-        if not years:
-            years = [2021, 2022, 2023]
-            
         for company in companies:
-            data_points = []
-            for year in years:
-                try:
-                    # Clean up the metric string from "$" etc if needed, but repo handles this.
-                    # This returns a string like "$383,285,000,000" or None
-                    val_str = repo.get_metric(company, metric, year)
-                    
-                    if val_str is None or val_str.startswith("Data not found"):
-                        data_points.append(0)
-                        continue
-
-                    # Parse string to float for charting
-                    # Remove '$', ',', and whitespace
-                    # Also remove the (Cached)/(Fetched) suffix
-                    clean_val = val_str.split('(')[0].replace('$', '').replace(',', '').strip()
-                    data_points.append(float(clean_val))
-                except:
-                    # If data missing or parse error, append 0
-                    data_points.append(0)
-            
-            datasets.append({
-                "name": company,
-                "data": data_points
-            })
-            
+            if company in pending:
+                data_points = [None for _ in years]
+            else:
+                data_points = [values.get((company, metric, year), 0) for year in years]
+            datasets.append({"name": company, "data": data_points})
         chart_data = {
             "type": "chart",
             "title": f"{metric} Comparison ({min(years)}-{max(years)})",
             "labels": [str(y) for y in years],
             "datasets": datasets
         }
-        
-        print(f"DEBUG: Generated Chart Data: {json.dumps(chart_data, indent=2)}")
+        if pending:
+            chart_data["pending"] = [c for c in companies if c in pending]
         return chart_data
+
+    @staticmethod
+    def table(plan: dict, values: dict) -> str:
+        """
+        Markdown table for a multi-metric plan: one row per company/metric, one column per year.
+        """
+        years = plan["years"]
+        single_company = len(plan["companies"]) == 1
+        header = ["Metric"] if single_company else ["Company", "Metric"]
+        lines = [
+            "| " + " | ".join(header + [str(y) for y in years]) + " |",
+            "|" + "---|" * (len(header) + len(years))
+        ]
+        for company in plan["companies"]:
+            for metric in plan["metrics"]:
+                row = [metric] if single_company else [company, metric]
+                row += [_format_value(values.get((company, metric, year))) for year in years]
+                lines.append("| " + " | ".join(row) + " |")
+        title = f"**{plan['companies'][0]}**\n\n" if single_company else ""
+        return title + "\n".join(lines)
+
+    async def stream_plan_data(self, repo, plan: dict):
+        """
+        Execute a query plan against an AsyncFinancialDataRepository.
+
+        All cached cells come from one DB query, and cells known to be unreported from another; neither
+        is fetched. Companies with missing cells are grouped by CIK (one companyfacts download covers every
+        metric and year) and fetched concurrently; the SEC rate limiter still caps request rate across the
+        executor threads. Cells still absent from a year's 10-K are recorded as unreported.
+        Yields (values, pending companies) as each company completes; values are keyed (company, metric, year).
+        """
+        companies, metrics, years = plan["companies"], plan["metrics"], plan["years"]
+        canonical = {metric: canonical_metric_name(metric) for metric in metrics}
+
+        # Unsupported tickers are left empty, like a failed lookup
+        cik_by_company = {c: TICKER_TO_CIK[c].zfill(10) for c in companies if c in TICKER_TO_CIK}
+        values = {}
+
+        ciks, names = sorted(set(cik_by_company.values())), sorted(set(canonical.values()))
+        try:
+            cached = await repo.get_cached_values(ciks, names, years)
+            unreported = await repo.get_unreported_cells(ciks, names, years)
+        except Exception as e:
+            print(f"Plan cache lookup failed: {e}")
+            cached, unreported = {}, set()
+
+        missing_by_cik = {}
+        companies_by_cik = {}
+        for company, cik in cik_by_company.items():
+            for metric in metrics:
+                for year in years:
+                    key = (cik, canonical[metric], year)
+                    if key in cached:
+                        values[(company, metric, year)] = cached[key]
+                    elif key not in unreported:
+                        missing_by_cik.setdefault(cik, set()).add((metric, year))
+            if cik in missing_by_cik:
+                companies_by_cik.setdefault(cik, []).append(company)
+
+        pending = {c for group in companies_by_cik.values() for c in group}
+        yield values, set(pending)
+        if not pending:
+            return
+
+        def extract(facts, missing):
+            found_cells = {}
+            for metric, year in missing:
+                found = find_annual_value(facts, metric, year)
+                if found is not None:
+                    found_cells[(metric, year)] = found
+            # A metric the year's 10-K doesn't carry won't appear later; one not filed yet might.
+            # EPS can't be read at all (see STORED_METRICS), which says nothing about the company.
+            filed = annual_report_years(facts)
+            not_reported = {(canonical[metric], year) for metric, year in missing
+                            if (metric, year) not in found_cells and year in filed and canonical[metric] in STORED_METRICS}
+            return found_cells, not_reported
+
+        async def fill_company(cik, group):
+            try:
+                facts = await repo.get_company_facts(cik)
+                # Scanning the facts payload is CPU work; keep it off the event loop too
+                found_cells, not_reported = await run_in_executor(extract, facts, missing_by_cik[cik])
+                # Persist under the canonical name, which is what the cache lookup queries
+                await repo.save_metrics(group[0], cik, {
+                    (canonical[metric], year): found for (metric, year), found in found_cells.items()
+                })
+                await repo.save_unreported(cik, not_reported)
+            except Exception as e:
+                print(f"Plan fetch failed for CIK {cik}: {e}")
+                found_cells = {}
+            for company in group:
+                for (metric, year), found in found_cells.items():
+                    values[(company, metric, year)] = found["val"]
+            return group
+
+        tasks = [asyncio.create_task(fill_company(cik, group)) for cik, group in companies_by_cik.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                pending.difference_update(await next_done)
+                yield values, set(pending)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_comparison_data(self, repo, companies, metric, years=None):
+        """
+        Single-metric plan rendered as a chart. Yields (chart, done): a partial chart as each
+        company completes, then the final chart with done=True.
+        """
+        plan = build_query_plan({"companies": companies, "metric": metric, "years": years})
+        companies, years = plan["companies"], plan["years"]
+        # Values come back keyed by the canonical name, whatever alias the caller used
+        metric = plan["metrics"][0] if plan["metrics"] else metric
+
+        values = {}
+        async for values, pending in self.stream_plan_data(repo, plan):
+            if pending and len(pending) < len(companies):
+                yield self._chart(metric, years, companies, values, pending), False
+        yield self._chart(metric, years, companies, values), True
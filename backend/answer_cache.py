@@ -0,0 +1,155 @@
+import os
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+from embedding_cache import normalize_query
+
+class SemanticAnswerCache:
+    """
+    Cache of synthesized RAG answers.
+
+    An entry is reused when a new query:
+      - has the same filters (companies/year the question is scoped to),
+      - retrieved exactly the same chunk ids (ids are content hashes, so unchanged chunks), and
+      - is within `threshold` cosine similarity of the cached query embedding
+        (or, without embeddings, is the same normalized text).
+    Bounded by LRU size and TTL; entries are dropped when any of their chunks is re-ingested away.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 6 * 3600, threshold: float = 0.95):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._entries = OrderedDict()   # entry id -> entry dict, in LRU order
+        self._buckets = {}              # (filters, chunk ids) -> set of entry ids
+        self._by_chunk = {}             # chunk id -> set of entry ids
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _bucket_key(filters: dict, chunk_ids: List[str]):
+        filters_key = tuple(sorted((k, str(v)) for k, v in (filters or {}).items()))
+        return filters_key, frozenset(chunk_ids)
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, query: str, embedding, filters: dict, chunk_ids: List[str]) -> Optional[str]:
+        bucket = self._bucket_key(filters, chunk_ids)
+        vector = self._normalize(embedding)
+        normalized = normalize_query(query)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, -1.0
+            for entry_id in list(self._buckets.get(bucket, ())):
+                entry = self._entries[entry_id]
+                if now - entry["created"] > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                if vector is not None and entry["vector"] is not None:
+                    score = float(entry["vector"] @ vector)
+                else:
+                    score = 1.0 if entry["query"] == normalized else 0.0
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                return self._entries[best_id]["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, query: str, embedding, filters: dict, chunk_ids: List[str], answer: str):
+        bucket = self._bucket_key(filters, chunk_ids)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "query": normalize_query(query),
+                "vector": self._normalize(embedding),
+                "bucket": bucket,
+                "answer": answer,
+                "created": time.time()
+            }
+            self._buckets.setdefault(bucket, set()).add(entry_id)
+            for chunk_id in bucket[1]:
+                self._by_chunk.setdefault(chunk_id, set()).add(entry_id)
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_chunks(self, chunk_ids: List[str]):
+        """
+        Drop every answer that was built from any of these chunks (called when they are re-ingested away).
+        """
+        with self._lock:
+            stale = set()
+            for chunk_id in chunk_ids:
+                stale.update(self._by_chunk.get(chunk_id, ()))
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._buckets.clear()
+            self._by_chunk.clear()
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        bucket = self._buckets.get(entry["bucket"])
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[entry["bucket"]]
+        for chunk_id in entry["bucket"][1]:
+            refs = self._by_chunk.get(chunk_id)
+            if refs is not None:
+                refs.discard(entry_id)
+                if not refs:
+                    del self._by_chunk[chunk_id]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+_SHARED_CACHE = None
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Process-wide answer cache (the Orchestrator is constructed per request).
+    """
+    global _SHARED_CACHE
+    if _SHARED_CACHE is None:
+        _SHARED_CACHE = SemanticAnswerCache(
+            maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600))),
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+        )
+    return _SHARED_CACHE
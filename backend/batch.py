@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+from agents import build_query_plan
+from repository import AsyncFinancialDataRepository
+from entity_resolver import get_entity_resolver
+from context_builder import RAG_TOP_K
+from admission import llm_slot
+
+# Data lookups / LLM syntheses in flight at once per batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+
+class SharedFactsRetriever:
+    """
+    Wraps SECDataRetriever so each company's facts are downloaded at most once per batch:
+    concurrent callers for the same CIK wait on the first download instead of starting their own.
+    """
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self._lock = threading.Lock()
+        self._facts = {}
+        self.downloads = 0
+
+    def get_company_facts(self, cik: str) -> dict:
+        key = cik.zfill(10)
+        with self._lock:
+            future = self._facts.get(key)
+            owner = future is None
+            if owner:
+                future = self._facts[key] = Future()
+                self.downloads += 1
+        if owner:
+            try:
+                future.set_result(self.retriever.get_company_facts(cik))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def __getattr__(self, name):
+        return getattr(self.retriever, name)
+
+class BatchRunner:
+    """
+    Answers many questions at once on one Orchestrator.
+
+    Identical (entity-normalized) questions are answered once. Guardrail and classification run per
+    unique question, `concurrency` at a time, each LLM call under llm_slot (classification takes the
+    fast path first, so most metric questions never reach the LLM). Identical metric lookups / plans
+    share one task, every RAG question shares one retrieval pass (one embedding call), and SEC facts
+    are downloaded once per company.
+    Answers are yielded as NDJSON lines in completion order, followed by one summary line.
+    """
+
+    def __init__(self, orchestrator, concurrency: int = BATCH_CONCURRENCY):
+        self.orchestrator = orchestrator
+        self.concurrency = concurrency
+        self.facts = SharedFactsRetriever(orchestrator.retriever)
+        # The orchestrator is per request, so pointing its repository at the shared facts is safe
+        orchestrator.async_repo = AsyncFinancialDataRepository(self.facts)
+
+    def _retrieve(self, queries: list) -> dict:
+        """
+        One retrieval pass for every RAG question: batched embedding, concurrent index lookups, one text fetch.
+        Each question's chunks are then assembled into its budgeted context.
+        """
+        vector_db = self.orchestrator.vector_db
+        builder = self.orchestrator.context_builder
+        embeddings = vector_db.embed_queries(queries) if vector_db.mode != "lexical" else [None] * len(queries)
+        results = vector_db.query_chunks_many(queries, top_k=RAG_TOP_K, query_embeddings=embeddings)
+        contexts = {}
+        for query, embedding, chunks in zip(queries, embeddings, results):
+            texts = [text for _, text in chunks]
+            context, context_stats = builder.build(texts)
+            contexts[query] = {
+                "embedding": embedding,
+                "chunk_ids": [chunk_id for chunk_id, _ in chunks],
+                "chunks": texts,
+                "context": context,
+                "context_stats": context_stats
+            }
+        return contexts
+
+    async def run(self, queries: list):
+        orch = self.orchestrator
+        started = time.perf_counter()
+        resolver = get_entity_resolver()
+        normalized = [resolver.normalize(q) for q in queries]
+        unique = list(dict.fromkeys(normalized))
+
+        safety, intents = await asyncio.gather(
+            orch.guardrail.check_safety_many(unique, self.concurrency),
+            orch.classifier.aclassify_many(unique, self.concurrency)
+        )
+
+        loop = asyncio.get_running_loop()
+        rag_queries = [q for q, s, i in zip(unique, safety, intents) if s.get("allowed", True) and i.get("type") == "rag"]
+        retrieval = loop.run_in_executor(None, self._retrieve, rag_queries) if rag_queries else None
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        shared = {}
+        context_tokens_saved = 0
+
+        async def run_plan(intent):
+            async with semaphore:
+                return await orch.run_plan(intent)
+
+        async def synthesize(query, intent, context):
+            cache_filters = {"companies": sorted(intent.get("companies") or []), "year": intent.get("year", 2024)}
+            cached = orch.answer_cache.lookup(query, context["embedding"], cache_filters, context["chunk_ids"])
+            if cached is not None:
+                return cached
+            async with semaphore, llm_slot():
+                response = await orch.llm.ainvoke(orch.rag_prompt(context["context"], query))
+            orch.answer_cache.store(query, context["embedding"], cache_filters, context["chunk_ids"], response.content)
+            return response.content
+
+        async def answer(query, safety_result, intent):
+            nonlocal context_tokens_saved
+            start = time.perf_counter()
+            payload = {"normalized_query": query, "type": intent.get("type")}
+            try:
+                if not safety_result.get("allowed", True):
+                    payload["type"] = "blocked"
+                    payload["result"] = f"I cannot answer that. {safety_result.get('reason', 'It is off-topic')}. I specialize in financial analysis."
+                elif intent.get("type") in ("metric", "comparison"):
+                    plan = build_query_plan(intent)
+                    kind = orch._plan_kind(intent, plan)
+                    # Same lookup asked by several questions (e.g. "AAPL revenue 2023" phrased differently): run it once
+                    key = json.dumps([kind, plan, intent.get("year") if kind == "single" else None], sort_keys=True)
+                    if key not in shared:
+                        shared[key] = asyncio.ensure_future(run_plan(intent))
+                    payload["result"] = await asyncio.shield(shared[key])
+                elif intent.get("type") == "rag":
+                    contexts = await retrieval
+                    context = contexts[query]
+                    if not context["chunks"]:
+                        payload["result"] = "I couldn't find any relevant documents."
+                    else:
+                        payload["context_tokens_saved"] = context["context_stats"]["tokens_saved"]
+                        context_tokens_saved += payload["context_tokens_saved"]
+                        payload["result"] = await synthesize(query, intent, context)
+                else:
+                    payload["result"] = "I'm not sure how to handle that request."
+            except Exception as e:
+                payload["error"] = str(e)
+            payload["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            return query, payload
+
+        indexes = {}
+        for i, query in enumerate(normalized):
+            indexes.setdefault(query, []).append(i)
+
+        tasks = [asyncio.create_task(answer(q, s, i)) for q, s, i in zip(unique, safety, intents)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                query, payload = await next_done
+                for i in indexes[query]:
+                    yield json.dumps({"index": i, "query": queries[i], **payload}) + "\n"
+        finally:
+            for task in tasks + list(shared.values()):
+                task.cancel()
+
+        yield json.dumps({"summary": {
+            "queries": len(queries),
+            "unique_queries": len(unique),
+            "fast_path": sum(1 for intent in intents if intent.get("source") == "fast_path"),
+            "data_lookups": len(shared),
+            "rag_queries": len(rag_queries),
+            "context_tokens_saved": context_tokens_saved,
+            "sec_downloads": self.facts.downloads,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }}) + "\n"
@@ -1,11 +1,19 @@
 import os
-import glob
+import time
 import logging
+import argparse
+import functools
 import asyncio
+import datetime
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from sec_edgar_downloader import Downloader
 from processor import SECFilingProcessor
+from retriever import SECDataRetriever
 from vector_store import VectorDB
+from filing_store import FilingStore, get_filing_store
+from ingest_manifest import IngestManifest
+from utils import TokenBucket
+from tracing import run_in_executor
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -21,102 +29,397 @@ TARGET_COMPANIES = {
     "AAPL": "320193"
 }
 
-# Directory to save filings
-DOWNLOAD_DIR = "sec_filings"
-
-async def ingest_company(ticker: str, cik: str):
-    processor = SECFilingProcessor()
-    vector_db = VectorDB()
-    
-    # Initialize Downloader
-    # email is required, getting from env or default
-    user_agent_str = os.getenv("USER_AGENT", "Saar agrawalsaar16@gmail.com")
-    try:
-        # Extract company name and email roughly from user agent string "Name Email"
-        # sec_edgar_downloader params: (company_name, email_address, download_folder)
-        parts = user_agent_str.split(" ")
-        company_name = parts[0]
-        email = parts[-1] 
-        dl = Downloader(company_name, email, DOWNLOAD_DIR)
-    except Exception as e:
-        logger.error(f"Error initializing downloader: {e}")
-        return
-
-    try:
-        logger.info(f"--- Processing {ticker} (CIK: {cik}) ---")
-        
-        # 1. Download Latest 10-K
-        logger.info(f"Downloading 10-K for {ticker}...")
-        # limit=1 gets the latest
-        num_downloaded = dl.get("10-K", ticker, limit=1)
-        
-        if num_downloaded == 0:
-            logger.warning(f"No 10-K found for {ticker}")
-            return
-            
-        # 2. Find the downloaded file
-        # Pattern: sec_filings/sec-edgar-filings/{ticker}/10-K/{accession_number}/primary-document.html
-        # or .txt depending on what it downloads. It usually downloads full text.
-        # Let's glob for it.
-        search_path = os.path.join(DOWNLOAD_DIR, "sec-edgar-filings", ticker, "10-K", "*", "*.txt")
-        # sec-edgar-downloader downloads the full text submission as .txt usually (or .html if specified, default is usually .txt which includes HTML)
-        files = glob.glob(search_path)
-        if not files:
-             # Try .html or .htm
-             search_path = os.path.join(DOWNLOAD_DIR, "sec-edgar-filings", ticker, "10-K", "*", "*.htm*")
-             files = glob.glob(search_path)
-        
-        if not files:
-            logger.error(f"Downloaded file not found on disk for {ticker}")
-            return
-            
-        # Take the first one found (latest)
-        file_path = files[0]
-        logger.info(f"Reading file: {file_path}")
-        
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            raw_text = f.read()
-        
-        # 3. Clean & Extract
-        logger.info("Cleaning HTML...")
-        clean_text = processor.clean_html(raw_text)
-        
-        logger.info("Extracting Risk Factors...")
-        risk_text = processor.extract_risk_factors(clean_text)
-        
-        # Fallback Check
-        if not risk_text or len(risk_text) < 2000:
-            logger.warning(f"Risk factor extraction failed or too short ({len(risk_text) if risk_text else 0} chars) for {ticker}. Falling back to FULL TEXT ingestion.")
-            risk_text = clean_text  # Use the whole document
-
-        # 4. Chunk
-        chunks = processor.chunk_text(risk_text)
-        logger.info(f"Generated {len(chunks)} text chunks.")
-        
-        # 5. Upsert to Pinecone
-        # We can extract year from file path or just use current year "2023" as placeholder for "latest"
-        year = "2023" 
-        
+# Forms ingested per company, and how many years of history
+INGEST_FORMS = tuple(f.strip() for f in os.getenv("INGEST_FORMS", "10-K,10-Q").split(",") if f.strip())
+INGEST_YEARS = int(os.getenv("INGEST_YEARS", "3"))
+
+# Filings waiting between two stages; a full queue makes the upstream stage wait, which bounds memory
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+# Filings downloaded at once; all downloads share the SEC rate limiter (10 req/s, see retriever.py)
+INGEST_DOWNLOAD_CONCURRENCY = int(os.getenv("INGEST_DOWNLOAD_CONCURRENCY", "4"))
+# Processes for splitting, cleaning and chunking (HTML parsing is CPU bound)
+INGEST_CPU_WORKERS = int(os.getenv("INGEST_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Embedding batches in flight, and the embedding model's tokens-per-minute budget
+INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "1000000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+# Filings written to the index at once
+INGEST_UPSERT_CONCURRENCY = int(os.getenv("INGEST_UPSERT_CONCURRENCY", "2"))
+
+# Risk factors shorter than this mean the section regex missed; fall back to the whole document
+MIN_RISK_FACTORS_CHARS = 2000
+
+_DONE = object()
+
+# --- CPU stages: run in worker processes, one SECFilingProcessor per process ---
+
+_PROCESSOR = None
+
+def _processor() -> SECFilingProcessor:
+    global _PROCESSOR
+    if _PROCESSOR is None:
+        _PROCESSOR = SECFilingProcessor()
+    return _PROCESSOR
+
+def split_filing(store_root: str, digest: str, form_type: str) -> str:
+    # Streams the submission out of the store: exhibits and images are skipped without being held in memory
+    with FilingStore(store_root).open_text(digest) as lines:
+        return _processor().extract_document(lines, form_type)
+
+def clean_filing(store_root: str, digest: str, document: str) -> tuple:
+    """
+    Clean the HTML and locate its sections, caching both next to the raw filing. Returns (text, sections).
+    """
+    processor = _processor()
+    clean_text = processor.clean_html(document)
+    sections = processor.find_sections(clean_text)
+    FilingStore(store_root).put_cleaned(digest, clean_text, sections)
+    return clean_text, sections
+
+def select_section(text: str, sections: dict) -> tuple:
+    """
+    The text to index: Item 1A when found, else the whole document. Returns (text, section).
+    """
+    if "risk_factors" in sections:
+        start, end = sections["risk_factors"]
+        if end - start >= MIN_RISK_FACTORS_CHARS:
+            return text[start:end], "risk_factors"
+    return text, "full_text"
+
+def chunk_section(text: str) -> list:
+    return _processor().chunk_text(text)
+
+def filing_key(ticker: str, year: int, period: str) -> str:
+    """
+    Index key of a filing's chunks: {ticker}_{year} for the annual report (the original key, so filings
+    indexed before quarters existed are reused), {ticker}_{year}_{Qn} for quarterly reports.
+    The annual key is a prefix of its quarters' keys; vector_store's legacy discovery relies on
+    matching whole positional ids ({filing_key}_{n}), never the bare prefix.
+    """
+    return f"{ticker}_{year}" if period == "FY" else f"{ticker}_{year}_{period}"
+
+def estimate_tokens(texts: list) -> int:
+    # ~4 characters per token for English text; close enough for rate limiting
+    return sum(len(t) for t in texts) // 4 + len(texts)
+
+class StageStats:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.failed = 0
+        self.units = 0
+        self.busy = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    @property
+    def wall(self) -> float:
+        if self.first_start is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def row(self) -> dict:
+        wall = self.wall
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "failed": self.failed,
+            "units": self.units,
+            "busy_s": round(self.busy, 2),
+            "wall_s": round(wall, 2),
+            "items_per_s": round(self.items / wall, 2) if wall else 0.0,
+            # Share of the stage's worker time spent working, over its active window
+            "utilization": round(self.busy / (wall * self.workers), 2) if wall else 0.0
+        }
+
+class Stage:
+    """
+    One pipeline stage: `workers` coroutines pulling from the inbox, running `fn` and pushing the result on.
+    `fn` returns the item for the next stage, a list of items (fan-out) or None (nothing to pass on).
+    An item whose `fn` raises goes to `on_error` and is dropped, so one bad filing doesn't stop the batch.
+    """
+
+    def __init__(self, name: str, fn, workers: int, on_error=None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.on_error = on_error
+        self.stats = StageStats(name, self.workers)
+
+    async def run(self, inbox: asyncio.Queue, outbox: asyncio.Queue = None):
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                started = time.perf_counter()
+                if self.stats.first_start is None:
+                    self.stats.first_start = started
+                try:
+                    result = await self.fn(item)
+                except Exception as e:
+                    self.stats.failed += 1
+                    if self.on_error is not None:
+                        self.on_error(self.name, item, e)
+                    continue
+                finally:
+                    ended = time.perf_counter()
+                    self.stats.busy += ended - started
+                    self.stats.last_end = ended
+                self.stats.items += 1
+                if result is None:
+                    continue
+                for out in (result if isinstance(result, list) else [result]):
+                    self.stats.units += out.pop("_units", 1)
+                    if outbox is not None:
+                        await outbox.put(out)
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+
+class IngestionPipeline:
+    """
+    Staged filing ingestion: list -> download -> split -> clean/section -> chunk -> embed -> upsert.
+
+    Stages are connected by bounded queues and each has its own concurrency limit, so while one filing
+    is being embedded the next is being parsed and a third downloaded. The batch takes roughly as long
+    as its slowest stage rather than the sum of all of them.
+
+    Progress is checkpointed in the ingestion manifest (see ingest_manifest.py). Filings already indexed
+    are skipped at the list stage, and chunks are written to the index one embedding batch at a time,
+    each batch committed to the chunk manifest, so an interrupted filing resumes after its last
+    committed batch: prepare_chunks only returns the chunks that never made it.
+    """
+
+    def __init__(self, form_types: tuple = INGEST_FORMS, years: int = INGEST_YEARS, since: str = None):
+        self.form_types = form_types
+        # Filings made in the last `years` years. Within that window, `since` narrows further:
+        # "manifest" takes only filings newer than the newest indexed one per company, a YYYY-MM-DD date those after it.
+        self.cutoff = (datetime.date.today() - datetime.timedelta(days=round(365.25 * years))).isoformat()
+        self.since = since
+        self.retriever = SECDataRetriever()
+        # One VectorDB (and OpenAI/Pinecone client) for the whole batch
+        self.vector_db = VectorDB()
+        self.manifest = IngestManifest()
+        # Raw filings and their cleaned text are kept locally, so re-runs and re-chunking skip SEC and HTML parsing
+        self.filing_store = get_filing_store()
+        self.cpu_pool = ProcessPoolExecutor(max_workers=INGEST_CPU_WORKERS)
+        self.embed_budget = TokenBucket(EMBEDDING_TPM)
+        self.skipped = []
+        self.indexed = []
+        self.stages = [
+            Stage("list", self.list_filings, INGEST_DOWNLOAD_CONCURRENCY, self._failed),
+            Stage("download", self.download, INGEST_DOWNLOAD_CONCURRENCY, self._failed),
+            Stage("split", self.split, INGEST_CPU_WORKERS, self._failed),
+            Stage("clean", self.clean, INGEST_CPU_WORKERS, self._failed),
+            Stage("chunk", self.chunk, INGEST_CPU_WORKERS, self._failed),
+            Stage("embed", self.embed, INGEST_EMBED_CONCURRENCY, self._failed),
+            Stage("upsert", self.upsert, INGEST_UPSERT_CONCURRENCY, self._failed)
+        ]
+
+    def _failed(self, stage: str, item: dict, error: Exception):
+        filing = item.get("filing", item)
+        logger.error(f"[{stage}] {filing['ticker']} {filing.get('accession', '')}: {error}")
+        if "accession" in filing:
+            self.manifest.fail(filing["accession"], f"{stage}: {error}")
+
+    async def _cpu(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_pool, fn, *args)
+
+    async def list_filings(self, item: dict) -> list:
+        since = self.manifest_dates.get(item["cik"]) if self.since == "manifest" else self.since
+        since = max(since or self.cutoff, self.cutoff)
+        filings = await run_in_executor(self.retriever.get_filings, item["cik"], self.form_types, since)
+        if not filings:
+            logger.info(f"{item['ticker']}: no {'/'.join(self.form_types)} filed since {since}.")
+
+        todo = []
+        for meta in filings:
+            known = await run_in_executor(self.manifest.get, meta["accessionNumber"])
+            if known is not None and known["stage"] == "indexed":
+                self.skipped.append(meta["accessionNumber"])
+                continue
+            # Fiscal year and period of the report, not the date it was filed (see retriever.fiscal_period)
+            filing = {**item, "accession": meta["accessionNumber"], "form": meta["form"], "filing_date": meta["filingDate"],
+                      "report_date": meta.get("reportDate"), "year": str(meta["fiscalYear"]), "period": meta["fiscalPeriod"]}
+            if known is None:
+                await run_in_executor(functools.partial(
+                    self.manifest.record, filing["accession"], "listed", cik=item["cik"], ticker=item["ticker"],
+                    form_type=meta["form"], filing_date=meta["filingDate"], report_date=meta.get("reportDate")))
+            else:
+                logger.info(f"{item['ticker']}: resuming {filing['accession']} after stage '{known['stage']}' "
+                            f"({known['batches_done']}/{known['batches_total'] or '?'} batches committed).")
+            todo.append(filing)
+        if len(todo) < len(filings):
+            logger.info(f"{item['ticker']}: {len(filings) - len(todo)} filing(s) already indexed, skipped.")
+        return todo
+
+    async def download(self, item: dict) -> dict:
+        stored = await run_in_executor(self.filing_store.get, item["accession"])
+        if stored is not None:
+            item["digest"] = stored["hash"]
+            item["_units"] = 0
+        else:
+            logger.info(f"Downloading {item['form']} {item['accession']} for {item['ticker']} ({item['period']} {item['year']})...")
+            raw = await run_in_executor(self.retriever.get_filing_text, item["cik"], item["accession"])
+            item["digest"] = await run_in_executor(functools.partial(
+                self.filing_store.put, raw, item["accession"], cik=item["cik"], form=item["form"],
+                report_date=item["report_date"], filing_date=item["filing_date"],
+                fiscal_year=int(item["year"]), fiscal_period=item["period"]))
+            item["_units"] = len(raw)
+        await run_in_executor(functools.partial(self.manifest.record, item["accession"], "downloaded", content_hash=item["digest"]))
+        return item
+
+    async def split(self, item: dict) -> dict:
+        item["cleaned"] = await run_in_executor(self.filing_store.get_cleaned, item["digest"])
+        item["document"] = None
+        item["_units"] = 0
+        # Cleaned text already cached: nothing to split or parse
+        if item["cleaned"] is None:
+            item["document"] = await self._cpu(split_filing, self.filing_store.root, item["digest"], item["form"])
+            item["_units"] = len(item["document"])
+        return item
+
+    async def clean(self, item: dict) -> dict:
+        cleaned, document = item.pop("cleaned"), item.pop("document")
+        if cleaned is None:
+            cleaned = await self._cpu(clean_filing, self.filing_store.root, item["digest"], document)
+        item["text"], section = select_section(*cleaned)
+        if section == "full_text":
+            logger.warning(f"Risk factor extraction failed or too short for {item['ticker']}. Falling back to FULL TEXT ingestion.")
+        item["section"] = section
+        item["_units"] = len(item["text"])
+        return item
+
+    async def chunk(self, item: dict) -> list:
+        """
+        Chunk the filing and diff it against the chunk manifest, then fan out one item per embedding batch.
+        A filing with nothing new still sends one (empty) batch, which applies its deletions.
+        """
+        chunks = await self._cpu(chunk_section, item.pop("text"))
         meta_base = {
-            "company": ticker,
-            "year": year,
-            "source": "10-K"
+            "company": item["ticker"],
+            "year": item["year"],
+            "period": item["period"],
+            "source": item["form"],
+            "filing_date": item["filing_date"],
+            "filing_key": filing_key(item["ticker"], item["year"], item["period"])
+        }
+        plan = await run_in_executor(self.vector_db.prepare_chunks, chunks, meta_base)
+        item["plan"] = plan
+        summary = plan["summary"]
+        logger.info(f"{plan['filing_key']}: {len(chunks)} chunks, {summary['added']} to embed, "
+                    f"{summary['unchanged']} already indexed, {summary['deleted']} stale.")
+
+        ids = plan["add_ids"]
+        starts = list(range(0, len(ids), EMBED_BATCH_SIZE)) or [0]
+        item["pending"] = len(starts)
+        # Distinct chunks (ids are content hashes): what the index holds for this filing once it is done
+        await run_in_executor(functools.partial(self.manifest.record, item["accession"], "chunked", filing_key=plan["filing_key"],
+                                                chunks=summary["added"] + summary["unchanged"], batches_total=len(starts), batches_done=0))
+        return [{
+            "filing": item,
+            "ids": ids[i:i + EMBED_BATCH_SIZE],
+            "texts": plan["add_texts"][i:i + EMBED_BATCH_SIZE],
+            "hashes": plan["add_hashes"][i:i + EMBED_BATCH_SIZE],
+            "_units": len(ids[i:i + EMBED_BATCH_SIZE])
+        } for i in starts]
+
+    async def embed(self, batch: dict) -> dict:
+        batch["embeddings"] = None
+        if batch["texts"] and self.vector_db.mode != "lexical":
+            await self.embed_budget.acquire(estimate_tokens(batch["texts"]))
+            batch["embeddings"] = await run_in_executor(self.vector_db.generate_embeddings, batch["texts"])
+        batch["_units"] = len(batch["texts"])
+        return batch
+
+    async def upsert(self, batch: dict) -> dict:
+        """
+        Write one batch and commit it to the chunk manifest. The filing's last batch also removes its
+        stale chunks (only once every new chunk is in) and marks the filing indexed.
+        """
+        filing = batch["filing"]
+        plan = filing["plan"]
+        batch_plan = {**plan, "add_ids": batch["ids"], "add_texts": batch["texts"], "add_hashes": batch["hashes"], "delete_ids": []}
+        await run_in_executor(self.vector_db.write_chunks, batch_plan, batch.pop("embeddings"))
+        await run_in_executor(self.manifest.batch_done, filing["accession"])
+
+        filing["pending"] -= 1
+        if filing["pending"] == 0:
+            if plan["delete_ids"]:
+                await run_in_executor(self.vector_db.write_chunks, {**plan, "add_ids": [], "add_texts": [], "add_hashes": []})
+            await run_in_executor(self.manifest.record, filing["accession"], "indexed")
+            logger.info(f"Indexed {plan['filing_key']} ({filing['accession']}): {plan['summary']}")
+            self.indexed.append(filing)
+        batch["_units"] = len(batch["ids"])
+        return batch
+
+    async def run(self, companies: dict) -> dict:
+        if self.since == "manifest":
+            self.manifest_dates = await run_in_executor(self.manifest.latest_filing_dates, self.form_types)
+        queues = [asyncio.Queue(maxsize=INGEST_QUEUE_SIZE) for _ in self.stages]
+
+        async def run_stage(i: int):
+            stage = self.stages[i]
+            outbox = queues[i + 1] if i + 1 < len(self.stages) else None
+            await stage.run(queues[i], outbox)
+            # Upstream is drained: tell every worker of the next stage to stop
+            if i + 1 < len(self.stages):
+                for _ in range(self.stages[i + 1].workers):
+                    await queues[i + 1].put(_DONE)
+
+        async def feed():
+            for ticker, cik in companies.items():
+                await queues[0].put({"ticker": ticker, "cik": cik.zfill(10)})
+            for _ in range(self.stages[0].workers):
+                await queues[0].put(_DONE)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(feed(), *(run_stage(i) for i in range(len(self.stages))))
+        finally:
+            self.cpu_pool.shutdown()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "companies": len(companies),
+            "indexed": len(self.indexed),
+            "skipped": len(self.skipped),
+            "elapsed_s": round(elapsed, 2),
+            "stages": [stage.stats.row() for stage in self.stages],
+            "filings": [{"ticker": f["ticker"], "form": f["form"], "year": f["year"], "period": f["period"], "accession": f["accession"],
+                         **f["plan"]["summary"]} for f in self.indexed]
         }
-        
-        vector_db.upsert_chunks(chunks, meta_base)
-        logger.info(f"Successfully indexed {ticker}!")
 
-    except Exception as e:
-        logger.error(f"Failed to ingest {ticker}: {e}")
+def print_report(report: dict):
+    print(f"\n{'stage':<10}{'workers':>8}{'items':>7}{'failed':>7}{'units':>11}{'busy s':>9}{'wall s':>9}{'items/s':>9}{'util':>7}")
+    for row in report["stages"]:
+        print(f"{row['stage']:<10}{row['workers']:>8}{row['items']:>7}{row['failed']:>7}{row['units']:>11}"
+              f"{row['busy_s']:>9.2f}{row['wall_s']:>9.2f}{row['items_per_s']:>9.2f}{row['utilization']:>7.2f}")
+    # With the stages overlapped, the batch should take about as long as the busiest stage per worker
+    slowest = max(report["stages"], key=lambda r: r["busy_s"] / r["workers"])
+    print(f"\n{report['indexed']} filings indexed, {report['skipped']} already indexed, in {report['elapsed_s']:.2f}s "
+          f"(slowest stage: {slowest['stage']}, {slowest['busy_s'] / slowest['workers']:.2f}s per worker)")
 
-async def main():
+async def main(companies: dict = TARGET_COMPANIES, form_types: tuple = INGEST_FORMS, years: int = INGEST_YEARS, since: str = None):
     logger.info("Starting Batch Ingestion...")
-    if not os.path.exists(DOWNLOAD_DIR):
-        os.makedirs(DOWNLOAD_DIR)
-        
-    for ticker, cik in TARGET_COMPANIES.items():
-        await ingest_company(ticker, cik)
+    report = await IngestionPipeline(form_types, years, since).run(companies)
+    print_report(report)
     logger.info("Batch Ingestion Complete.")
+    return report
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Ingest SEC filings into the retrieval index.")
+    parser.add_argument("--since", nargs="?", const="manifest", default=None, metavar="YYYY-MM-DD",
+                        help="Incremental mode: only filings newer than the newest already indexed per company "
+                             "(or than the given date), within the --years window.")
+    parser.add_argument("--years", type=int, default=INGEST_YEARS, help="Years of filing history per company.")
+    parser.add_argument("--forms", default=",".join(INGEST_FORMS), help="Comma-separated form types, e.g. 10-K,10-Q.")
+    parser.add_argument("--tickers", help="Comma-separated subset of the target companies.")
+    args = parser.parse_args()
+    companies = TARGET_COMPANIES
+    if args.tickers:
+        companies = {t: TARGET_COMPANIES[t] for t in args.tickers.upper().split(",")}
+    forms = tuple(f.strip() for f in args.forms.split(",") if f.strip())
+    asyncio.run(main(companies, forms, args.years, args.since))
@@ -0,0 +1,387 @@
+"""
+Benchmark: /chat end to end under concurrent load, fully offline.
+
+The real app (uvicorn main:app) runs in a subprocess against the stand-ins from fake_services.py:
+FakeOpenAI for the guardrail, classifier, synthesis and embedding calls (configurable time to first
+token, per-token delay and jitter), FakeEdgar for companyfacts, the in-process vector index
+(VECTOR_BACKEND=local) seeded with the fixture corpus, and a scratch SQLite database.
+A concurrent async client then drives /chat with the queries of fixtures/intent_queries.json:
+
+  metric       single-number lookups
+  rag          qualitative questions: retrieval + streamed synthesis
+  comparison   multi-company charts
+  mixed        all three, weighted by MIX
+
+Scenarios share one server and run in that order, so later ones find metrics already in the database.
+Per scenario: throughput, p50/p95/p99 time to first event (TTFE) and to the result event (TTR),
+time to first token for RAG answers, errors and 503s, and the server's event-loop lag (from the
+sovereign_event_loop_lag_seconds histogram on /metrics). Results are compared with the stored baseline
+(fixtures/chat_baseline.json): a scenario fails if TTFE/TTR p50 or mean loop lag grow, or throughput
+drops, by more than --tolerance (plus an absolute slack, see GATED), or it has more errors. Exits non-zero on regression.
+
+Usage: python bench_chat.py [--requests 120] [--concurrency 16] [--chat-latency-ms 300] [--update-baseline] [--output report.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "fixtures", "chat_baseline.json")
+QUERIES_PATH = os.path.join(BACKEND_DIR, "fixtures", "intent_queries.json")
+CORPUS_PATH = os.path.join(BACKEND_DIR, "fixtures", "retrieval_corpus.json")
+
+SCENARIOS = ("metric", "rag", "comparison", "mixed")
+MIX = {"metric": 0.5, "rag": 0.3, "comparison": 0.2}
+
+# Result events that mean the request failed, even though the stream itself completed
+ERROR_RESULTS = ("An error occurred", "Error fetching metric", "The service is busy")
+
+# Compared with the baseline, with the absolute slack (ms) under which a change is run-to-run noise.
+# Latencies are gated on p50: over ~100 requests a p95 rests on the slowest handful and swings by 4x
+# between identical runs. Lag is gated on its mean for the same reason, and still doubles at times.
+GATED = {"ttfe_p50_ms": 50.0, "ttr_p50_ms": 200.0, "loop_lag_mean_ms": 15.0}
+
+def load_queries() -> dict:
+    with open(QUERIES_PATH) as f:
+        fixtures = json.load(f)
+    queries = {kind: [] for kind in MIX}
+    for item in fixtures:
+        queries[item["expected"]["type"]].append(item["query"])
+    return queries
+
+def build_workload(scenario: str, queries: dict, n_requests: int, seed: int) -> list:
+    rng = random.Random(seed)
+    if scenario != "mixed":
+        return [rng.choice(queries[scenario]) for _ in range(n_requests)]
+    kinds, weights = zip(*MIX.items())
+    return [rng.choice(queries[rng.choices(kinds, weights)[0]]) for _ in range(n_requests)]
+
+def seed_index():
+    """
+    Child process: tables plus the fixture corpus in the local vector index, embedded through FakeOpenAI.
+    """
+    from init_db import init_db
+    from vector_store import VectorDB
+
+    init_db()
+    with open(CORPUS_PATH) as f:
+        documents = json.load(f)["documents"]
+    by_company = {}
+    for doc in documents:
+        by_company.setdefault(doc["company"], []).append(doc["text"])
+    db = VectorDB(api_key=os.environ["OPENAI_API_KEY"])
+    for company, texts in by_company.items():
+        db.upsert_chunks(texts, {"company": company, "year": 2023, "filing_key": f"{company}_2023", "source": "fixture"})
+
+# --- server ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(env: dict, log_path: str, timeout: float = 60.0):
+    """
+    uvicorn main:app on a free port; returns (process, base url) once /health answers.
+    """
+    port = _free_port()
+    log = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1) as response:
+                response.read()
+                return server, url
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited before answering /health, see {log_path}")
+            time.sleep(0.05)
+    server.terminate()
+    raise TimeoutError(f"/health did not answer within {timeout:.0f}s")
+
+def scrape_loop_lag(url: str) -> dict:
+    """
+    Cumulative bucket counts (upper bound -> count), sum and count of the server's event-loop lag histogram.
+    """
+    with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+        text = response.read().decode("utf-8")
+    buckets = {}
+    for bound, count in re.findall(r'sovereign_event_loop_lag_seconds_bucket\{le="([^"]+)"\} (\d+)', text):
+        buckets[float(bound)] = int(count)
+    total = re.search(r"sovereign_event_loop_lag_seconds_sum (\S+)", text)
+    count = re.search(r"sovereign_event_loop_lag_seconds_count (\d+)", text)
+    return {"buckets": buckets, "sum": float(total.group(1)) if total else 0.0, "count": int(count.group(1)) if count else 0}
+
+def histogram_quantile(q: float, buckets: dict) -> float:
+    """
+    Prometheus-style quantile from cumulative buckets, interpolating linearly inside the bucket.
+    """
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if not total:
+        return 0.0
+    rank, previous_bound, previous_count = q * total, 0.0, 0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / max(count - previous_count, 1)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+def lag_between(before: dict, after: dict) -> dict:
+    buckets = {bound: count - before["buckets"].get(bound, 0) for bound, count in after["buckets"].items()}
+    samples = after["count"] - before["count"]
+    return {
+        "loop_lag_samples": samples,
+        "loop_lag_mean_ms": round((after["sum"] - before["sum"]) / samples * 1000, 2) if samples else 0.0,
+        "loop_lag_p50_ms": round(histogram_quantile(0.5, buckets) * 1000, 2),
+        "loop_lag_p99_ms": round(histogram_quantile(0.99, buckets) * 1000, 2)
+    }
+
+# --- client ---
+
+async def chat(client, url: str, query: str, api_key: str) -> dict:
+    """
+    One /chat request, reading the SSE stream to the end. Times are ms from sending the request.
+    """
+    import httpx
+
+    record = {"query": query, "status": None, "ttfe_ms": None, "ttft_ms": None, "ttr_ms": None, "events": 0, "error": None}
+    started = time.perf_counter()
+    try:
+        async with client.stream("POST", f"{url}/chat", json={"query": query},
+                                 headers={"Authorization": f"Bearer {api_key}"}) as response:
+            record["status"] = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                record["error"] = f"HTTP {response.status_code}"
+                return record
+            buffer = ""
+            async for text in response.aiter_text():
+                buffer += text
+                while "\n\n" in buffer:
+                    raw, buffer = buffer.split("\n\n", 1)
+                    if not raw.strip():
+                        continue
+                    event = json.loads(raw)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    record["events"] += 1
+                    if record["ttfe_ms"] is None:
+                        record["ttfe_ms"] = elapsed
+                    if event["type"] == "token" and record["ttft_ms"] is None:
+                        record["ttft_ms"] = elapsed
+                    elif event["type"] == "result":
+                        record["ttr_ms"] = elapsed
+                        if isinstance(event["data"], str) and event["data"].startswith(ERROR_RESULTS):
+                            record["error"] = event["data"][:200]
+    except httpx.HTTPError as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    if record["error"] is None and record["ttr_ms"] is None:
+        record["error"] = "Stream ended without a result event"
+    return record
+
+async def run_load(url: str, workload: list, concurrency: int) -> tuple:
+    """
+    `concurrency` virtual users, each with its own API key, sending the next query as soon as
+    the previous answer has finished streaming. Returns (records, wall seconds).
+    """
+    import httpx
+
+    pending = iter(workload)
+    records = []
+
+    async def user(client, i):
+        for query in pending:
+            records.append(await chat(client, url, query, f"sk-load-{i}"))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0), limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(client, i) for i in range(concurrency)))
+        wall = time.perf_counter() - started
+    return records, wall
+
+def _percentiles(values: list, name: str) -> dict:
+    if not values:
+        return {}
+    return {f"{name}_p{q}_ms": round(float(np.percentile(values, q)), 1) for q in (50, 95, 99)}
+
+def summarize(records: list, wall: float) -> dict:
+    ok = [r for r in records if r["error"] is None]
+    result = {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "rejected": sum(1 for r in records if r["status"] == 503),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 2) if wall else 0.0
+    }
+    result.update(_percentiles([r["ttfe_ms"] for r in ok], "ttfe"))
+    result.update(_percentiles([r["ttr_ms"] for r in ok], "ttr"))
+    result.update(_percentiles([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None], "ttft"))
+    return result
+
+def run_scenarios(args) -> dict:
+    from fake_services import FakeEdgar, FakeOpenAI
+
+    queries = load_queries()
+    work_dir = tempfile.mkdtemp(prefix="bench_chat_")
+    edgar = FakeEdgar(years=args.years, latency_ms=args.sec_latency_ms, jitter_ms=args.jitter_ms)
+    openai = FakeOpenAI(embed_latency_ms=args.embed_latency_ms, jitter_ms=args.jitter_ms,
+                        chat_latency_ms=args.chat_latency_ms, chat_ms_per_token=args.chat_ms_per_token,
+                        answer_tokens=args.answer_tokens)
+    results = {}
+    server = None
+    try:
+        with edgar, openai:
+            env = dict(os.environ)
+            env.update({
+                "SEC_DATA_URL": edgar.url,
+                "SEC_ARCHIVES_URL": edgar.url,
+                "OPENAI_BASE_URL": f"{openai.url}/v1",
+                "OPENAI_API_KEY": "sk-bench",
+                "USER_AGENT": "bench-chat bench@example.com",
+                "VECTOR_BACKEND": "local",
+                "RETRIEVAL_MODE": "hybrid",
+                "LOCAL_INDEX_DIR": os.path.join(work_dir, "index"),
+                "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+                "QUERY_LOG_PATH": os.path.join(work_dir, "queries.log"),
+                "WARMUP_ENABLED": "false",
+                # Repeated questions would otherwise be answered from cache instead of synthesized
+                "ANSWER_CACHE_SIZE": env.get("ANSWER_CACHE_SIZE", "512") if args.answer_cache else "0"
+            })
+            env.pop("ASYNC_DATABASE_URL", None)
+            os.makedirs(env["LOCAL_INDEX_DIR"], exist_ok=True)
+
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--seed-index"],
+                                 cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+            if out.returncode != 0:
+                raise RuntimeError(f"Seeding the index failed:\n{out.stderr[-4000:]}")
+
+            log_path = os.path.join(work_dir, "server.log")
+            server, url = start_server(env, log_path)
+            try:
+                # First request of each kind pays the lazy imports (LangChain, vector stack); keep it out of the numbers
+                asyncio.run(run_load(url, [queries[kind][0] for kind in MIX], 1))
+
+                for scenario in args.scenarios:
+                    workload = build_workload(scenario, queries, args.requests, args.seed)
+                    sec_before, openai_before, lag_before = edgar.requests, openai.requests, scrape_loop_lag(url)
+                    records, wall = asyncio.run(run_load(url, workload, args.concurrency))
+                    result = summarize(records, wall)
+                    result.update(lag_between(lag_before, scrape_loop_lag(url)))
+                    result["sec_requests"] = edgar.requests - sec_before
+                    result["openai_requests"] = openai.requests - openai_before
+                    result["sample_errors"] = sorted({r["error"] for r in records if r["error"]})[:5]
+                    results[scenario] = result
+            except Exception:
+                with open(log_path) as f:
+                    print(f.read()[-4000:], file=sys.stderr)
+                raise
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def print_results(results: dict):
+    print(f"\n{'scenario':<11}{'ok':>5}{'err':>5}{'503':>5}{'req/s':>8}"
+          f"{'TTFE p50':>10}{'p95':>8}{'p99':>8}{'TTR p50':>10}{'p95':>8}{'p99':>8}{'TTFT p50':>10}{'lag p50':>9}{'p99':>7}")
+    for scenario, r in results.items():
+        ttft = f"{r['ttft_p50_ms']:>10.0f}" if "ttft_p50_ms" in r else f"{'-':>10}"
+        print(f"{scenario:<11}{r['ok']:>5}{r['errors']:>5}{r['rejected']:>5}{r['throughput_rps']:>8.2f}"
+              f"{r.get('ttfe_p50_ms', 0):>10.0f}{r.get('ttfe_p95_ms', 0):>8.0f}{r.get('ttfe_p99_ms', 0):>8.0f}"
+              f"{r.get('ttr_p50_ms', 0):>10.0f}{r.get('ttr_p95_ms', 0):>8.0f}{r.get('ttr_p99_ms', 0):>8.0f}"
+              f"{ttft}{r['loop_lag_p50_ms']:>9.1f}{r['loop_lag_p99_ms']:>7.1f}")
+        for error in r["sample_errors"]:
+            print(f"  error: {error}")
+    print("\nTimes in ms from sending the request. Lag = how late the server's event loop ran a timer.")
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Regressions against the baseline, as messages.
+    """
+    failures = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        for key, slack in GATED.items():
+            if key in result and key in base and result[key] > base[key] * (1 + tolerance) + slack:
+                failures.append(f"{scenario}: {key} {result[key]} > baseline {base[key]} (+{tolerance:.0%} +{slack:.0f} ms)")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            failures.append(f"{scenario}: throughput_rps {result['throughput_rps']} < baseline {base['throughput_rps']} (-{tolerance:.0%})")
+        if result["errors"] > base["errors"]:
+            failures.append(f"{scenario}: {result['errors']} errors > baseline {base['errors']}")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=120, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients, each with its own API key")
+    parser.add_argument("--chat-latency-ms", type=float, default=300, help="Fake LLM time to first token")
+    parser.add_argument("--chat-ms-per-token", type=float, default=5)
+    parser.add_argument("--answer-tokens", type=int, default=150, help="Length of the fake RAG answer")
+    parser.add_argument("--embed-latency-ms", type=float, default=80)
+    parser.add_argument("--sec-latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--years", type=int, default=6, help="Fiscal years of facts served by the fake EDGAR")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on (off by default)")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for the query workload")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    # Tail latency under load moves ~25% between identical runs; looser than bench_ingest's 0.3
+    parser.add_argument("--tolerance", type=float, default=float(os.getenv("CHAT_BENCH_TOLERANCE", "0.5")))
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--seed-index", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed_index:
+        seed_index()
+        sys.exit(0)
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    print(f"--- /chat Load Test ({args.requests} requests x {args.concurrency} clients per scenario, "
+          f"LLM {args.chat_latency_ms:.0f} ms + {args.chat_ms_per_token:.0f} ms/token) ---")
+    results = run_scenarios(args)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "seed_index"}, "results": results}, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        sys.exit(0)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = compare(results, baseline, args.tolerance)
+    if not baseline:
+        print("\nNo baseline to compare against (run with --update-baseline to create one)")
+    print("\nFAIL:\n  " + "\n  ".join(failures) if failures else "\nPASS")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,70 @@
+"""
+Benchmark: Entity normalization latency vs alias count.
+
+Compares the old per-alias regex loop with the trie-based EntityResolver at 100 / 1k / 10k aliases.
+Synthetic aliases are added on top of ENTITY_ALIASES so the real queries still resolve.
+"""
+import re
+import time
+import numpy as np
+from entity_resolver import ENTITY_ALIASES, EntityResolver
+
+QUERIES = [
+    "What was Apple's revenue in 2023?",
+    "Compare Google, Microsoft and Nvidia net income",
+    "What are the main risk factors for Tesla?",
+    "Show me Meta Platforms total assets for fiscal year 2022 and explain the trend",
+    "How did Amazon describe competition in its latest 10-K?"
+]
+REPEATS = 20
+
+def synthetic_aliases(n: int) -> dict:
+    rng = np.random.default_rng(0)
+    stems = ["Acme", "Global", "United", "First", "Pacific", "Atlas", "Summit", "Pioneer", "Vertex", "Harbor"]
+    kinds = ["Industries", "Systems", "Energy", "Bancorp", "Therapeutics", "Networks", "Foods", "Motors"]
+    aliases = dict(ENTITY_ALIASES)
+    i = 0
+    while len(aliases) < n:
+        name = f"{stems[rng.integers(len(stems))]} {kinds[rng.integers(len(kinds))]} {i}"
+        aliases[name] = f"X{i:05d}"
+        i += 1
+    return aliases
+
+def regex_loop_normalize(query: str, aliases: dict) -> str:
+    """
+    The previous Orchestrator._normalize_query_entities: compile and apply one regex per alias per query.
+    """
+    normalized_query = query
+    for alias, ticker in aliases.items():
+        pattern = re.compile(re.escape(alias), re.IGNORECASE)
+        normalized_query = pattern.sub(ticker, normalized_query)
+    return normalized_query
+
+def time_per_query(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        for q in QUERIES:
+            start = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return float(np.percentile(samples, 50))
+
+def run_benchmark():
+    print("--- Entity Resolver Benchmark ---")
+    print(f"{'Aliases':>8} {'Build ms':>9} {'Trie µs':>9} {'Regex loop µs':>14}")
+    for n in (100, 1000, 10000):
+        aliases = synthetic_aliases(n)
+
+        start = time.perf_counter()
+        resolver = EntityResolver.build(aliases=aliases)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        trie_us = time_per_query(resolver.normalize, REPEATS)
+        # The regex loop gets slow quickly; fewer repeats keep the run short
+        regex_us = time_per_query(lambda q: regex_loop_normalize(q, aliases), max(1, REPEATS * 100 // n))
+        print(f"{n:>8,} {build_ms:>9.1f} {trie_us:>9.1f} {regex_us:>14.1f}")
+
+    print("\nSample:", EntityResolver.build().normalize("Pineapple prices vs Apple's revenue"))
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,164 @@
+"""
+Benchmark: event-loop lag while serving concurrent metric lookups.
+
+Compares three ways of calling the repository from the event loop:
+  - sync_on_loop:     FinancialDataRepository called directly in the coroutine (the old behaviour)
+  - sync_in_executor: FinancialDataRepository offloaded with run_in_executor, one session per call
+  - async_repo:       AsyncFinancialDataRepository (AsyncSession + executor only for the SEC fetch)
+
+A monitor task sleeps in short ticks and records how late it wakes up; that lateness is what every
+other stream in the worker (e.g. SSE token delivery) would experience. The SEC API is replaced by a
+stub with fixed latency so runs are deterministic and offline.
+
+Usage: python bench_event_loop.py [--requests 200] [--concurrency 50] [--miss-rate 0.2] [--database-url URL]
+"""
+import os
+import io
+import time
+import asyncio
+import argparse
+import contextlib
+import tempfile
+import numpy as np
+
+TICK_S = 0.005
+SEC_LATENCY_S = 0.15
+METRICS = ["Revenue", "Net Income", "Total Assets", "Gross Profit", "Operating Income", "EPS"]
+YEARS = list(range(2015, 2025))
+
+class StubSECRetriever:
+    """
+    Stands in for SECDataRetriever: blocking call with fixed latency, returns a minimal companyfacts payload.
+    """
+
+    def get_company_facts(self, cik: str) -> dict:
+        time.sleep(SEC_LATENCY_S)
+        us_gaap = {}
+        for tag in ["Revenues", "NetIncomeLoss", "Assets", "GrossProfit", "OperatingIncomeLoss", "EarningsPerShareBasic"]:
+            units = [{"end": f"{y}-12-31", "fy": y, "form": "10-K", "val": 1000 * y} for y in range(2000, 2030)]
+            us_gaap[tag] = {"units": {"USD": units}}
+        return {"facts": {"us-gaap": us_gaap}}
+
+def build_workload(n_requests: int, miss_rate: float, seed: int = 7):
+    """
+    (ticker, metric, year) lookups; roughly `miss_rate` of them are absent from the seeded table.
+    """
+    from repository import TICKER_TO_CIK
+    rng = np.random.default_rng(seed)
+    tickers = list(TICKER_TO_CIK)
+    workload = []
+    for i in range(n_requests):
+        ticker = tickers[rng.integers(len(tickers))]
+        metric = METRICS[rng.integers(len(METRICS))]
+        # Misses use years outside the seeded range, unique per request so they stay misses
+        year = int(1900 + i) if rng.random() < miss_rate else int(YEARS[rng.integers(len(YEARS))])
+        workload.append((ticker, metric, year))
+    return workload
+
+def reset_database():
+    from database import Base, engine, SessionLocal, init_db
+    from models import Company, FinancialMetric
+    from repository import TICKER_TO_CIK
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    with SessionLocal() as session:
+        for ticker, cik in TICKER_TO_CIK.items():
+            session.add(Company(cik=cik.zfill(10), ticker=ticker, name=f"{ticker} Inc."))
+            for metric in METRICS:
+                for year in YEARS:
+                    session.add(FinancialMetric(
+                        company_cik=cik.zfill(10), metric_name=metric, value=1000.0 * year,
+                        fiscal_year=year, fiscal_period='FY', form_type='10-K'
+                    ))
+        session.commit()
+
+async def monitor_lag(stop: asyncio.Event, lags: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(TICK_S)
+        lags.append((loop.time() - start - TICK_S) * 1000)
+
+async def run_scenario(name: str, workload, concurrency: int) -> dict:
+    from database import SessionLocal
+    from repository import FinancialDataRepository, AsyncFinancialDataRepository
+
+    retriever = StubSECRetriever()
+    async_repo = AsyncFinancialDataRepository(retriever)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    def sync_lookup(ticker, metric, year):
+        with SessionLocal() as session:
+            return FinancialDataRepository(session, retriever).get_metric(ticker, metric, year)
+
+    async def one(ticker, metric, year):
+        async with semaphore:
+            start = time.perf_counter()
+            if name == "sync_on_loop":
+                sync_lookup(ticker, metric, year)
+            elif name == "sync_in_executor":
+                await loop.run_in_executor(None, sync_lookup, ticker, metric, year)
+            else:
+                await async_repo.get_metric(ticker, metric, year)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*item) for item in workload))
+    wall = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    return {
+        "scenario": name,
+        "wall_s": wall,
+        "throughput": len(workload) / wall,
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "lag_p50_ms": float(np.percentile(lags, 50)) if lags else 0.0,
+        "lag_p99_ms": float(np.percentile(lags, 99)) if lags else 0.0,
+        "lag_max_ms": max(lags) if lags else 0.0
+    }
+
+async def run_benchmark(n_requests: int, concurrency: int, miss_rate: float):
+    from database import ASYNC_DATABASE_URL, dispose_async_engine
+
+    print("--- Event Loop Lag Benchmark ---")
+    print(f"DB: {ASYNC_DATABASE_URL} | Requests: {n_requests} | Concurrency: {concurrency} | "
+          f"Miss rate: {miss_rate:.0%} | Stub SEC latency: {SEC_LATENCY_S * 1000:.0f} ms")
+
+    workload = build_workload(n_requests, miss_rate)
+    results = []
+    for name in ("sync_on_loop", "sync_in_executor", "async_repo"):
+        reset_database()
+        # The repository's DEBUG prints would drown the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.append(await run_scenario(name, workload, concurrency))
+    await dispose_async_engine()
+
+    print(f"\n{'Scenario':<17} {'Wall s':>7} {'Req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'Lag p50':>8} {'Lag p99':>8} {'Lag max':>8}")
+    for r in results:
+        print(f"{r['scenario']:<17} {r['wall_s']:>7.2f} {r['throughput']:>7.1f} {r['latency_p50_ms']:>8.1f} "
+              f"{r['latency_p95_ms']:>8.1f} {r['lag_p50_ms']:>8.2f} {r['lag_p99_ms']:>8.2f} {r['lag_max_ms']:>8.1f}")
+    print("\nLag = how late a 5 ms timer fires; every other stream on this worker waits that long.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--miss-rate", type=float, default=0.2)
+    parser.add_argument("--database-url", help="Scratch database only: tables are dropped and re-seeded. Defaults to a temp SQLite file")
+    args = parser.parse_args()
+
+    # database.py reads DATABASE_URL at import time, so set it before anything imports it
+    tmp_dir = tempfile.mkdtemp(prefix="bench_event_loop_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+
+    asyncio.run(run_benchmark(args.requests, args.concurrency, args.miss_rate))
@@ -0,0 +1,255 @@
+"""
+Benchmark: filing ingestion end to end, fully offline.
+
+batch_ingest (and ingest.py) run unchanged against local stand-ins from fake_services.py: a stub EDGAR
+server serving generated 10-K/10-Q submissions, a fake OpenAI embeddings endpoint (deterministic vectors,
+configurable latency) and the in-process vector index (VECTOR_BACKEND=local). Scenarios:
+
+  cold         empty store and index: every filing is downloaded, parsed, embedded and written
+  warm         same state again: every filing is already indexed and skipped
+  store        fresh index over the filled filing store: no SEC downloads, no HTML parsing, everything re-embedded
+  single       ingest.py, one filing
+  incremental  10-Qs first, then an incremental run (since="manifest") picking up the 10-Ks filed after them;
+               stages are those of the second run
+
+Each scenario runs in its own interpreter and reports wall time, peak RSS (itself and its CPU workers),
+per-stage throughput and calls made to the stand-ins. Results are compared with the stored baseline
+(fixtures/ingest_baseline.json): a scenario fails if wall time or peak memory grow by more than
+--tolerance (plus an absolute slack, see GATED). Per-stage throughput is reported, not gated. Whatever
+the baseline, a scenario also fails if the index it leaves behind does not hold exactly the chunks each
+filing produced. Exits non-zero on regression.
+
+Usage: python bench_ingest.py [--companies 6] [--years 2] [--embed-latency-ms 150] [--update-baseline] [--output report.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "fixtures", "ingest_baseline.json")
+
+SCENARIOS = ("cold", "warm", "store", "single", "incremental")
+
+# Compared with the baseline, with the absolute slack under which a change is run-to-run noise.
+# Stage throughput is not gated: most stages are active well under a second, and their items/s
+# halved between identical runs.
+GATED = {"wall_s": 1.0, "peak_rss_mb": 25.0}
+
+def _companies(n: int) -> dict:
+    from batch_ingest import TARGET_COMPANIES
+
+    companies = dict(list(TARGET_COMPANIES.items())[:n])
+    # Beyond the real list, synthetic companies; the stub serves any CIK
+    for i in range(len(companies), n):
+        companies[f"CO{i:03d}"] = str(9000000 + i)
+    return companies
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux; CPU stage workers are children
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, workers) / 1024, 1)
+
+def check_index() -> list:
+    """
+    Filing keys whose indexed chunks differ from what ingestion produced, as messages. The manifest records
+    each filing's distinct chunk count; the chunk manifest, the vector index and the BM25 index (reloaded
+    from disk) must each hold exactly those chunks, and nothing else.
+    """
+    from database import SessionLocal, init_db
+    from models import IndexedChunk, IngestedFiling
+    from lexical_index import BM25Index
+    from local_vector_index import LocalVectorIndex
+
+    # ingest.py keeps no ingestion manifest, so its table may not exist yet
+    init_db()
+    with SessionLocal() as session:
+        chunk_ids = {}
+        for row in session.query(IndexedChunk):
+            chunk_ids.setdefault(row.filing_key, set()).add(row.chunk_id)
+        # The latest filing under a key (e.g. an amendment) is the one its chunks come from
+        produced = {}
+        for row in session.query(IngestedFiling).filter(IngestedFiling.stage == "indexed").order_by(IngestedFiling.updated_at):
+            produced[row.filing_key] = row.chunks
+
+    vectors = LocalVectorIndex(quantization=os.getenv("VECTOR_QUANTIZATION", "int8"))
+    lexical = BM25Index() if os.getenv("RETRIEVAL_MODE", "hybrid") != "vector" else None
+    problems = []
+    for key in sorted(set(chunk_ids) | set(produced)):
+        ids = chunk_ids.get(key, set())
+        if key in produced and len(ids) != produced[key]:
+            problems.append(f"{key}: {len(ids)} chunks indexed, {produced[key]} produced")
+        missing = sum(1 for chunk_id in ids if chunk_id not in vectors or (lexical is not None and chunk_id not in lexical))
+        if missing:
+            problems.append(f"{key}: {missing} chunks missing from the indexes")
+    total = sum(len(ids) for ids in chunk_ids.values())
+    if len(vectors) != total or (lexical is not None and len(lexical) != total):
+        problems.append(f"index holds {len(vectors)} vectors / {len(lexical) if lexical is not None else '-'} documents, "
+                        f"chunk manifest {total}")
+    return problems
+
+def run_child(scenario: str, companies: int, years: int) -> dict:
+    """
+    One scenario in this (fresh) interpreter; the environment was prepared by the parent.
+    """
+    started = time.perf_counter()
+    if scenario == "single":
+        import ingest
+        ingest.run_ingestion()
+        report = {"stages": []}
+    elif scenario == "incremental":
+        import batch_ingest
+        # A year's 10-Qs are indexed before its 10-K is filed; the 10-K's key is a prefix of theirs
+        first = asyncio.run(batch_ingest.main(_companies(companies), form_types=("10-Q",), years=years))
+        report = asyncio.run(batch_ingest.main(_companies(companies), form_types=("10-K",), years=years, since="manifest"))
+        report["indexed"] += first["indexed"]
+        report["skipped"] += first["skipped"]
+    else:
+        import batch_ingest
+        report = asyncio.run(batch_ingest.main(_companies(companies), years=years))
+    wall_s = round(time.perf_counter() - started, 2)
+    return {
+        "wall_s": wall_s,
+        "peak_rss_mb": _peak_rss_mb(),
+        "indexed": report.get("indexed", 1),
+        "skipped": report.get("skipped", 0),
+        "stages": report["stages"],
+        "index_problems": check_index()
+    }
+
+def _scenario_env(base: dict, work_dir: str, index_name: str) -> dict:
+    env = dict(base)
+    env.update({
+        "LOCAL_INDEX_DIR": os.path.join(work_dir, index_name),
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, index_name, 'bench.db')}"
+    })
+    os.makedirs(env["LOCAL_INDEX_DIR"], exist_ok=True)
+    return env
+
+def run_scenarios(args) -> dict:
+    from fake_services import FakeEdgar, FakeOpenAI
+
+    work_dir = tempfile.mkdtemp(prefix="bench_ingest_")
+    edgar = FakeEdgar(years=args.years + 1, filing_kb=args.filing_kb, latency_ms=args.sec_latency_ms, jitter_ms=args.jitter_ms)
+    openai = FakeOpenAI(embed_latency_ms=args.embed_latency_ms, embed_ms_per_1k_tokens=args.embed_ms_per_1k_tokens, jitter_ms=args.jitter_ms)
+    results = {}
+    try:
+        with edgar, openai:
+            base_env = dict(os.environ)
+            base_env.update({
+                "SEC_DATA_URL": edgar.url,
+                "SEC_ARCHIVES_URL": edgar.url,
+                "OPENAI_BASE_URL": f"{openai.url}/v1",
+                "OPENAI_API_KEY": "sk-bench",
+                "USER_AGENT": "bench-ingest bench@example.com",
+                "VECTOR_BACKEND": "local",
+                "RETRIEVAL_MODE": "hybrid",
+                # The stub has no rate limit; the budget is a benchmark knob rather than the production default
+                "EMBEDDING_TPM": str(args.embedding_tpm),
+                # Shared by every scenario; "store" reuses what "cold" downloaded
+                "FILING_STORE_DIR": os.path.join(work_dir, "filings")
+            })
+            indexes = {"cold": "index", "warm": "index", "store": "index_store", "single": "index_single",
+                       "incremental": "index_incremental"}
+            for scenario in args.scenarios:
+                env = _scenario_env(base_env, work_dir, indexes[scenario])
+                sec_before, embed_before = edgar.requests, openai.requests
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", scenario,
+                     "--companies", str(args.companies), "--years", str(args.years)],
+                    cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+                )
+                if out.returncode != 0:
+                    raise RuntimeError(f"Scenario '{scenario}' failed:\n{out.stderr[-4000:]}")
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                result["sec_requests"] = edgar.requests - sec_before
+                result["embedding_requests"] = openai.requests - embed_before
+                results[scenario] = result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def print_results(results: dict):
+    for scenario, result in results.items():
+        print(f"\n[{scenario}] {result['wall_s']:.2f}s wall, {result['peak_rss_mb']:.0f} MB peak RSS, "
+              f"{result['indexed']} indexed, {result['skipped']} skipped, "
+              f"{result['sec_requests']} SEC requests, {result['embedding_requests']} embedding requests")
+        for problem in result["index_problems"]:
+            print(f"  index: {problem}")
+        if result["stages"]:
+            print(f"  {'stage':<10}{'items':>7}{'units':>11}{'busy s':>9}{'wall s':>9}{'items/s':>9}{'util':>7}")
+            for row in result["stages"]:
+                print(f"  {row['stage']:<10}{row['items']:>7}{row['units']:>11}{row['busy_s']:>9.2f}"
+                      f"{row['wall_s']:>9.2f}{row['items_per_s']:>9.2f}{row['utilization']:>7.2f}")
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Regressions against the baseline, as messages. Index problems fail a scenario with or without a baseline.
+    """
+    failures = []
+    for scenario, result in results.items():
+        failures.extend(f"{scenario}: {problem}" for problem in result.get("index_problems", []))
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        for key, slack in GATED.items():
+            if result[key] > base[key] * (1 + tolerance) + slack:
+                failures.append(f"{scenario}: {key} {result[key]} > baseline {base[key]} (+{tolerance:.0%} +{slack:g})")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=6)
+    parser.add_argument("--years", type=int, default=2, help="Years of 10-K/10-Q history ingested per company")
+    parser.add_argument("--filing-kb", type=int, default=200, help="Approximate size of each 10-K's main document")
+    parser.add_argument("--sec-latency-ms", type=float, default=30)
+    parser.add_argument("--embed-latency-ms", type=float, default=150)
+    parser.add_argument("--embed-ms-per-1k-tokens", type=float, default=2)
+    parser.add_argument("--embedding-tpm", type=int, default=20_000_000)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=float(os.getenv("INGEST_BENCH_TOLERANCE", "0.3")))
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Keep stdout's last line for the JSON result
+        result = run_child(args.child, args.companies, args.years)
+        sys.stdout.flush()
+        print(json.dumps(result))
+        sys.exit(0)
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    print(f"--- Ingestion Benchmark ({args.companies} companies, {args.years} years of 10-K/10-Q) ---")
+    results = run_scenarios(args)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "child"}, "results": results}, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        sys.exit(0)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = compare(results, baseline, args.tolerance)
+    if not baseline:
+        print("\nNo baseline to compare against (run with --update-baseline to create one)")
+    print("\nFAIL:\n  " + "\n  ".join(failures) if failures else "\nPASS")
+    sys.exit(1 if failures else 0)
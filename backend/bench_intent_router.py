@@ -0,0 +1,102 @@
+"""
+Benchmark: Local fast-path intent router vs labels (and vs the GPT-4o classifier, if OPENAI_API_KEY is set).
+
+Reports fast-path hit rate, routing latency, and how often fast-path answers agree with
+the labeled intent and with the LLM on the same queries. Queries marked "fast_path": false in the
+fixture must fall back to the LLM (the fast path would answer a different question).
+"""
+import os
+import json
+import time
+import numpy as np
+from dotenv import load_dotenv
+from intent_router import FastIntentRouter
+from repository import METRIC_ALIASES, canonical_metric_name
+from entity_resolver import get_entity_resolver
+
+load_dotenv()
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "intent_queries.json")
+
+def canonical_metric(metric):
+    """
+    Map an LLM/XBRL-style metric name onto the METRIC_ALIASES key it belongs to.
+    """
+    if not metric:
+        return None
+    metric = canonical_metric_name(metric)
+    for canonical, tags in METRIC_ALIASES.items():
+        if metric == canonical or metric in tags:
+            return canonical
+    return metric
+
+def same_intent(a: dict, b: dict) -> bool:
+    if a.get("type") != b.get("type"):
+        return False
+    if [c.upper() for c in a.get("companies") or []] != [c.upper() for c in b.get("companies") or []]:
+        return False
+    if a.get("type") == "rag":
+        return True
+    # Query plans: compare every requested metric, not just the first
+    metrics_a = [canonical_metric(m) for m in a.get("metrics") or [a.get("metric")]]
+    metrics_b = [canonical_metric(m) for m in b.get("metrics") or [b.get("metric")]]
+    return metrics_a == metrics_b and int(a.get("year") or 0) == int(b.get("year") or 0)
+
+def run_benchmark():
+    print("--- Fast-Path Intent Router Benchmark ---")
+    with open(FIXTURE_PATH) as f:
+        labeled = json.load(f)
+
+    # Same entity normalization handle_query applies before classification
+    resolver = get_entity_resolver()
+    router = FastIntentRouter()
+
+    hits, agree_label, latencies = [], 0, []
+    must_fall_back, fell_back = sum(1 for item in labeled if item.get("fast_path") is False), 0
+    for item in labeled:
+        query = resolver.normalize(item["query"])
+        start = time.perf_counter()
+        routed = router.route(query)
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+        status = "LLM fallback"
+        if not routed and item.get("fast_path") is False:
+            fell_back += 1
+        if routed:
+            hits.append((query, routed, item["expected"]))
+            if item.get("fast_path") is False:
+                status = f"fast path ❌ expected LLM fallback, got {routed}"
+            elif same_intent(routed, item["expected"]):
+                agree_label += 1
+                status = "fast path ✅"
+            else:
+                status = f"fast path ❌ {routed}"
+        print(f" {status:<14} | {item['query']}")
+
+    print(f"\nQueries:                 {len(labeled)}")
+    print(f"Fast-path hit rate:      {len(hits) / len(labeled):.1%}")
+    print(f"Agreement with labels:   {agree_label}/{len(hits)} fast-path answers")
+    print(f"Expected LLM fallbacks:  {fell_back}/{must_fall_back}")
+    print(f"Routing latency p50/p99: {np.percentile(latencies, 50):.1f} / {np.percentile(latencies, 99):.1f} µs")
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("\nOPENAI_API_KEY not set: skipping agreement with the LLM classifier.")
+        return
+
+    from agents import QueryClassifier
+    classifier = QueryClassifier(api_key=os.getenv("OPENAI_API_KEY"), router=None)
+    agree_llm, llm_latencies = 0, []
+    for query, routed, _ in hits:
+        start = time.perf_counter()
+        llm_intent = classifier.classify(query)
+        llm_latencies.append((time.perf_counter() - start) * 1000)
+        if same_intent(routed, llm_intent):
+            agree_llm += 1
+        else:
+            print(f" Disagreement: '{query}' fast={routed} llm={llm_intent}")
+
+    print(f"\nAgreement with GPT-4o:   {agree_llm}/{len(hits)} fast-path answers")
+    print(f"LLM classify p50:        {np.percentile(llm_latencies, 50):.0f} ms (time saved per fast-path hit)")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,136 @@
+"""
+Benchmark: LocalVectorIndex quantization modes (none / int8 / binary).
+
+Builds a synthetic clustered corpus, computes exact ground truth, then loads the index in a
+fresh subprocess per mode so resident memory is measured in isolation.
+Reports recall@10, query latency and resident memory for each mode.
+
+Usage: python bench_quantization.py [--n 100000] [--dim 1536] [--queries 200]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from local_vector_index import LocalVectorIndex, QUANTIZATION_MODES
+
+TOP_K = 10
+
+def rss_mb() -> float:
+    """
+    Current resident set size in MB (Linux), falling back to peak RSS elsewhere.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def build_corpus(index_dir: str, n: int, dim: int, n_queries: int):
+    """
+    Clustered embeddings (like real chunks from the same filing section) plus perturbed queries.
+    """
+    rng = np.random.default_rng(42)
+    centers = rng.standard_normal((max(n // 500, 8), dim)).astype(np.float32)
+    index = LocalVectorIndex(path=index_dir, dim=dim, quantization="none")
+
+    batch = 10000
+    for start in range(0, n, batch):
+        size = min(batch, n - start)
+        assignment = rng.integers(0, len(centers), size)
+        vectors = centers[assignment] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+        index.add([f"chunk_{i}" for i in range(start, start + size)], vectors)
+
+    sample = rng.choice(n, n_queries, replace=False)
+    stored = np.memmap(os.path.join(index_dir, "vectors.f32"), dtype=np.float32, mode="r", shape=(n, dim))
+    queries = np.asarray(stored[np.sort(sample)]) + 0.05 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+
+    ground_truth = [[doc_id for doc_id, _ in index.search(q, top_k=TOP_K)] for q in queries]
+    return queries, ground_truth
+
+def run_worker(index_dir: str, dim: int, mode: str, queries_path: str, truth_path: str):
+    queries = np.load(queries_path)
+    with open(truth_path) as f:
+        ground_truth = json.load(f)
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    index = LocalVectorIndex(path=index_dir, dim=dim, quantization=mode)
+    load_s = time.perf_counter() - start
+
+    latencies = []
+    recall = []
+    for q, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        hits = index.search(q, top_k=TOP_K)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recall.append(len({doc_id for doc_id, _ in hits} & set(truth)) / TOP_K)
+
+    print(json.dumps({
+        "mode": mode,
+        "recall_at_10": float(np.mean(recall)),
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "load_s": load_s,
+        "codes_mb": index.resident_bytes() / 2**20,
+        "rss_delta_mb": rss_mb() - rss_before
+    }))
+
+def run_benchmark(n: int, dim: int, n_queries: int):
+    print("--- Quantized Vector Index Benchmark ---")
+    print(f"Vectors: {n:,} x {dim} | Queries: {n_queries} | float32 size: {n * dim * 4 / 2**20:,.0f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_dir = os.path.join(tmp_dir, "vectors")
+        start = time.perf_counter()
+        queries, ground_truth = build_corpus(index_dir, n, dim, n_queries)
+        print(f"Corpus + exact ground truth built in {time.perf_counter() - start:.1f}s")
+
+        queries_path = os.path.join(tmp_dir, "queries.npy")
+        truth_path = os.path.join(tmp_dir, "truth.json")
+        np.save(queries_path, queries)
+        with open(truth_path, "w") as f:
+            json.dump(ground_truth, f)
+
+        # Build codes for every mode up front so workers only measure load + query
+        for mode in QUANTIZATION_MODES:
+            LocalVectorIndex(path=index_dir, dim=dim, quantization=mode)
+
+        results = []
+        for mode in QUANTIZATION_MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, "--dir", index_dir, "--dim", str(dim),
+                 "--queries-path", queries_path, "--truth-path", truth_path],
+                capture_output=True, text=True, check=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"\n{'Mode':<8} {'Recall@10':>10} {'p50 ms':>9} {'p95 ms':>9} {'Codes MB':>9} {'RSS +MB':>9}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['recall_at_10']:>10.3f} {r['latency_p50_ms']:>9.2f} {r['latency_p95_ms']:>9.2f} "
+              f"{r['codes_mb']:>9.1f} {r['rss_delta_mb']:>9.1f}")
+    print("\n'none' scans the memory-mapped float32 file directly, so its cost is page cache rather than process heap;")
+    print("it only stays fast while the whole file fits in RAM.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--worker", choices=QUANTIZATION_MODES)
+    parser.add_argument("--dir")
+    parser.add_argument("--queries-path")
+    parser.add_argument("--truth-path")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.dir, args.dim, args.worker, args.queries_path, args.truth_path)
+    else:
+        run_benchmark(args.n, args.dim, args.queries)
@@ -0,0 +1,100 @@
+"""
+Benchmark: Retrieval latency and quality on the fixture corpus.
+
+Lexical (BM25) mode runs fully offline. If OPENAI_API_KEY is set, the fixture corpus is
+also embedded in memory so vector-only and hybrid (RRF) rankings can be compared.
+"""
+import os
+import json
+import time
+import tempfile
+import numpy as np
+from dotenv import load_dotenv
+from lexical_index import BM25Index
+from vector_store import reciprocal_rank_fusion
+
+load_dotenv()
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "retrieval_corpus.json")
+TOP_K = 3
+CANDIDATES = 20
+
+def evaluate(name: str, rank_fn, queries: list):
+    latencies = []
+    recall_hits = 0
+    reciprocal_ranks = []
+
+    for q in queries:
+        start = time.perf_counter()
+        ranked = rank_fn(q["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        relevant = set(q["relevant"])
+        if relevant & set(ranked[:TOP_K]):
+            recall_hits += 1
+        rr = 0.0
+        for rank, doc_id in enumerate(ranked, start=1):
+            if doc_id in relevant:
+                rr = 1.0 / rank
+                break
+        reciprocal_ranks.append(rr)
+
+    print(f"\n[{name}]")
+    print(f" Hit@{TOP_K}:       {recall_hits / len(queries):.2%}")
+    print(f" MRR:          {sum(reciprocal_ranks) / len(queries):.3f}")
+    print(f" Latency p50:  {np.percentile(latencies, 50):.3f} ms")
+    print(f" Latency p95:  {np.percentile(latencies, 95):.3f} ms")
+
+def run_benchmark():
+    print("--- Retrieval Benchmark (fixture corpus) ---")
+    with open(FIXTURE_PATH) as f:
+        fixture = json.load(f)
+    docs = fixture["documents"]
+    queries = fixture["queries"]
+    print(f"Documents: {len(docs)} | Queries: {len(queries)}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = BM25Index(path=os.path.join(tmp_dir, "bm25.npz"))
+        start = time.perf_counter()
+        index.add_documents([d["id"] for d in docs], [d["text"] for d in docs])
+        index.save()
+        build_ms = (time.perf_counter() - start) * 1000
+        index_size = os.path.getsize(index.path)
+
+        # Reload from disk so the benchmark exercises the stored format
+        index = BM25Index(path=index.path)
+        print(f"BM25 build+save: {build_ms:.1f} ms | Index size on disk: {index_size:,} bytes")
+
+        def lexical_rank(query):
+            return [doc_id for doc_id, _ in index.search(query, top_k=CANDIDATES)]
+
+        evaluate("Lexical (BM25, offline)", lexical_rank, queries)
+
+        if not os.getenv("OPENAI_API_KEY"):
+            print("\nOPENAI_API_KEY not set: skipping vector and hybrid modes.")
+            return
+
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+        def embed(texts):
+            response = client.embeddings.create(input=texts, model="text-embedding-3-small")
+            vectors = np.array([d.embedding for d in response.data], dtype=np.float32)
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        doc_vectors = embed([d["text"] for d in docs])
+        doc_ids = [d["id"] for d in docs]
+
+        def vector_rank(query):
+            scores = doc_vectors @ embed([query])[0]
+            return [doc_ids[i] for i in np.argsort(-scores)[:CANDIDATES]]
+
+        def hybrid_rank(query):
+            return reciprocal_rank_fusion([vector_rank(query), lexical_rank(query)])
+
+        # Latencies for these two include the OpenAI embedding round trip
+        evaluate("Vector (in-memory cosine)", vector_rank, queries)
+        evaluate("Hybrid (RRF)", hybrid_rank, queries)
+
+if __name__ == "__main__":
+    run_benchmark()
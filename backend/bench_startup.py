@@ -0,0 +1,128 @@
+"""
+Benchmark: cold start of the API (what a serverless deploy pays before answering).
+
+  1. Import time of `main`, measured in a fresh interpreter: wall time (median of --repeats) and the
+     heaviest top-level packages from `python -X importtime`.
+  2. Heavy modules loaded by `import main` alone: LLM, vector and HTML stacks should only load on the
+     request paths that need them.
+  3. Time to first byte: spawn uvicorn and time until GET /health answers.
+
+Exits non-zero when import time or TTFB exceed their thresholds, or a heavy module is imported eagerly,
+so it can guard against regressions in CI.
+
+Usage: python bench_startup.py [--repeats 5] [--max-import-ms 800] [--max-ttfb-ms 3000]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Must not be imported by `import main`
+HEAVY_MODULES = ["langchain_openai", "langchain_core", "openai", "pinecone", "sqlalchemy", "bs4", "numpy", "tiktoken"]
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("USER_AGENT", "bench-startup bench@example.com")
+    return env
+
+def import_wall_ms() -> float:
+    code = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def import_profile(top: int = 10) -> list:
+    """
+    (package, cumulative ms) for the heaviest top-level imports, from -X importtime.
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True)
+    packages = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Top-level entries are those imported directly by the interpreter or main (least indentation)
+        depth = len(name) - len(name.lstrip())
+        if depth <= 3:
+            package = name.strip().split(".")[0]
+            packages[package] = max(packages.get(package, 0), int(cumulative) / 1000)
+    return sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+
+def heavy_modules_loaded() -> list:
+    code = f"import sys, json, main; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_to_first_byte(timeout: float = 30.0) -> float:
+    """
+    Seconds from spawning uvicorn until /health returns its first byte.
+    """
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    response.read(1)
+                    return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited before answering /health")
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def run_benchmark(repeats: int, max_import_ms: float, max_ttfb_ms: float) -> bool:
+    print("--- Startup Benchmark ---")
+    samples = [import_wall_ms() for _ in range(repeats)]
+    import_ms = statistics.median(samples)
+    print(f"import main: {import_ms:.0f} ms median ({min(samples):.0f}-{max(samples):.0f} ms over {repeats} runs)")
+
+    print("\nHeaviest imports (cumulative ms, -X importtime):")
+    for package, ms in import_profile():
+        print(f"  {package:<24} {ms:>8.1f}")
+
+    heavy = heavy_modules_loaded()
+    print(f"\nHeavy modules loaded by `import main`: {', '.join(heavy) if heavy else 'none'}")
+
+    ttfb_ms = time_to_first_byte() * 1000
+    print(f"Time to first byte (spawn -> /health): {ttfb_ms:.0f} ms")
+
+    failures = []
+    if import_ms > max_import_ms:
+        failures.append(f"import time {import_ms:.0f} ms > {max_import_ms:.0f} ms")
+    if ttfb_ms > max_ttfb_ms:
+        failures.append(f"TTFB {ttfb_ms:.0f} ms > {max_ttfb_ms:.0f} ms")
+    if heavy:
+        failures.append(f"eager heavy imports: {', '.join(heavy)}")
+
+    print("\nFAIL: " + "; ".join(failures) if failures else "\nPASS")
+    return not failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=float(os.getenv("STARTUP_MAX_IMPORT_MS", "800")))
+    parser.add_argument("--max-ttfb-ms", type=float, default=float(os.getenv("STARTUP_MAX_TTFB_MS", "3000")))
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.repeats, args.max_import_ms, args.max_ttfb_ms) else 1)
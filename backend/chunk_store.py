@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from typing import List, Dict
+import zstandard as zstd
+from utils import LOCAL_INDEX_DIR
+
+# Train a shared zstd dictionary once we have this many sample chunks.
+# Chunks are ~1 KB, far too small for zstd to find repetition on its own;
+# a dictionary trained on filing text recovers most of the boilerplate savings.
+DICT_MIN_SAMPLES = 64
+DICT_SIZE = 64 * 1024
+COMPRESSION_LEVEL = 9
+
+# SQLite's default limit on bound parameters per statement
+SQL_BATCH_SIZE = 900
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class ChunkStore:
+    """
+    Local content-addressed store for chunk text.
+
+    chunks:        chunk_id -> content hash
+    blobs:         content hash -> zstd-compressed text (identical chunks stored once)
+    dictionaries:  shared zstd dictionaries, referenced by id from each blob
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(LOCAL_INDEX_DIR, "chunks.db")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dictionaries (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, dict_id INTEGER NOT NULL, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, hash TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks(hash);
+        """)
+
+        self._compressors = {}
+        self._decompressors = {}
+        row = self.conn.execute("SELECT MAX(id) FROM dictionaries").fetchone()
+        # dict_id 0 means "compressed without a dictionary"
+        self.current_dict_id = row[0] or 0
+
+    def _dictionary(self, dict_id: int):
+        row = self.conn.execute("SELECT data FROM dictionaries WHERE id = ?", (dict_id,)).fetchone()
+        return zstd.ZstdCompressionDict(row[0])
+
+    def _compressor(self, dict_id: int):
+        if dict_id not in self._compressors:
+            dict_data = self._dictionary(dict_id) if dict_id else None
+            self._compressors[dict_id] = zstd.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dict_data)
+        return self._compressors[dict_id]
+
+    def _decompressor(self, dict_id: int):
+        if dict_id not in self._decompressors:
+            dict_data = self._dictionary(dict_id) if dict_id else None
+            self._decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=dict_data)
+        return self._decompressors[dict_id]
+
+    def _maybe_train_dictionary(self, texts: List[str]):
+        if self.current_dict_id or len(texts) < DICT_MIN_SAMPLES:
+            return
+        try:
+            trained = zstd.train_dictionary(DICT_SIZE, [t.encode("utf-8") for t in texts])
+        except zstd.ZstdError as e:
+            # Not enough distinct content to train on; keep compressing without a dictionary
+            print(f"Chunk store: dictionary training skipped ({e})")
+            return
+        cursor = self.conn.execute("INSERT INTO dictionaries (data) VALUES (?)", (trained.as_bytes(),))
+        self.current_dict_id = cursor.lastrowid
+        print(f"Chunk store: trained zstd dictionary #{self.current_dict_id} from {len(texts)} chunks.")
+
+    def put_many(self, chunk_ids: List[str], texts: List[str]):
+        """
+        Store chunk texts, deduplicating identical content by hash.
+        """
+        with self._lock:
+            self._maybe_train_dictionary(texts)
+            compressor = self._compressor(self.current_dict_id)
+
+            hashes = [content_hash(t) for t in texts]
+            blobs = {}
+            for h, text in zip(hashes, texts):
+                if h not in blobs:
+                    blobs[h] = (h, self.current_dict_id, compressor.compress(text.encode("utf-8")))
+
+            self.conn.executemany("INSERT OR IGNORE INTO blobs (hash, dict_id, data) VALUES (?, ?, ?)", blobs.values())
+            self.conn.executemany("INSERT OR REPLACE INTO chunks (chunk_id, hash) VALUES (?, ?)", zip(chunk_ids, hashes))
+            self.conn.commit()
+
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """
+        Batch-fetch chunk texts by id. Missing ids are absent from the result.
+        """
+        result = {}
+        with self._lock:
+            for i in range(0, len(chunk_ids), SQL_BATCH_SIZE):
+                batch = chunk_ids[i:i + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT c.chunk_id, b.dict_id, b.data FROM chunks c JOIN blobs b ON c.hash = b.hash "
+                    f"WHERE c.chunk_id IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for chunk_id, dict_id, data in rows:
+                    result[chunk_id] = self._decompressor(dict_id).decompress(data).decode("utf-8")
+        return result
+
+    def delete_many(self, chunk_ids: List[str]):
+        """
+        Remove chunk ids and garbage-collect blobs no longer referenced.
+        """
+        with self._lock:
+            for i in range(0, len(chunk_ids), SQL_BATCH_SIZE):
+                batch = chunk_ids[i:i + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                self.conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+            self.conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM chunks)")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+_SHARED_STORES = {}
+
+def get_chunk_store(path: str = None) -> ChunkStore:
+    """
+    Process-wide ChunkStore so per-request VectorDB instances share one connection and codec cache.
+    """
+    path = path or os.path.join(LOCAL_INDEX_DIR, "chunks.db")
+    if path not in _SHARED_STORES:
+        _SHARED_STORES[path] = ChunkStore(path)
+    return _SHARED_STORES[path]
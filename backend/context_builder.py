@@ -0,0 +1,159 @@
+import os
+import re
+from typing import List, Tuple
+
+# Chunks retrieved per RAG question, and the token budget they are assembled into for the prompt
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "6"))
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+
+# The splitter repeats up to 200 characters between neighbouring chunks; look a bit further to be safe
+MIN_OVERLAP_CHARS = 40
+MAX_OVERLAP_CHARS = 400
+
+# Word 5-gram Jaccard similarity above which the lower-ranked chunk is dropped
+NEAR_DUPLICATE_JACCARD = 0.85
+SHINGLE_WORDS = 5
+
+# Don't bother keeping a truncated tail shorter than this
+MIN_TRUNCATED_TOKENS = 64
+
+WORD_PATTERN = re.compile(r"\w+")
+
+_ENCODINGS = {}
+
+def _encoding(model: str):
+    """
+    tiktoken encoding for the model, or None when it can't be loaded (first use downloads the BPE file).
+    """
+    if model not in _ENCODINGS:
+        try:
+            import tiktoken
+            try:
+                _ENCODINGS[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _ENCODINGS[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"Warning: tiktoken encoding unavailable ({e}); estimating tokens as characters / 4.")
+            _ENCODINGS[model] = None
+    return _ENCODINGS[model]
+
+def _shingles(text: str) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def _overlap(a: str, b: str) -> int:
+    """
+    Length of the longest suffix of `a` that is a prefix of `b` (chunk `b` continues chunk `a`), or 0.
+    """
+    tail = a[-MAX_OVERLAP_CHARS:]
+    probe = b[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        size = len(tail) - start
+        if b.startswith(tail[start:]):
+            return size
+        start = tail.find(probe, start + 1)
+    return 0
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks (best first) into the context block for the RAG prompt:
+
+      1. chunks that continue each other (the splitter's overlap) are merged into one passage,
+      2. chunks contained in, or near-duplicates of, a better-ranked passage are dropped,
+      3. passages are ordered by the rank of their best chunk,
+      4. passages are added until the token budget is spent; the last one may be truncated.
+
+    Returns the passages and stats on how many tokens this saved versus plain concatenation.
+    """
+
+    def __init__(self, max_tokens: int = RAG_CONTEXT_TOKENS, model: str = "gpt-4o"):
+        self.max_tokens = max_tokens
+        self.model = model
+
+    @property
+    def encoding(self):
+        # Loaded on first use: only RAG answers count tokens
+        return _encoding(self.model)
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return (len(text) + 3) // 4
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def _merge(self, chunks: List[str]) -> Tuple[List[dict], int, int]:
+        passages = [{"text": text.strip(), "rank": rank} for rank, text in enumerate(chunks) if text and text.strip()]
+        merged = 0
+        duplicates = 0
+
+        changed = True
+        while changed:
+            changed = False
+            for i, a in enumerate(passages):
+                for j, b in enumerate(passages):
+                    if i == j:
+                        continue
+                    if b["text"] in a["text"]:
+                        a["rank"] = min(a["rank"], b["rank"])
+                        duplicates += 1
+                    else:
+                        size = _overlap(a["text"], b["text"])
+                        if not size:
+                            continue
+                        a["text"] = a["text"] + b["text"][size:]
+                        a["rank"] = min(a["rank"], b["rank"])
+                        merged += 1
+                    del passages[j]
+                    changed = True
+                    break
+                if changed:
+                    break
+        return passages, merged, duplicates
+
+    def build(self, chunks: List[str]) -> Tuple[List[str], dict]:
+        tokens_in = sum(self.count_tokens(text) for text in chunks)
+        passages, merged, duplicates = self._merge(chunks)
+        passages.sort(key=lambda p: p["rank"])
+
+        kept, kept_shingles = [], []
+        for passage in passages:
+            shingles = _shingles(passage["text"])
+            if any(len(shingles & other) / max(len(shingles | other), 1) >= NEAR_DUPLICATE_JACCARD for other in kept_shingles):
+                duplicates += 1
+                continue
+            kept.append(passage["text"])
+            kept_shingles.append(shingles)
+
+        context, tokens_out = [], 0
+        for text in kept:
+            tokens = self.count_tokens(text)
+            remaining = self.max_tokens - tokens_out
+            if tokens <= remaining:
+                context.append(text)
+                tokens_out += tokens
+                continue
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                context.append(self._truncate(text, remaining))
+                tokens_out += self.count_tokens(context[-1])
+            break
+
+        return context, {
+            "chunks": len(chunks),
+            "passages": len(context),
+            "merged": merged,
+            "duplicates": duplicates,
+            # Passages cut short or left out by the budget
+            "over_budget": len(kept) - sum(1 for a, b in zip(context, kept) if a == b),
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": max(0, tokens_in - tokens_out)
+        }
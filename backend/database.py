@@ -17,12 +17,32 @@ connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite")
 engine = create_engine(DATABASE_URL, connect_args=connect_args, echo=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async driver for the same database: sqlite -> aiosqlite, postgresql -> asyncpg
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql://"):
+        # asyncpg takes `ssl=` where libpq takes `sslmode=`
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1).replace("sslmode=", "ssl=")
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# Pool sizing for the async engine. Sessions are held per operation, so this bounds
+# concurrent queries per worker rather than concurrent requests.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+_async_engine = None
+_async_sessionmaker = None
+
 Base = declarative_base()
 
 def init_db():
     """Create the tables in the database."""
     # Import models to ensure they are registered with Base
-    from models import Company, FinancialMetric
+    from models import Company, FinancialMetric, IndexedChunk, IngestedFiling, UnreportedMetric
     Base.metadata.create_all(bind=engine)
 
 def get_db_session():
@@ -32,3 +52,41 @@ def get_db_session():
         yield session
     finally:
         session.close()
+
+def get_async_engine():
+    """
+    Process-wide async engine, created on first use so sync-only scripts never need the async drivers.
+    """
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        kwargs = {"echo": False, "pool_pre_ping": True}
+        if not ASYNC_DATABASE_URL.startswith("sqlite"):
+            kwargs.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=1800
+            )
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **kwargs)
+    return _async_engine
+
+def get_async_sessionmaker():
+    """
+    Factory for short-lived AsyncSessions: `async with get_async_sessionmaker()() as session: ...`
+    """
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_sessionmaker = async_sessionmaker(get_async_engine(), expire_on_commit=False)
+    return _async_sessionmaker
+
+async def dispose_async_engine():
+    """
+    Close pooled async connections (aiosqlite keeps a thread per connection, which would block interpreter exit).
+    """
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_sessionmaker = None
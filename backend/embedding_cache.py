@@ -0,0 +1,115 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for a query: case, whitespace and trailing punctuation don't change the embedding enough to matter.
+    """
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+class EmbeddingCache:
+    """
+    In-process LRU cache of query embeddings with TTL, optionally backed by a shared SQLite file
+    so several workers (or a warm restart) can reuse each other's embeddings.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 24 * 3600, disk_path: str = None, model: str = EMBEDDING_MODEL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.model = model
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.conn = None
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(disk_path, check_same_thread=False, timeout=5)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, created REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            self.conn.commit()
+
+    def _key(self, query: str) -> str:
+        return f"{self.model}:{normalize_query(query)}"
+
+    def get(self, query: str) -> Optional[List[float]]:
+        key = self._key(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, vector = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT created, vector FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[0] <= self.ttl:
+                    vector = np.frombuffer(row[1], dtype=np.float32).tolist()
+                    self._store(key, row[0], vector)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, vector: List[float]):
+        key = self._key(query)
+        now = time.time()
+        with self._lock:
+            self._store(key, now, vector)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, created, vector) VALUES (?, ?, ?)",
+                    (key, now, np.asarray(vector, dtype=np.float32).tobytes())
+                )
+                self.conn.commit()
+
+    def _store(self, key: str, created: float, vector: List[float]):
+        self._entries[key] = (created, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+_SHARED_CACHE = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Process-wide cache: VectorDB is constructed per request, so the cache has to outlive it.
+    """
+    global _SHARED_CACHE
+    if _SHARED_CACHE is None:
+        _SHARED_CACHE = EmbeddingCache(
+            maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+            ttl=float(os.getenv("EMBEDDING_CACHE_TTL", str(24 * 3600))),
+            disk_path=os.getenv("EMBEDDING_CACHE_PATH") or None
+        )
+    return _SHARED_CACHE
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Curated colloquial names -> tickers. Matched case-insensitively and take precedence over the dataset.
+ENTITY_ALIASES = {
+    "Google": "GOOGL",
+    "Alphabet": "GOOGL",
+    "Facebook": "META",
+    "Meta Platforms": "META",
+    "Amazon": "AMZN",
+    "Apple": "AAPL",
+    "Microsoft": "MSFT",
+    "Nvidia": "NVDA",
+    "Tesla": "TSLA"
+}
+
+# Words are runs of letters/digits; "&" and "." join words inside names like "AT&T" or "BRK.B".
+# Anything else (spaces, apostrophes, punctuation) is a boundary, so "Pineapple" is one word, not "Pine"+"apple".
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+(?:[&.][A-Za-z0-9]+)*")
+
+# Legal-form suffixes stripped from SEC titles to get the name people actually type ("Apple Inc." -> "Apple")
+CORPORATE_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc", "llc", "lp",
+    "l.p", "sa", "s.a", "nv", "n.v", "ag", "se", "holdings", "holding", "group", "the", "de", "md", "new"
+}
+
+# Shortest derived short name we trust; shorter ones collide with ordinary words and initials
+MIN_SHORT_NAME_LENGTH = 4
+
+def tokenize_spans(text: str) -> List[Tuple[str, int, int]]:
+    return [(m.group(), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(text)]
+
+class EntityResolver:
+    """
+    Single-pass, word-level trie matcher that rewrites company names and aliases to tickers.
+
+    At each word the trie is walked as far as the query allows and the longest accepted alias wins,
+    so cost depends on query length and the longest alias, not on how many aliases are loaded.
+
+    Curated aliases match case-insensitively. Dataset-derived names only match when written as a proper
+    noun (every word capitalized, any casing after that): with ~10k companies, lowercase "target",
+    "visa" or "best buy" are far more often ordinary words.
+    """
+
+    def __init__(self):
+        # node: {"children": {lower_word: node}, "any": ticker | None, "proper": ticker | None}
+        self._root = self._node()
+        self._lock = threading.Lock()
+        self.alias_count = 0
+        self.max_alias_words = 0
+
+    @staticmethod
+    def _node() -> dict:
+        return {"children": {}, "any": None, "proper": None}
+
+    def add(self, alias: str, ticker: str, proper_noun_only: bool = False, override: bool = True):
+        words = tuple(token for token, _, _ in tokenize_spans(alias))
+        if not words:
+            return
+        with self._lock:
+            node = self._root
+            for word in words:
+                node = node["children"].setdefault(word.lower(), self._node())
+
+            slot = "proper" if proper_noun_only else "any"
+            if not override and node[slot] is not None:
+                return
+            node[slot] = ticker
+            self.alias_count += 1
+            self.max_alias_words = max(self.max_alias_words, len(words))
+
+    def add_company_tickers(self, path: str) -> int:
+        """
+        Load SEC's company_tickers.json ({"0": {"cik_str", "ticker", "title"}, ...}).
+        The file is ordered by market cap, so the first ticker seen for a name keeps it (GOOGL over GOOG).
+        """
+        with open(path) as f:
+            data = json.load(f)
+        records = data.values() if isinstance(data, dict) else data
+
+        loaded = 0
+        for record in records:
+            ticker = str(record.get("ticker", "")).upper()
+            title = str(record.get("title", "")).strip()
+            # Tickers already are the normalized form, so only names need entries
+            if not ticker:
+                continue
+            if title:
+                self.add(title, ticker, proper_noun_only=True, override=False)
+                short_name = self.short_name(title)
+                if short_name and short_name != title and len(short_name) >= MIN_SHORT_NAME_LENGTH:
+                    self.add(short_name, ticker, proper_noun_only=True, override=False)
+            loaded += 1
+        return loaded
+
+    @staticmethod
+    def short_name(title: str) -> str:
+        """
+        "Apple Inc." -> "Apple", "Meta Platforms, Inc." -> "Meta Platforms", "Exxon Mobil Corp" -> "Exxon Mobil".
+        """
+        title = re.sub(r"/[A-Za-z]{2,3}/?$", "", title).strip()  # EDGAR state tags like "/DE/"
+        words = title.replace(",", " ").split()
+        while words and words[-1].lower().rstrip(".") in CORPORATE_SUFFIXES:
+            words.pop()
+        return " ".join(words)
+
+    def _match_at(self, spans, start: int) -> Optional[Tuple[int, str]]:
+        """
+        Longest alias starting at word `start`: (number of words, ticker), or None.
+        """
+        node = self._root
+        best = None
+        capitalized = True
+        limit = min(len(spans), start + self.max_alias_words)
+        for end in range(start, limit):
+            word = spans[end][0]
+            node = node["children"].get(word.lower())
+            if node is None:
+                break
+            capitalized = capitalized and not word[0].islower()
+            ticker = node["any"]
+            if ticker is None and capitalized:
+                ticker = node["proper"]
+            if ticker is not None:
+                best = (end - start + 1, ticker)
+        return best
+
+    def normalize(self, query: str) -> str:
+        spans = tokenize_spans(query)
+        out = []
+        cursor = 0
+        i = 0
+        while i < len(spans):
+            match = self._match_at(spans, i)
+            if match is None:
+                i += 1
+                continue
+            length, ticker = match
+            start_char, end_char = spans[i][1], spans[i + length - 1][2]
+            out.append(query[cursor:start_char])
+            out.append(ticker)
+            cursor = end_char
+            i += length
+        out.append(query[cursor:])
+        return "".join(out)
+
+    @classmethod
+    def build(cls, aliases: Dict[str, str] = None, company_tickers_path: str = None) -> "EntityResolver":
+        resolver = cls()
+        for alias, ticker in (ENTITY_ALIASES if aliases is None else aliases).items():
+            resolver.add(alias, ticker)
+        if company_tickers_path:
+            resolver.add_company_tickers(company_tickers_path)
+        return resolver
+
+_SHARED_RESOLVER = None
+_SHARED_LOCK = threading.Lock()
+
+def get_entity_resolver() -> EntityResolver:
+    """
+    Process-wide resolver, built once from ENTITY_ALIASES plus, if COMPANY_TICKERS_PATH points at
+    SEC's company_tickers.json, the full EDGAR company list.
+    """
+    global _SHARED_RESOLVER
+    if _SHARED_RESOLVER is None:
+        with _SHARED_LOCK:
+            if _SHARED_RESOLVER is None:
+                path = os.getenv("COMPANY_TICKERS_PATH")
+                if path and not os.path.exists(path):
+                    print(f"Warning: COMPANY_TICKERS_PATH {path} not found; using built-in aliases only.")
+                    path = None
+                _SHARED_RESOLVER = EntityResolver.build(company_tickers_path=path)
+    return _SHARED_RESOLVER
@@ -0,0 +1,462 @@
+"""
+Offline stand-ins for SEC EDGAR and the OpenAI API, for benchmarks and load tests.
+
+Both are real HTTP servers on localhost, so the code under test runs unchanged: point SEC_DATA_URL /
+SEC_ARCHIVES_URL at FakeEdgar and OPENAI_BASE_URL at FakeOpenAI. Responses are deterministic
+(seeded by CIK, accession or input text) and each server sleeps a configurable latency plus
+jitter per request, so runs are reproducible and cost nothing.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import base64
+import random
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+FIXTURE_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "retrieval_corpus.json")
+
+# Fiscal year ends (MMDD) for the seeded companies; anything else reports on the calendar year
+FISCAL_YEAR_ENDS = {"0000320193": "0930", "0000789019": "0630", "0001045810": "0128"}
+
+# Filings listed in `filings.recent`; older ones go to a `filings.files` page, like EDGAR's ~1000-filing cut
+RECENT_FILINGS = 8
+
+_VOCABULARY = (
+    "revenue margin customers supply chain demand competition regulation tariffs currency inflation interest "
+    "rates cybersecurity data privacy litigation intellectual property manufacturing suppliers components "
+    "capacity inventory pricing products services cloud advertising subscriptions hardware software "
+    "semiconductors logistics fulfillment energy vehicles batteries autonomy research development talent "
+    "retention acquisitions integration goodwill impairment taxation jurisdictions climate sustainability"
+).split()
+
+def _sleep(latency_ms: float, jitter_ms: float, rng: random.Random):
+    delay = latency_ms + (rng.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+class _Server:
+    """
+    ThreadingHTTPServer on 127.0.0.1 in a daemon thread. Use as a context manager or call start()/stop().
+    """
+
+    def __init__(self):
+        self.httpd = None
+        self.thread = None
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def _jitter(self, latency_ms: float, jitter_ms: float):
+        with self._lock:
+            rng = random.Random(self._rng.random())
+        _sleep(latency_ms, jitter_ms, rng)
+
+    def handle(self, method: str, path: str, body: bytes) -> tuple:
+        """
+        (status, content type, payload) for a request. Overridden by each service.
+        The payload is bytes, or an iterator of bytes to stream with chunked transfer encoding.
+        """
+        raise NotImplementedError
+
+    def start(self) -> "_Server":
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                service._count()
+                status, content_type, payload = service.handle(method, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if isinstance(payload, bytes):
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                # Streamed response (SSE): chunked transfer, each part flushed as it is produced
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for part in payload:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def _json(data, status: int = 200) -> tuple:
+    return status, "application/json", json.dumps(data).encode("utf-8")
+
+class FakeEdgar(_Server):
+    """
+    Stub of data.sec.gov and the EDGAR archive for any CIK.
+
+    /submissions/CIK##########.json               `years` of 10-K + 10-Q filings ending last fiscal year,
+                                                  the oldest paged out to /submissions/CIK...-submissions-001.json
+    /Archives/edgar/data/<cik>/<acc>/<acc>.txt    full submission: SEC header, the main HTML document,
+                                                  an exhibit and a uuencoded graphic (what the split stage drops)
+    /Archives/edgar/data/<cik>/<acc>/<doc>.htm    the main document alone (ingest.py)
+    /api/xbrl/companyfacts/CIK##########.json     revenue / net income / assets facts per fiscal year
+
+    Risk factor text is assembled from the fixture corpus plus seeded filler, about `filing_kb` KB per 10-K.
+    """
+
+    def __init__(self, years: int = 3, filing_kb: int = 200, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 corpus_path: str = FIXTURE_CORPUS):
+        super().__init__()
+        self.years = years
+        self.filing_kb = filing_kb
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        with open(corpus_path) as f:
+            self.sentences = [d["text"] for d in json.load(f)["documents"]]
+        self._filings_cache = {}
+
+    # --- fixture generation ---
+
+    def filings(self, cik: str) -> list:
+        """
+        Filing metadata for a CIK, newest first.
+        """
+        cik = cik.zfill(10)
+        if cik in self._filings_cache:
+            return self._filings_cache[cik]
+        fye = FISCAL_YEAR_ENDS.get(cik, "1231")
+        month, day = int(fye[:2]), int(fye[2:])
+        today = datetime.date.today()
+        filings = []
+        # Fiscal years are named after the calendar year they end in (see retriever.fiscal_period)
+        for fiscal_year in range(today.year - self.years - 1, today.year + 1):
+            year_end = datetime.date(fiscal_year, month, min(day, 28))
+            quarters = [(q, year_end - datetime.timedelta(days=round(91.3 * (4 - q)))) for q in (1, 2, 3)]
+            for form, period, report_date, lag in [("10-Q", f"Q{q}", end, 40) for q, end in quarters] + [("10-K", "FY", year_end, 60)]:
+                filing_date = report_date + datetime.timedelta(days=lag)
+                if filing_date > today:
+                    continue
+                seq = len(filings) + 1
+                filings.append({
+                    "accessionNumber": f"{cik}-{str(filing_date.year)[2:]}-{seq:06d}",
+                    "form": form,
+                    "filingDate": filing_date.isoformat(),
+                    "reportDate": report_date.isoformat(),
+                    "primaryDocument": f"{form.lower().replace('-', '')}-{report_date:%Y%m%d}.htm",
+                    "period": period
+                })
+        filings.sort(key=lambda f: f["filingDate"], reverse=True)
+        self._filings_cache[cik] = filings
+        return filings
+
+    def _table(self, filings: list) -> dict:
+        columns = ("accessionNumber", "form", "filingDate", "reportDate", "primaryDocument")
+        return {column: [f[column] for f in filings] for column in columns}
+
+    def submissions(self, cik: str) -> dict:
+        cik = cik.zfill(10)
+        filings = self.filings(cik)
+        recent, older = filings[:RECENT_FILINGS], filings[RECENT_FILINGS:]
+        files = []
+        if older:
+            files.append({"name": f"CIK{cik}-submissions-001.json", "filingCount": len(older),
+                          "filingFrom": older[-1]["filingDate"], "filingTo": older[0]["filingDate"]})
+        return {"cik": cik, "name": f"Company {cik}", "fiscalYearEnd": FISCAL_YEAR_ENDS.get(cik, "1231"),
+                "filings": {"recent": self._table(recent), "files": files}}
+
+    def _paragraphs(self, rng: random.Random, target_chars: int) -> list:
+        paragraphs, size = [], 0
+        while size < target_chars:
+            sentences = [rng.choice(self.sentences)]
+            sentences += [" ".join(rng.choice(_VOCABULARY) for _ in range(rng.randint(12, 30))).capitalize() + "."
+                          for _ in range(rng.randint(2, 5))]
+            paragraph = " ".join(sentences)
+            paragraphs.append(paragraph)
+            size += len(paragraph)
+        return paragraphs
+
+    def main_document(self, cik: str, filing: dict) -> str:
+        rng = random.Random(zlib.crc32(filing["accessionNumber"].encode()))
+        risk_chars = self.filing_kb * 1024 // (1 if filing["form"] == "10-K" else 4)
+        risk = "".join(f"<p>{p}</p>\n" for p in self._paragraphs(rng, risk_chars))
+        business = "".join(f"<p>{p}</p>\n" for p in self._paragraphs(rng, risk_chars // 4))
+        rows = "".join(f"<tr><td>{rng.choice(_VOCABULARY).title()}</td><td>$ {rng.randint(1000, 400000):,}</td></tr>\n" for _ in range(40))
+        return (
+            f"<html><head><title>{filing['form']} {filing['reportDate']}</title><style>p {{margin: 0}}</style></head><body>\n"
+            f"<p>Item 1. Business</p>\n{business}"
+            f"<p>Item 1A. Risk Factors</p>\n{risk}"
+            f"<p>Item 1B. Unresolved Staff Comments</p>\n<p>None.</p>\n"
+            f"<p>Item 2. Properties</p>\n<p>Item 8. Financial Statements</p>\n<table>\n{rows}</table>\n"
+            f"<script>var x = 1;</script></body></html>\n"
+        )
+
+    def full_submission(self, cik: str, filing: dict) -> str:
+        rng = random.Random(zlib.crc32(filing["accessionNumber"].encode()) + 1)
+        graphic = "\n".join("M" + "".join(rng.choice("!\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJ") for _ in range(60))
+                            for _ in range(self.filing_kb * 4))
+        compact = lambda d: d.replace("-", "")
+        return (
+            "<SEC-DOCUMENT>\n<SEC-HEADER>\n"
+            f"ACCESSION NUMBER:\t\t{filing['accessionNumber']}\n"
+            f"CONFORMED SUBMISSION TYPE:\t{filing['form']}\n"
+            f"CONFORMED PERIOD OF REPORT:\t{compact(filing['reportDate'])}\n"
+            f"FILED AS OF DATE:\t\t{compact(filing['filingDate'])}\n"
+            f"CENTRAL INDEX KEY:\t\t\t{cik.zfill(10)}\n"
+            "</SEC-HEADER>\n"
+            f"<DOCUMENT>\n<TYPE>{filing['form']}\n<SEQUENCE>1\n<FILENAME>{filing['primaryDocument']}\n<TEXT>\n"
+            f"{self.main_document(cik, filing)}</TEXT>\n</DOCUMENT>\n"
+            "<DOCUMENT>\n<TYPE>EX-21\n<SEQUENCE>2\n<TEXT>\n<html><p>Subsidiaries of the registrant.</p></html>\n</TEXT>\n</DOCUMENT>\n"
+            f"<DOCUMENT>\n<TYPE>GRAPHIC\n<SEQUENCE>3\n<TEXT>\nbegin 644 chart.jpg\n{graphic}\nend\n</TEXT>\n</DOCUMENT>\n"
+            "</SEC-DOCUMENT>\n"
+        )
+
+    def company_facts(self, cik: str) -> dict:
+        cik = cik.zfill(10)
+        rng = random.Random(int(cik))
+        base = rng.uniform(2e10, 3e11)
+        facts = {}
+        for concept, share in (("Revenues", 1.0), ("NetIncomeLoss", 0.2), ("Assets", 1.5), ("GrossProfit", 0.4), ("OperatingIncomeLoss", 0.25)):
+            units = []
+            for filing in self.filings(cik):
+                if filing["form"] != "10-K":
+                    continue
+                fy = int(filing["reportDate"][:4])
+                units.append({"end": filing["reportDate"], "val": round(base * share * (1.08 ** (fy - 2020))),
+                              "fy": fy, "fp": "FY", "form": "10-K", "filed": filing["filingDate"], "accn": filing["accessionNumber"]})
+            facts[concept] = {"units": {"USD": units}}
+        return {"cik": int(cik), "entityName": f"Company {cik}", "facts": {"us-gaap": facts}}
+
+    # --- HTTP ---
+
+    def _find(self, cik: str, accession_digits: str) -> dict:
+        for filing in self.filings(cik):
+            if filing["accessionNumber"].replace("-", "") == accession_digits:
+                return filing
+        return None
+
+    def handle(self, method: str, path: str, body: bytes) -> tuple:
+        self._jitter(self.latency_ms, self.jitter_ms)
+        path = path.split("?")[0]
+
+        match = re.fullmatch(r"/submissions/CIK(\d{10})\.json", path)
+        if match:
+            return _json(self.submissions(match.group(1)))
+        match = re.fullmatch(r"/submissions/CIK(\d{10})-submissions-001\.json", path)
+        if match:
+            return _json(self._table(self.filings(match.group(1))[RECENT_FILINGS:]))
+        match = re.fullmatch(r"/api/xbrl/companyfacts/CIK(\d{10})\.json", path)
+        if match:
+            return _json(self.company_facts(match.group(1)))
+        match = re.fullmatch(r"/Archives/edgar/data/(\d+)/(\d{18})/(.+)", path)
+        if match:
+            cik, digits, name = match.groups()
+            filing = self._find(cik, digits)
+            if filing is not None:
+                if name.endswith(".txt"):
+                    return 200, "text/plain", self.full_submission(cik, filing).encode("utf-8")
+                if name == filing["primaryDocument"]:
+                    return 200, "text/html", self.main_document(cik, filing).encode("utf-8")
+        return _json({"error": "not found"}, 404)
+
+def fake_embedding(text: str, dimensions: int = 1536) -> np.ndarray:
+    """
+    Deterministic stand-in for an embedding model: hashed bag of words, L2-normalized.
+    Texts sharing words get similar vectors, so retrieval over fake embeddings still ranks sensibly.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        h = zlib.crc32(word.encode())
+        vector[h % dimensions] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    else:
+        vector[0] = 1.0
+    return vector
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+# Classifier stand-in vocabulary: enough to route the fixture queries the fast path leaves to the LLM
+_FAKE_METRICS = {
+    "revenue": "Revenues", "revenues": "Revenues", "sales": "Revenues", "income": "NetIncomeLoss",
+    "earnings": "NetIncomeLoss", "assets": "Assets", "profit": "GrossProfit"
+}
+_FAKE_QUALITATIVE = {"risk", "risks", "why", "how", "explain", "describe", "summarize", "strategy", "say", "affect", "exposure"}
+_FAKE_COMPARISON = {"compare", "vs", "versus", "against"}
+
+def fake_intent(query: str) -> dict:
+    """
+    What the classifier prompt asks for, from keywords: tickers are the upper-case words of the
+    (entity-normalized) query.
+    """
+    words = re.findall(r"[a-z]+", query.lower())
+    tickers = [t for t in dict.fromkeys(re.findall(r"\b[A-Z]{2,5}\b", query)) if t not in ("AI", "FY", "US")]
+    metrics = list(dict.fromkeys(_FAKE_METRICS[w] for w in words if w in _FAKE_METRICS))
+    years = [int(y) for y in re.findall(r"\b(?:19|20)\d{2}\b", query)]
+    if set(words) & _FAKE_QUALITATIVE or not metrics:
+        kind = "rag"
+        metrics = []
+    elif len(tickers) > 1 or set(words) & _FAKE_COMPARISON:
+        kind = "comparison"
+    else:
+        kind = "metric"
+    return {"type": kind, "companies": tickers, "metric": metrics[0] if metrics else None, "metrics": metrics,
+            "year": years[0] if years else 0, "years": years, "year_range": None}
+
+class FakeOpenAI(_Server):
+    """
+    Stub of the OpenAI API (OPENAI_BASE_URL=<url>/v1).
+
+    POST /v1/embeddings: fake_embedding per input, base64 or float encoding like the real API.
+    Latency is `embed_latency_ms` per request plus `embed_ms_per_1k_tokens` for the batch.
+
+    POST /v1/chat/completions: answers the app's own prompts. The guardrail always allows, the
+    classifier gets fake_intent() JSON, anything else (RAG synthesis) an `answer_tokens`-word answer
+    built from the prompt's context. `chat_latency_ms` is the time to the first token, then each
+    token takes `chat_ms_per_token`; with "stream": true the answer arrives as SSE chunks
+    (plus a usage chunk when stream_options.include_usage is set).
+    """
+
+    def __init__(self, embed_latency_ms: float = 0.0, embed_ms_per_1k_tokens: float = 0.0, jitter_ms: float = 0.0,
+                 chat_latency_ms: float = 0.0, chat_ms_per_token: float = 0.0, answer_tokens: int = 150):
+        super().__init__()
+        self.embed_latency_ms = embed_latency_ms
+        self.embed_ms_per_1k_tokens = embed_ms_per_1k_tokens
+        self.jitter_ms = jitter_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.chat_ms_per_token = chat_ms_per_token
+        self.answer_tokens = answer_tokens
+        self.embedded_inputs = 0
+        self.embedded_tokens = 0
+        self.chat_requests = 0
+        self.completion_tokens = 0
+
+    def embeddings(self, request: dict) -> dict:
+        inputs = request["input"]
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        tokens = sum(estimate_tokens(t) for t in inputs)
+        with self._lock:
+            self.embedded_inputs += len(inputs)
+            self.embedded_tokens += tokens
+        self._jitter(self.embed_latency_ms + self.embed_ms_per_1k_tokens * tokens / 1000, self.jitter_ms)
+
+        dimensions = request.get("dimensions") or 1536
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(text, dimensions)
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        return {"object": "list", "data": data, "model": request.get("model", "text-embedding-3-small"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    # --- chat ---
+
+    def reply(self, prompt: str) -> list:
+        """
+        The completion for a prompt, as a list of tokens.
+        """
+        if "You are a guardrail" in prompt:
+            return [json.dumps({"allowed": True, "reason": "Financial question."})]
+        match = re.search(r"Analyze this user query: '(.*?)'\.", prompt, re.S)
+        if match:
+            return [json.dumps(fake_intent(match.group(1)))]
+        context = prompt.split("Context:", 1)[-1].split("Question:", 1)[0]
+        words = re.findall(r"[A-Za-z][A-Za-z']+", context) or _VOCABULARY
+        rng = random.Random(zlib.crc32(prompt.encode()))
+        tokens = ["- "]
+        for i in range(self.answer_tokens):
+            word = rng.choice(words)
+            tokens.append(f"**{word}** " if i % 25 == 0 else f"{word} ")
+            if i % 25 == 24:
+                tokens.append("\n- ")
+        return tokens
+
+    def _chunk(self, request: dict, completion_id: str, delta: dict, finish_reason: str = None) -> bytes:
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": request.get("model", "gpt-4o"),
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+    def _stream(self, request: dict, tokens: list, usage: dict):
+        completion_id = f"chatcmpl-{self.chat_requests}"
+        self._jitter(self.chat_latency_ms, self.jitter_ms)
+        yield self._chunk(request, completion_id, {"role": "assistant", "content": ""})
+        for token in tokens:
+            if self.chat_ms_per_token:
+                time.sleep(self.chat_ms_per_token / 1000)
+            yield self._chunk(request, completion_id, {"content": token})
+        yield self._chunk(request, completion_id, {}, "stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "gpt-4o"), "choices": [], "usage": usage}
+            yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+
+    def chat_completions(self, request: dict):
+        prompt = "\n".join(m.get("content") or "" for m in request.get("messages", []) if isinstance(m.get("content"), str))
+        tokens = self.reply(prompt)
+        prompt_tokens = estimate_tokens(prompt)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        with self._lock:
+            self.chat_requests += 1
+            self.completion_tokens += len(tokens)
+        if request.get("stream"):
+            return 200, "text/event-stream", self._stream(request, tokens, usage)
+
+        self._jitter(self.chat_latency_ms + self.chat_ms_per_token * len(tokens), self.jitter_ms)
+        return _json({
+            "id": f"chatcmpl-{self.chat_requests}", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def handle(self, method: str, path: str, body: bytes) -> tuple:
+        request = json.loads(body or b"{}")
+        if path.endswith("/embeddings"):
+            return _json(self.embeddings(request))
+        if path.endswith("/chat/completions"):
+            return self.chat_completions(request)
+        return _json({"error": {"message": f"Unsupported endpoint {path}"}}, 404)
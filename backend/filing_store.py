@@ -0,0 +1,232 @@
+import io
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+import zstandard as zstd
+from utils import LOCAL_INDEX_DIR
+
+# Raw submissions run to tens of MB (exhibits, XBRL, uuencoded images) and compress ~10x.
+# No dictionary: unlike chunks (see chunk_store.py), a whole filing is plenty for zstd to find repetition.
+FILING_STORE_DIR = os.getenv("FILING_STORE_DIR", os.path.join(LOCAL_INDEX_DIR, "filings"))
+COMPRESSION_LEVEL = int(os.getenv("FILING_COMPRESSION_LEVEL", "10"))
+
+# Bump when clean_html / section detection change, so cached cleaned text is rebuilt instead of reused
+CLEAN_VERSION = 1
+
+_HEADER_FIELDS = {
+    "accession": r"ACCESSION NUMBER:\s*([\d-]+)",
+    "form": r"CONFORMED SUBMISSION TYPE:\s*(\S+)",
+    "report_date": r"CONFORMED PERIOD OF REPORT:\s*(\d{8})",
+    "filing_date": r"FILED AS OF DATE:\s*(\d{8})",
+    "cik": r"CENTRAL INDEX KEY:\s*(\d+)"
+}
+
+def parse_header(text: str) -> dict:
+    """
+    Filing metadata from the <SEC-HEADER> at the top of a full submission text file.
+    """
+    header = text[:text.find("</SEC-HEADER>")] if "</SEC-HEADER>" in text else text[:20000]
+    fields = {}
+    for name, pattern in _HEADER_FIELDS.items():
+        match = re.search(pattern, header)
+        if match:
+            value = match.group(1)
+            fields[name] = f"{value[:4]}-{value[4:6]}-{value[6:]}" if name.endswith("_date") else value
+    if "cik" in fields:
+        fields["cik"] = fields["cik"].zfill(10)
+    return fields
+
+def strip_header(text: str) -> str:
+    """
+    A full submission without its <SEC-DOCUMENT>/<SEC-HEADER> preamble: just the documents. The preamble
+    carries the accession number and dates, so no two submissions would share a hash with it included.
+    """
+    end = text.find("</SEC-HEADER>")
+    return text[end + len("</SEC-HEADER>"):].lstrip("\n") if end != -1 else text
+
+class FilingStore:
+    """
+    Local content-addressed store for raw filings and their cleaned text.
+
+    blobs/ab/<sha256>.zst                    submission documents without the SEC header, zstd-compressed
+                                             (identical documents are stored, and cleaned, once across filings)
+    blobs/ab/<sha256>.clean-v<N>.zst         cleaned text derived from it (see CLEAN_VERSION)
+    blobs/ab/<sha256>.sections-v<N>.json     section offsets into the cleaned text, e.g. {"risk_factors": [start, end]}
+    filings.db                               accession -> hash, with cik / form / period (from the header) for lookups
+
+    Blob files are written once under their hash and never modified, so worker processes can read
+    them without the index. Reads stream: open_text() decompresses as the caller consumes lines.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or FILING_STORE_DIR
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first index access; blob-only users (ingestion worker processes) never need it
+        if self._conn is None:
+            self._conn = sqlite3.connect(os.path.join(self.root, "filings.db"), check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS filings (
+                    accession TEXT PRIMARY KEY, hash TEXT NOT NULL, cik TEXT NOT NULL, form TEXT NOT NULL,
+                    report_date TEXT, filing_date TEXT, fiscal_year INTEGER, fiscal_period TEXT, size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_filings_period ON filings(cik, form, report_date);
+                CREATE INDEX IF NOT EXISTS idx_filings_hash ON filings(hash);
+            """)
+        return self._conn
+
+    def _path(self, digest: str, suffix: str = "zst") -> str:
+        return os.path.join(self.root, "blobs", digest[:2], f"{digest}.{suffix}")
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        # Readers never see a partial blob, and two writers of the same content both succeed
+        os.replace(tmp, path)
+
+    # --- raw filings ---
+
+    def put(self, text: str, accession: str = None, **meta) -> str:
+        """
+        Store a full submission and index it under its accession number. Metadata not given
+        (cik, form, report_date, filing_date) is read from the SEC header, which is then dropped: the hash
+        covers the documents only. Returns the content hash.
+        """
+        data = strip_header(text).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            self._write_atomic(path, zstd.ZstdCompressor(level=COMPRESSION_LEVEL).compress(data))
+
+        header = parse_header(text)
+        accession = accession or header.get("accession")
+        if not accession:
+            raise ValueError("Accession number not given and not found in the filing header")
+        row = {**header, **{k: v for k, v in meta.items() if v is not None}}
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO filings (accession, hash, cik, form, report_date, filing_date, fiscal_year, fiscal_period, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (accession, digest, row.get("cik", ""), row.get("form", ""), row.get("report_date"), row.get("filing_date"),
+                 row.get("fiscal_year"), row.get("fiscal_period"), len(data))
+            )
+            self.conn.commit()
+        return digest
+
+    def get(self, accession: str) -> Optional[dict]:
+        """
+        Index entry for a filing, or None if it isn't stored.
+        """
+        with self._lock:
+            cursor = self.conn.execute("SELECT * FROM filings WHERE accession = ?", (accession,))
+            row = cursor.fetchone()
+            columns = [c[0] for c in cursor.description]
+        if row is None:
+            return None
+        entry = dict(zip(columns, row))
+        # A blob deleted by hand means the filing has to be fetched again
+        return entry if os.path.exists(self._path(entry["hash"])) else None
+
+    def find(self, cik: str = None, form: str = None, since: str = None) -> List[dict]:
+        """
+        Stored filings by company, form and report period (on or after `since`), newest period first.
+        """
+        clauses, params = [], []
+        for column, value in (("cik", cik and cik.zfill(10)), ("form", form)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("report_date >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            cursor = self.conn.execute(f"SELECT * FROM filings {where} ORDER BY report_date DESC", params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def open_text(self, digest: str) -> io.TextIOBase:
+        """
+        Stream a stored submission as text, decompressing as it is read. Close it (or use `with`) when done.
+        """
+        raw = open(self._path(digest), "rb")
+        reader = zstd.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", errors="ignore")
+
+    def read(self, digest: str) -> str:
+        with self.open_text(digest) as f:
+            return f.read()
+
+    # --- derived text ---
+
+    def get_cleaned(self, digest: str) -> Optional[Tuple[str, Dict[str, list]]]:
+        """
+        (cleaned text, section offsets) cached for a raw filing, or None if not built with the current CLEAN_VERSION.
+        """
+        text_path = self._path(digest, f"clean-v{CLEAN_VERSION}.zst")
+        sections_path = self._path(digest, f"sections-v{CLEAN_VERSION}.json")
+        # Sections are written last, so their presence means the pair is complete
+        if not os.path.exists(sections_path):
+            return None
+        with open(text_path, "rb") as f:
+            text = zstd.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+        with open(sections_path, encoding="utf-8") as f:
+            return text, json.load(f)
+
+    def put_cleaned(self, digest: str, text: str, sections: Dict[str, list]):
+        self._write_atomic(self._path(digest, f"clean-v{CLEAN_VERSION}.zst"),
+                           zstd.ZstdCompressor(level=COMPRESSION_LEVEL).compress(text.encode("utf-8")))
+        self._write_atomic(self._path(digest, f"sections-v{CLEAN_VERSION}.json"), json.dumps(sections).encode("utf-8"))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def iter_legacy_filings(download_dir: str) -> Iterator[Tuple[str, str]]:
+    """
+    (accession, path) of every submission in a sec_edgar_downloader directory
+    (sec-edgar-filings/<ticker>/<form>/<accession>/full-submission.txt).
+    """
+    root = os.path.join(download_dir, "sec-edgar-filings")
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith(".txt"):
+                yield os.path.basename(dirpath), os.path.join(dirpath, name)
+
+_SHARED_STORES = {}
+
+def get_filing_store(root: str = None) -> FilingStore:
+    """
+    Process-wide FilingStore, one per directory.
+    """
+    root = root or FILING_STORE_DIR
+    if root not in _SHARED_STORES:
+        _SHARED_STORES[root] = FilingStore(root)
+    return _SHARED_STORES[root]
+
+if __name__ == "__main__":
+    # One-off migration of the old uncompressed download directory: python filing_store.py [sec_filings]
+    import sys
+
+    download_dir = sys.argv[1] if len(sys.argv) > 1 else "sec_filings"
+    store = get_filing_store()
+    count = before = after = 0
+    for accession, path in iter_legacy_filings(download_dir):
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+        digest = store.put(text, accession=accession)
+        before += os.path.getsize(path)
+        after += os.path.getsize(store._path(digest))
+        count += 1
+    print(f"Imported {count} filings: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB compressed")
@@ -1,6 +1,9 @@
 from langchain_openai import ChatOpenAI
 import json
+import asyncio
 import os
+from tracing import span, token_usage
+from admission import llm_slot
 
 class InputGuardrail:
     def __init__(self, api_key: str, model="gpt-4o-mini"):
@@ -10,25 +13,49 @@ class InputGuardrail:
             api_key=api_key
         )
 
-    async def check_safety(self, query: str) -> dict:
-        prompt = f"""You are a guardrail for a Financial Analyst AI. Your job is to block off-topic queries.
+    @staticmethod
+    def _prompt(query: str) -> str:
+        return f"""You are a guardrail for a Financial Analyst AI. Your job is to block off-topic queries.
             Allowed topics: Finance, Stocks, Economics, Companies, SEC filings, Market data, Risks, Revenue.
             Blocked topics: General coding, Politics, Cooking, Health, General knowledge, Creative writing.
             
             Analyze the query: '{query}'
             
             Return JSON ONLY: {{ "allowed": boolean, "reason": "short explanation" }}"""
-        
+
+    @staticmethod
+    def _parse(response) -> dict:
+        content = response.content.strip()
+        # Handle potential markdown code block wrapping
+        if content.startswith("```json"):
+            content = content.replace("```json", "").replace("```", "")
+        return json.loads(content)
+
+    async def check_safety(self, query: str) -> dict:
         try:
-            response = await self.llm.ainvoke(prompt)
-            content = response.content.strip()
-            # Handle potential markdown code block wrapping
-            if content.startswith("```json"):
-                content = content.replace("```json", "").replace("```", "")
-            return json.loads(content)
+            with span("guardrail") as attrs:
+                async with llm_slot():
+                    response = await self.llm.ainvoke(self._prompt(query))
+                attrs.update(token_usage(response))
+                result = self._parse(response)
+                attrs["allowed"] = result.get("allowed")
+                return result
         except Exception as e:
             print(f"Guardrail Error: {e}")
             # Fail safe: allow if check fails, or block. Here we default to block for safety or allow for usability?
             # Let's default to allowing but logging error, or maybe simple fallback. 
             # For this task, let's assume valid JSON return or handle basic error.
             return {"allowed": True, "reason": "Guardrail check failed, proceeding with caution."}
+
+    async def check_safety_many(self, queries: list, max_concurrency: int = 8) -> list:
+        """
+        check_safety for a list of queries, at most max_concurrency at once (each call also takes an
+        llm_slot, like any other). Results follow the query order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def check(query):
+            async with semaphore:
+                return await self.check_safety(query)
+
+        return list(await asyncio.gather(*(check(q) for q in queries)))
@@ -11,7 +11,6 @@ def run_ingestion():
     # Configuration
     CIK = "320193" # Apple
     TICKER = "AAPL"
-    YEAR = "2024" # Targeting the latest filing which might be 2024 or 2025 FY end
     
     try:
         # 1. Initialize Components
@@ -26,7 +25,9 @@ def run_ingestion():
         metadata = retriever.get_latest_filing_metadata(CIK)
         url = metadata['url']
         filing_date = metadata['filingDate']
-        print(f"Found URL: {url} (Filing Date: {filing_date})")
+        # Fiscal year of the report period (see retriever.fiscal_period), not the filing date
+        year = str(metadata['fiscalYear'])
+        print(f"Found URL: {url} (Filing Date: {filing_date}, FY{year})")
         
         # 3. Download HTML
         print("Downloading filing...")
@@ -50,7 +51,7 @@ def run_ingestion():
         metadata_base = {
             "company": TICKER,
             "cik": CIK,
-            "year": YEAR, # Ideally derived from filing_date
+            "year": year,
             "filing_date": filing_date,
             "section": "Risk Factors"
         }
@@ -0,0 +1,84 @@
+import time
+import threading
+from typing import Dict, Optional
+from sqlalchemy import func
+from database import SessionLocal, engine
+from models import IngestedFiling
+
+# Ingestion stages in order; a filing's `stage` is the last one completed.
+# Chunks are committed to the index (and the IndexedChunk manifest) one embedding batch at a time,
+# so "embedding" with batches_done < batches_total is a filing to resume, not to redo.
+STAGES = ("listed", "downloaded", "chunked", "embedding", "indexed")
+
+_TABLE_READY = False
+_TABLE_LOCK = threading.Lock()
+
+def _ensure_table():
+    global _TABLE_READY
+    with _TABLE_LOCK:
+        if not _TABLE_READY:
+            IngestedFiling.__table__.create(bind=engine, checkfirst=True)
+            _TABLE_READY = True
+
+class IngestManifest:
+    """
+    Per-filing ingestion progress in the `ingested_filings` table.
+    Every update commits immediately: the manifest is only useful if it survives the crash it exists for.
+    """
+
+    def __init__(self):
+        _ensure_table()
+
+    def get(self, accession_number: str) -> Optional[dict]:
+        with SessionLocal() as session:
+            row = session.get(IngestedFiling, accession_number)
+            if row is None:
+                return None
+            return {c.name: getattr(row, c.name) for c in IngestedFiling.__table__.columns}
+
+    def record(self, accession_number: str, stage: str, **fields) -> None:
+        """
+        Upsert a filing's row and mark `stage` completed. Clears any earlier error unless one is given.
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown ingestion stage '{stage}'. Expected one of {STAGES}.")
+        with SessionLocal() as session:
+            row = session.get(IngestedFiling, accession_number)
+            if row is None:
+                row = IngestedFiling(accession_number=accession_number, batches_done=0)
+                session.add(row)
+            for name, value in fields.items():
+                setattr(row, name, value)
+            row.stage = stage
+            row.error = fields.get("error")
+            row.updated_at = time.time()
+            session.commit()
+
+    def batch_done(self, accession_number: str) -> None:
+        with SessionLocal() as session:
+            row = session.get(IngestedFiling, accession_number)
+            row.batches_done = (row.batches_done or 0) + 1
+            row.stage = "embedding"
+            row.updated_at = time.time()
+            session.commit()
+
+    def fail(self, accession_number: str, error: str) -> None:
+        """
+        Keep the stage reached, note the error; the next run picks the filing up from there.
+        """
+        with SessionLocal() as session:
+            row = session.get(IngestedFiling, accession_number)
+            if row is not None:
+                row.error = error[:500]
+                row.updated_at = time.time()
+                session.commit()
+
+    def latest_filing_dates(self, form_types: tuple) -> Dict[str, str]:
+        """
+        CIK -> filing date of the newest fully indexed filing of any of `form_types`, for --since incremental runs.
+        """
+        with SessionLocal() as session:
+            rows = session.query(IngestedFiling.cik, func.max(IngestedFiling.filing_date)) \
+                .filter(IngestedFiling.form_type.in_(form_types), IngestedFiling.stage == "indexed") \
+                .group_by(IngestedFiling.cik).all()
+        return {cik: filing_date for cik, filing_date in rows}
@@ -1,6 +1,7 @@
 import logging
 from database import engine, Base, SessionLocal
-from models import Company, FinancialMetric 
+from models import Company, FinancialMetric, IndexedChunk, IngestedFiling, UnreportedMetric
+from repository import SEED_COMPANIES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,18 +19,7 @@ def init_db():
     # 2. Seed Companies
     session = SessionLocal()
     try:
-        # Standard list of tech giants to track
-        companies = [
-            {"ticker": "AAPL", "name": "Apple Inc.", "sector": "Technology", "cik": "0000320193"},
-            {"ticker": "MSFT", "name": "Microsoft Corp", "sector": "Technology", "cik": "0000789019"},
-            {"ticker": "GOOGL", "name": "Alphabet Inc.", "sector": "Technology", "cik": "0001652044"},
-            {"ticker": "AMZN", "name": "Amazon.com Inc.", "sector": "Consumer Cyclical", "cik": "0001018724"},
-            {"ticker": "NVDA", "name": "NVIDIA Corp", "sector": "Technology", "cik": "0001045810"},
-            {"ticker": "TSLA", "name": "Tesla Inc.", "sector": "Automotive", "cik": "0001318605"},
-            {"ticker": "META", "name": "Meta Platforms Inc.", "sector": "Technology", "cik": "0001326801"},
-        ]
-
-        for company_data in companies:
+        for company_data in SEED_COMPANIES:
             # Check if company exists
             exists = session.query(Company).filter_by(ticker=company_data['ticker']).first()
             if not exists:
@@ -0,0 +1,159 @@
+import re
+import threading
+from typing import Optional
+from repository import TICKER_TO_CIK, METRIC_ALIASES
+from processor import METRIC_ALIASES as TEXT_METRIC_ALIASES
+
+# Year the classifier prompt maps "latest"/"recent" to
+LATEST_YEAR = 2024
+
+YEAR_PATTERN = re.compile(r"\b(?:fy\s?|fiscal\s+(?:year\s+)?)?((?:19|20)\d{2})\b")
+LATEST_PATTERN = re.compile(r"\b(latest|most recent|recent|last reported)\b")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+TICKER_PATTERN = re.compile(r"\b[A-Z][A-Z.]{0,5}\b")
+
+# Any of these means the user wants prose, not a number: leave it to the LLM
+QUALITATIVE_CUES = {
+    "risk", "risks", "why", "how", "explain", "describe", "strategy", "summary", "summarize",
+    "outlook", "competition", "competitors", "guidance", "impact", "affect", "trend", "trends",
+    "drive", "drove", "drivers", "factors", "discuss", "opinion", "should", "buy", "sell"
+}
+COMPARISON_CUES = {"compare", "comparison", "vs", "versus", "against", "between"}
+# A quarter, a derived figure, a forecast or a negation: the annual metric intent can't express these,
+# and reading past them answers a different question. Leave them to the LLM.
+VETO_WORDS = {
+    "q1", "q2", "q3", "q4", "quarter", "quarters", "quarterly", "ytd", "ttm",
+    "growth", "grow", "grew", "change", "increase", "decrease", "margin", "margins", "ratio",
+    "forecast", "forecasts", "projected", "projection", "estimate", "estimates", "expected",
+    "not", "except", "excluding", "without"
+}
+
+# Words a plain metric/comparison question is made of, besides the entities themselves
+FILLER_WORDS = {
+    "what", "was", "is", "were", "the", "for", "in", "of", "a", "an", "and", "show", "me", "give",
+    "get", "tell", "about", "s", "fy", "fiscal", "year", "total", "reported", "did", "have", "has",
+    "their", "its", "value", "much", "number", "figure", "annual", "please", "to", "with", "from",
+    "latest", "most", "recent", "last", "chart", "plot", "graph"
+}
+
+# Max words we can't account for before we stop trusting the fast path: any unknown word may change the question
+MAX_UNEXPLAINED_WORDS = 0
+
+def _split_camel(tag: str) -> str:
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", " ", tag).lower()
+
+def _build_metric_phrases() -> dict:
+    """
+    phrase (lowercase words) -> canonical metric name, from both METRIC_ALIASES vocabularies.
+    """
+    phrases = {}
+    for canonical, tags in METRIC_ALIASES.items():
+        phrases[canonical.lower()] = canonical
+        for tag in tags:
+            phrases[tag.lower()] = canonical
+            phrases[_split_camel(tag)] = canonical
+    for canonical, aliases in TEXT_METRIC_ALIASES.items():
+        for alias in aliases:
+            phrases[alias.lower()] = canonical
+    # Common phrasings not in either vocabulary. Bare "income"/"profit" are ambiguous on purpose,
+    # and margins are ratios, not the profit figures they are computed from.
+    phrases.update({
+        "sales": "Revenue", "earnings": "Net Income", "net profit": "Net Income",
+        "earnings per share": "EPS", "eps": "EPS", "operating profit": "Operating Income"
+    })
+    return phrases
+
+class FastIntentRouter:
+    """
+    Deterministic classifier for unambiguous metric and comparison queries
+    (e.g. "AAPL revenue 2023", "Compare MSFT and GOOGL net income", "AAPL revenue and net income 2022 2023").
+
+    Expects entity-normalized queries (company names already replaced by tickers).
+    Returns None whenever it isn't confident, so the caller falls back to the LLM.
+    """
+
+    def __init__(self, tickers=None):
+        self.tickers = {t.upper() for t in (tickers or TICKER_TO_CIK)}
+        self.metric_phrases = _build_metric_phrases()
+        # Longest phrases first so "net income" wins over "income"-style partial overlaps
+        alternatives = sorted(self.metric_phrases, key=len, reverse=True)
+        self.metric_pattern = re.compile(r"\b(" + "|".join(re.escape(p) for p in alternatives) + r")\b")
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+
+    def _record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.fallbacks += 1
+
+    def route(self, query: str) -> Optional[dict]:
+        intent = self._route(query)
+        self._record(intent is not None)
+        return intent
+
+    def _route(self, query: str) -> Optional[dict]:
+        lowered = query.lower()
+        # Year tokens ("2023", "FY2023", "fiscal year 2023") are parsed separately below
+        words = WORD_PATTERN.findall(YEAR_PATTERN.sub(" ", lowered))
+        if QUALITATIVE_CUES.intersection(words) or VETO_WORDS.intersection(words):
+            return None
+
+        # Tickers must be upper case: the entity normalizer produces them that way,
+        # and it keeps words like "meta" or "now" from being read as tickers
+        companies = []
+        for token in TICKER_PATTERN.findall(query):
+            if token in self.tickers and token not in companies:
+                companies.append(token)
+        if not companies:
+            return None
+
+        # Several metrics and/or years make a query plan ("Revenue, Net Income and Total Assets for AAPL")
+        metrics = []
+        for phrase in self.metric_pattern.findall(lowered):
+            if self.metric_phrases[phrase] not in metrics:
+                metrics.append(self.metric_phrases[phrase])
+        if not metrics:
+            return None
+        metric = metrics[0]
+
+        years = sorted({int(y) for y in YEAR_PATTERN.findall(lowered)})
+        if years:
+            year = years[-1]
+        else:
+            year = LATEST_YEAR if LATEST_PATTERN.search(lowered) else 0
+
+        # Everything left over must be filler; otherwise the query says something we don't model
+        explained = set(FILLER_WORDS) | COMPARISON_CUES | {c.lower() for c in companies}
+        for phrase in self.metric_pattern.findall(lowered):
+            explained.update(phrase.split())
+        unexplained = [w for w in words if w not in explained]
+        if len(unexplained) > MAX_UNEXPLAINED_WORDS:
+            return None
+
+        intent = {"companies": companies, "metric": metric, "metrics": metrics, "year": year, "years": years, "source": "fast_path"}
+        is_comparison = len(companies) > 1 or bool(COMPARISON_CUES.intersection(words))
+        if is_comparison:
+            if len(companies) < 2:
+                return None
+            return {"type": "comparison", **intent}
+
+        # A single number needs a year; "year 0" would just be "Data not found".
+        # Multi-metric plans without a year fall back to the default window instead.
+        if not year and len(metrics) == 1:
+            return None
+        return {"type": "metric", **intent}
+
+    def stats(self) -> dict:
+        total = self.hits + self.fallbacks
+        return {
+            "fast_path_hits": self.hits,
+            "llm_fallbacks": self.fallbacks,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+# Shared across requests so hit-rate counters cover the whole process
+FAST_ROUTER = FastIntentRouter()
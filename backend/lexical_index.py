@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import math
+from array import array
+from collections import Counter
+from typing import List, Tuple
+import numpy as np
+from utils import LOCAL_INDEX_DIR
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+# Kept short on purpose: filings are full of legal boilerplate, but words like
+# "not" or "may" still matter for risk language, so only drop pure glue words.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "their", "this",
+    "to", "was", "were", "what", "which", "with", "our", "we", "us"
+}
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase and split text into BM25 terms.
+    """
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """
+    Local BM25 inverted index over ingested chunks. Stores ids only; chunk text lives in the ChunkStore.
+
+    Postings are kept per term as two parallel arrays (doc positions, term frequencies).
+    On disk they are concatenated into flat numpy arrays with delta-encoded doc positions,
+    so the file stays small and loads without per-posting Python objects.
+    """
+
+    def __init__(self, path: str = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path or os.path.join(LOCAL_INDEX_DIR, "bm25.npz")
+        self.k1 = k1
+        self.b = b
+
+        self.doc_ids: List[str] = []
+        self.doc_lens = array('I')
+        self._id_to_pos = {}
+        self._deleted = set()
+        self._total_len = 0
+        # term -> (doc positions, term frequencies); numpy arrays when loaded, array('I') once mutated
+        self._postings = {}
+
+        if os.path.exists(self.path):
+            self.load()
+
+    def __len__(self):
+        return len(self.doc_ids) - len(self._deleted)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_pos
+
+    def _mutable_postings(self, term: str) -> Tuple[array, array]:
+        docs, tfs = self._postings.get(term, (None, None))
+        if docs is None:
+            docs, tfs = array('I'), array('I')
+        elif not isinstance(docs, array):
+            docs, tfs = array('I', docs.tolist()), array('I', tfs.tolist())
+        self._postings[term] = (docs, tfs)
+        return docs, tfs
+
+    def add_documents(self, ids: List[str], texts: List[str]):
+        """
+        Add (or replace) documents in the index.
+        """
+        for doc_id, text in zip(ids, texts):
+            if doc_id in self._id_to_pos:
+                self.remove_documents([doc_id])
+
+            terms = Counter(tokenize(text))
+            pos = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self._id_to_pos[doc_id] = pos
+
+            doc_len = sum(terms.values())
+            self.doc_lens.append(doc_len)
+            self._total_len += doc_len
+
+            for term, tf in terms.items():
+                docs, tfs = self._mutable_postings(term)
+                docs.append(pos)
+                tfs.append(tf)
+
+    def remove_documents(self, ids: List[str]):
+        """
+        Tombstone documents. Their postings are dropped on the next save.
+        """
+        for doc_id in ids:
+            pos = self._id_to_pos.pop(doc_id, None)
+            if pos is None:
+                continue
+            self._deleted.add(pos)
+            self._total_len -= self.doc_lens[pos]
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Score documents with BM25 and return the top_k (doc_id, score) pairs.
+        """
+        n_docs = len(self)
+        if n_docs == 0:
+            return []
+
+        avgdl = self._total_len / n_docs
+        doc_lens = np.frombuffer(self.doc_lens, dtype=np.uint32).astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_lens / avgdl)
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        live = np.ones(len(self.doc_ids), dtype=bool)
+        if self._deleted:
+            live[list(self._deleted)] = False
+
+        for term in set(tokenize(query)):
+            docs, tfs = self._postings.get(term, (None, None))
+            if docs is None or len(docs) == 0:
+                continue
+            docs = np.asarray(docs, dtype=np.int64)
+            tfs = np.asarray(tfs, dtype=np.float32)
+
+            df = int(live[docs].sum())
+            if df == 0:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            # Doc positions are unique within a postings list, so plain fancy-index += is safe
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        scores[~live] = 0
+
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(self.doc_ids[i], float(scores[i])) for i in ranked if scores[i] > 0]
+
+    def _compact(self):
+        """
+        Drop tombstoned documents and renumber doc positions.
+        """
+        if not self._deleted:
+            return
+
+        remap = np.full(len(self.doc_ids), -1, dtype=np.int64)
+        live = [i for i in range(len(self.doc_ids)) if i not in self._deleted]
+        remap[live] = np.arange(len(live))
+
+        postings = {}
+        for term, (docs, tfs) in self._postings.items():
+            docs = np.asarray(docs, dtype=np.int64)
+            tfs = np.asarray(tfs, dtype=np.uint32)
+            keep = remap[docs] >= 0
+            if keep.any():
+                postings[term] = (remap[docs[keep]].astype(np.uint32), tfs[keep])
+        self._postings = postings
+
+        self.doc_ids = [self.doc_ids[i] for i in live]
+        self.doc_lens = array('I', [self.doc_lens[i] for i in live])
+        self._id_to_pos = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self._deleted = set()
+
+    def save(self):
+        """
+        Persist the index as flat, delta-encoded postings arrays.
+        """
+        self._compact()
+
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_parts, tf_parts = [], []
+        for i, term in enumerate(terms):
+            docs, tfs = self._postings[term]
+            docs = np.asarray(docs, dtype=np.uint32)
+            # Delta-encode doc positions: small gaps compress far better than absolute ids
+            doc_parts.append(np.diff(docs, prepend=np.uint32(0)).astype(np.uint32))
+            tf_parts.append(np.minimum(np.asarray(tfs), 65535).astype(np.uint16))
+            offsets[i + 1] = offsets[i] + len(docs)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            header=np.frombuffer(json.dumps({
+                "doc_ids": self.doc_ids,
+                "terms": terms,
+                "k1": self.k1,
+                "b": self.b
+            }).encode("utf-8"), dtype=np.uint8),
+            doc_lens=np.frombuffer(self.doc_lens, dtype=np.uint32),
+            offsets=offsets,
+            postings_docs=np.concatenate(doc_parts) if doc_parts else np.zeros(0, dtype=np.uint32),
+            postings_tfs=np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.uint16)
+        )
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        with np.load(self.path) as data:
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            offsets = data["offsets"]
+            postings_docs = data["postings_docs"]
+            postings_tfs = data["postings_tfs"]
+            self.doc_lens = array('I', data["doc_lens"].tolist())
+
+        self.doc_ids = header["doc_ids"]
+        self.k1 = header.get("k1", self.k1)
+        self.b = header.get("b", self.b)
+        self._id_to_pos = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self._deleted = set()
+        self._total_len = int(sum(self.doc_lens))
+
+        self._postings = {}
+        for i, term in enumerate(header["terms"]):
+            start, end = offsets[i], offsets[i + 1]
+            docs = np.cumsum(postings_docs[start:end], dtype=np.uint32)
+            self._postings[term] = (docs, postings_tfs[start:end].astype(np.uint32))
+
+_SHARED_INDEXES = {}
+
+def get_bm25_index(path: str = None) -> BM25Index:
+    """
+    Process-wide BM25 index, reloaded only when the file on disk changes.
+    VectorDB is built per request, so loading the index every time would dominate query latency.
+    """
+    path = path or os.path.join(LOCAL_INDEX_DIR, "bm25.npz")
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+
+    cached = _SHARED_INDEXES.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, BM25Index(path))
+        _SHARED_INDEXES[path] = cached
+    return cached[1]
@@ -0,0 +1,291 @@
+import os
+import json
+import threading
+from typing import List, Tuple
+import numpy as np
+from utils import LOCAL_INDEX_DIR
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# How many quantized candidates to rerank with full-precision vectors, per requested result.
+# Binary codes keep 1 bit per dimension, so they need a much deeper shortlist than int8.
+RERANK_MULTIPLIER = {"none": 1, "int8": 4, "binary": 30}
+
+# Rows scanned per block: bounds the temporary float32 copy to a few tens of MB
+SCAN_BLOCK = 16384
+# int8 blocks are widened to float32 before the BLAS matvec; small blocks keep that copy in L2 cache
+INT8_SCAN_BLOCK = 2048
+
+def _popcount_rows(x: np.ndarray) -> np.ndarray:
+    """
+    Per-row popcount of a uint8 matrix.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).sum(axis=1, dtype=np.int32)
+    return np.unpackbits(x, axis=1).sum(axis=1, dtype=np.int32)
+
+class LocalVectorIndex:
+    """
+    In-process vector index with quantized candidate scan and exact rerank.
+
+    Full-precision (normalized float32) vectors are appended to a raw file and read through a
+    memory map, so they are only paged in for reranking. Only the quantized codes stay resident:
+      - int8:   1 byte/dim plus a per-vector scale (~4x smaller than float32)
+      - binary: 1 bit/dim sign codes compared with Hamming distance (~32x smaller)
+    All files are append-only; codes can always be rebuilt from the float32 file.
+    """
+
+    def __init__(self, path: str = None, dim: int = 1536, quantization: str = "int8"):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{quantization}'. Expected one of {QUANTIZATION_MODES}.")
+
+        self.path = path or os.path.join(LOCAL_INDEX_DIR, "vectors")
+        self.dim = dim
+        self.quantization = quantization
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        self.ids: List[str] = []
+        self._id_to_pos = {}
+        self._deleted = set()
+        self.load()
+
+    # --- Files ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def load(self):
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["dim"] != self.dim:
+                raise ValueError(f"Index at {self.path} has dim {meta['dim']}, expected {self.dim}.")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dim": self.dim}, f)
+
+        ids_text = ""
+        if os.path.exists(self._file("ids.txt")):
+            with open(self._file("ids.txt")) as f:
+                ids_text = f.read()
+        # A torn last line is an id that was never completely written
+        self.ids = ids_text[:ids_text.rfind("\n") + 1].splitlines()
+        if os.path.exists(self._file("deleted.txt")):
+            with open(self._file("deleted.txt")) as f:
+                self._deleted = {int(line) for line in f if line.strip()}
+
+        # A crash between appends can leave files of different lengths. Trust the shortest and cut the
+        # others back to it, so the next append lands on the same row in every file.
+        f32_path = self._file("vectors.f32")
+        f32_rows = os.path.getsize(f32_path) // (4 * self.dim) if os.path.exists(f32_path) else 0
+        rows = min(len(self.ids), f32_rows)
+        self.ids = self.ids[:rows]
+        if os.path.exists(f32_path) and os.path.getsize(f32_path) > rows * 4 * self.dim:
+            os.truncate(f32_path, rows * 4 * self.dim)
+        if len(ids_text) != sum(len(doc_id) + 1 for doc_id in self.ids):
+            with open(self._file("ids.txt"), "w") as f:
+                f.write("".join(f"{doc_id}\n" for doc_id in self.ids))
+        if any(pos >= rows for pos in self._deleted):
+            self._deleted = {pos for pos in self._deleted if pos < rows}
+            with open(self._file("deleted.txt"), "w") as f:
+                f.write("".join(f"{pos}\n" for pos in sorted(self._deleted)))
+        self._id_to_pos = {doc_id: i for i, doc_id in enumerate(self.ids) if i not in self._deleted}
+
+        self._load_codes()
+
+    def _vectors(self) -> np.ndarray:
+        if not self.ids:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+
+    def _load_codes(self):
+        self.codes = None
+        self.scales = None
+        self._pending = []
+        if self.quantization == "none":
+            return
+
+        code_width = self.dim if self.quantization == "int8" else (self.dim + 7) // 8
+        code_dtype = np.int8 if self.quantization == "int8" else np.uint8
+        codes_path = self._file(f"codes.{self.quantization}")
+        scales_path = self._file("scales.f32")
+
+        codes = np.fromfile(codes_path, dtype=code_dtype) if os.path.exists(codes_path) else np.zeros(0, dtype=code_dtype)
+        codes = codes[:len(codes) - len(codes) % code_width].reshape(-1, code_width)
+        rows = min(len(codes), len(self.ids))
+        if self.quantization == "int8":
+            scales = np.fromfile(scales_path, dtype=np.float32) if os.path.exists(scales_path) else np.zeros(0, dtype=np.float32)
+            rows = min(rows, len(scales))
+            self.scales = scales[:rows]
+        self.codes = codes[:rows]
+
+        # Codes for rows that never got an id (torn append) would shift every later row
+        if os.path.exists(codes_path) and os.path.getsize(codes_path) > self.codes.nbytes:
+            os.truncate(codes_path, self.codes.nbytes)
+        if self.scales is not None and os.path.exists(scales_path) and os.path.getsize(scales_path) > self.scales.nbytes:
+            os.truncate(scales_path, self.scales.nbytes)
+
+        # Rebuild any codes missing relative to the float32 file (torn append, or a switched mode)
+        if rows < len(self.ids):
+            with open(codes_path, "wb") as f:
+                f.write(self.codes.tobytes())
+            if self.scales is not None:
+                with open(scales_path, "wb") as f:
+                    f.write(self.scales.tobytes())
+            vectors = self._vectors()
+            for start in range(rows, len(self.ids), SCAN_BLOCK):
+                self._append_codes(np.asarray(vectors[start:start + SCAN_BLOCK]))
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.quantization == "int8":
+            # Symmetric per-vector scaling keeps the full int8 range for every vector
+            max_abs = np.maximum(np.abs(vectors).max(axis=1), 1e-12)
+            scales = (127.0 / max_abs).astype(np.float32)
+            codes = np.round(vectors * scales[:, None]).astype(np.int8)
+            return codes, scales
+        return np.packbits(vectors > 0, axis=1), None
+
+    def _append_codes(self, vectors: np.ndarray):
+        codes, scales = self._quantize(vectors)
+        with open(self._file(f"codes.{self.quantization}"), "ab") as f:
+            f.write(codes.tobytes())
+        if scales is not None:
+            with open(self._file("scales.f32"), "ab") as f:
+                f.write(scales.tobytes())
+        # Concatenated lazily on the next search so bulk ingestion doesn't copy the codes per batch
+        self._pending.append((codes, scales))
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        self.codes = np.concatenate([self.codes] + [codes for codes, _ in self._pending])
+        if self.scales is not None:
+            self.scales = np.concatenate([self.scales] + [scales for _, scales in self._pending])
+        self._pending = []
+
+    # --- Writes ---
+
+    def add(self, ids: List[str], vectors: List[List[float]]):
+        """
+        Append (or replace) vectors. Vectors are L2-normalized so dot product == cosine.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            replaced = [self._id_to_pos[doc_id] for doc_id in ids if doc_id in self._id_to_pos]
+            self._tombstone(replaced)
+
+            start = len(self.ids)
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            if self.quantization != "none":
+                self._append_codes(vectors)
+            with open(self._file("ids.txt"), "a") as f:
+                f.write("".join(f"{doc_id}\n" for doc_id in ids))
+
+            for offset, doc_id in enumerate(ids):
+                self.ids.append(doc_id)
+                self._id_to_pos[doc_id] = start + offset
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            positions = [self._id_to_pos.pop(doc_id) for doc_id in ids if doc_id in self._id_to_pos]
+            self._tombstone(positions)
+
+    def _tombstone(self, positions: List[int]):
+        if not positions:
+            return
+        self._deleted.update(positions)
+        with open(self._file("deleted.txt"), "a") as f:
+            f.write("".join(f"{pos}\n" for pos in positions))
+
+    def __len__(self):
+        return len(self._id_to_pos)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_pos
+
+    # --- Search ---
+
+    def _scan(self, query: np.ndarray, shortlist: int) -> np.ndarray:
+        """
+        Blocked scan over the in-RAM codes (or the float32 memmap when unquantized).
+        Returns live candidate positions, best first.
+        """
+        n = len(self.ids)
+        scores = np.empty(n, dtype=np.float32)
+
+        if self.quantization == "int8":
+            q_scale = 127.0 / max(float(np.abs(query).max()), 1e-12)
+            q_codes = np.round(query * q_scale).astype(np.float32)
+            for start in range(0, n, INT8_SCAN_BLOCK):
+                end = start + INT8_SCAN_BLOCK
+                block = self.codes[start:end].astype(np.float32)
+                scores[start:end] = (block @ q_codes) / (self.scales[start:end] * q_scale)
+        elif self.quantization == "binary":
+            q_bits = np.packbits(query > 0)
+            for start in range(0, n, SCAN_BLOCK):
+                # Fewer differing sign bits == closer; negate so higher is better
+                scores[start:start + SCAN_BLOCK] = -_popcount_rows(np.bitwise_xor(self.codes[start:start + SCAN_BLOCK], q_bits))
+        else:
+            vectors = self._vectors()
+            for start in range(0, n, SCAN_BLOCK):
+                scores[start:start + SCAN_BLOCK] = np.asarray(vectors[start:start + SCAN_BLOCK]) @ query
+
+        if self._deleted:
+            scores[list(self._deleted)] = -np.inf
+
+        shortlist = min(shortlist, n)
+        candidates = np.argpartition(-scores, shortlist - 1)[:shortlist]
+        # A shortlist longer than the live rows takes tombstones too; they must not reach the rerank
+        if self._deleted:
+            candidates = candidates[scores[candidates] != -np.inf]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def search(self, query_vector: List[float], top_k: int = 10, rerank_multiplier: int = None) -> List[Tuple[str, float]]:
+        """
+        Return the top_k (id, cosine similarity) pairs.
+        """
+        if len(self) == 0:
+            return []
+        with self._lock:
+            self._merge_pending()
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        multiplier = rerank_multiplier or RERANK_MULTIPLIER[self.quantization]
+        candidates = self._scan(query, top_k * multiplier)
+
+        # Exact rerank: read only the shortlisted rows from the memory-mapped float32 file
+        positions = np.sort(candidates)
+        exact = np.asarray(self._vectors()[positions]) @ query
+        order = np.argsort(-exact)[:top_k]
+        return [(self.ids[positions[i]], float(exact[i])) for i in order]
+
+    def resident_bytes(self) -> int:
+        """
+        Bytes held in RAM by the quantized codes (the float32 vectors stay on disk).
+        """
+        self._merge_pending()
+        total = 0
+        if self.codes is not None:
+            total += self.codes.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        return total
+
+_SHARED_INDEXES = {}
+
+def get_local_vector_index(path: str = None, dim: int = 1536, quantization: str = None) -> LocalVectorIndex:
+    """
+    Process-wide LocalVectorIndex, so codes are loaded once rather than per request.
+    """
+    quantization = quantization or os.getenv("VECTOR_QUANTIZATION", "int8")
+    key = (path, dim, quantization)
+    if key not in _SHARED_INDEXES:
+        _SHARED_INDEXES[key] = LocalVectorIndex(path=path, dim=dim, quantization=quantization)
+    return _SHARED_INDEXES[key]
@@ -1,8 +1,17 @@
 from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from typing import List
 from pydantic import BaseModel
-from orchestrator import Orchestrator
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from tracing import render_metrics, monitor_event_loop, LOOP_LAG_INTERVAL
+from admission import get_admission_controller, Overloaded
+from warmup import WARMUP_ENABLED, run_warmup
+import sys
+import json
+import asyncio
+
+# The query pipeline (orchestrator, batch, database, caches) is imported inside the endpoints that use it:
+# LangChain/OpenAI/Pinecone/SQLAlchemy stay out of cold start and /health never loads them.
 
 app = FastAPI()
 
@@ -15,8 +24,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class AdmittedResponse(StreamingResponse):
+    """
+    Streaming response that returns its admission slot however it ends. A `finally` in the body generator
+    is not enough: the generator never starts when the client disconnects before streaming does, and is
+    left suspended when a send fails.
+    """
+
+    def __init__(self, content, ticket, orchestrator, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+        self.orchestrator = orchestrator
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.ticket.release()
+            self.orchestrator.close()
+
 class QueryRequest(BaseModel):
     query: str
+    # Send a per-stage timing summary as a final `trace` event
+    trace: bool = False
 
 @app.post("/chat")
 async def chat_endpoint(request: QueryRequest, authorization: str = Header(None)):
@@ -24,27 +54,133 @@ async def chat_endpoint(request: QueryRequest, authorization: str = Header(None)
         raise HTTPException(status_code=401, detail="Missing or invalid API Key")
     
     user_api_key = authorization.split(" ")[1]
+
+    # Refuse straight away when the queue is full instead of letting the request fail slowly upstream
+    try:
+        ticket = get_admission_controller().admit(user_api_key)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     
     try:
+        from orchestrator import Orchestrator
         # Instantiate Orchestrator per request with the user's key
         orchestrator = Orchestrator(api_key=user_api_key)
         
         async def response_generator():
-            try:
-                # Assuming handle_query yields strings/bytes
-                async for chunk in orchestrator.handle_query(request.query):
-                    yield chunk
-            finally:
-                orchestrator.close()
+            if not ticket.granted:
+                yield json.dumps({"type": "log", "message": f"Queued: position {ticket.position()}, waiting for capacity..."}) + "\n\n"
+                try:
+                    waited = await ticket.wait()
+                except Overloaded as e:
+                    yield json.dumps({"type": "result", "data": f"The service is busy. {e}."}) + "\n\n"
+                    return
+                yield json.dumps({"type": "log", "message": f"Admitted after {waited:.1f}s in queue."}) + "\n\n"
+
+            # Assuming handle_query yields strings/bytes
+            async for chunk in orchestrator.handle_query(request.query, trace=request.trace):
+                yield chunk
 
-        return StreamingResponse(
+        # The response, not the generator, releases the ticket
+        return AdmittedResponse(
             response_generator(),
+            ticket,
+            orchestrator,
             media_type="text/event-stream"
         )
     except Exception as e:
+        ticket.release()
+        print(f"API Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BatchRequest(BaseModel):
+    queries: List[str]
+
+@app.post("/batch")
+async def batch_endpoint(request: BatchRequest, authorization: str = Header(None)):
+    """
+    Answer many queries in one request. Streams one NDJSON line per query in completion order,
+    then a summary line.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid API Key")
+    from batch import BatchRunner, BATCH_MAX_QUERIES
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+
+    user_api_key = authorization.split(" ")[1]
+
+    # A batch takes one admission slot; its own concurrency is bounded by BatchRunner
+    try:
+        ticket = get_admission_controller().admit(user_api_key)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    try:
+        from orchestrator import Orchestrator
+        # One Orchestrator for the whole batch
+        orchestrator = Orchestrator(api_key=user_api_key)
+        runner = BatchRunner(orchestrator)
+
+        async def response_generator():
+            try:
+                await ticket.wait()
+            except Overloaded as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+                return
+            async for line in runner.run(request.queries):
+                yield line
+
+        return AdmittedResponse(
+            response_generator(),
+            ticket,
+            orchestrator,
+            media_type="application/x-ndjson"
+        )
+    except Exception as e:
+        ticket.release()
         print(f"API Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+_warmup_task = None
+_lag_task = None
+
+@app.on_event("startup")
+async def startup():
+    global _warmup_task, _lag_task
+    # Runs in the background: startup (and so /health) doesn't wait for it
+    if WARMUP_ENABLED:
+        _warmup_task = asyncio.create_task(run_warmup())
+    # Blocking work on the loop shows up in /metrics as sovereign_event_loop_lag_seconds
+    if LOOP_LAG_INTERVAL > 0:
+        _lag_task = asyncio.create_task(monitor_event_loop())
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in (_warmup_task, _lag_task):
+        if task is not None and not task.done():
+            task.cancel()
+    # Nothing to dispose if no request ever touched the database
+    if "database" in sys.modules:
+        from database import dispose_async_engine
+        await dispose_async_engine()
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, errors, cache and token counters.
+    """
+    # Caches that were never imported have nothing to report; don't load them just for a scrape
+    cache_stats = {}
+    if "answer_cache" in sys.modules:
+        from answer_cache import get_answer_cache
+        cache_stats["answer"] = get_answer_cache().stats()
+    if "embedding_cache" in sys.modules:
+        from embedding_cache import get_embedding_cache
+        cache_stats["embedding"] = get_embedding_cache().stats()
+    return PlainTextResponse(render_metrics(cache_stats), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
@@ -30,3 +30,56 @@ class FinancialMetric(Base):
 
     def __repr__(self):
         return f"<FinancialMetric(metric='{self.metric_name}', val={self.value}, year={self.fiscal_year})>"
+
+class UnreportedMetric(Base):
+    """
+    Annual cells a company's 10-K doesn't report (e.g. no GrossProfit line), so query plans stop
+    downloading its companyfacts to look for them again. Only recorded once that year's 10-K is in.
+    """
+    __tablename__ = 'unreported_metrics'
+
+    company_cik = Column(String, primary_key=True)
+    metric_name = Column(String, primary_key=True)
+    fiscal_year = Column(Integer, primary_key=True)
+
+    def __repr__(self):
+        return f"<UnreportedMetric(cik='{self.company_cik}', metric='{self.metric_name}', year={self.fiscal_year})>"
+
+class IndexedChunk(Base):
+    """
+    Manifest of what is currently in the vector index, per filing.
+    Lets re-ingestion diff by content hash instead of blindly re-upserting.
+    """
+    __tablename__ = 'indexed_chunks'
+
+    chunk_id = Column(String, primary_key=True)
+    filing_key = Column(String, nullable=False, index=True) # e.g. AAPL_2023
+    content_hash = Column(String, nullable=False)
+
+    def __repr__(self):
+        return f"<IndexedChunk(id='{self.chunk_id}', filing='{self.filing_key}')>"
+
+class IngestedFiling(Base):
+    """
+    Ingestion manifest, one row per filing (keyed by accession number, which EDGAR never reuses).
+    Records how far ingestion got, so an interrupted batch_ingest run resumes instead of starting over.
+    """
+    __tablename__ = 'ingested_filings'
+
+    accession_number = Column(String, primary_key=True)
+    cik = Column(String, nullable=False, index=True)
+    ticker = Column(String, nullable=False)
+    form_type = Column(String, nullable=False) # e.g. 10-K, 10-Q
+    filing_date = Column(String, nullable=False) # YYYY-MM-DD
+    report_date = Column(String, nullable=True) # period end, YYYY-MM-DD
+    filing_key = Column(String, nullable=True) # chunk manifest key, see IndexedChunk
+    content_hash = Column(String, nullable=True) # sha256 of the downloaded submission
+    stage = Column(String, nullable=False) # last completed stage, see ingest_manifest.STAGES
+    chunks = Column(Integer, nullable=True)
+    batches_total = Column(Integer, nullable=True)
+    batches_done = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    updated_at = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<IngestedFiling(accession='{self.accession_number}', ticker='{self.ticker}', stage='{self.stage}')>"
@@ -1,106 +1,252 @@
-from agents import QueryClassifier, AnalysisAgent
-from repository import FinancialDataRepository
-from vector_store import VectorDB
+from agents import QueryClassifier, AnalysisAgent, build_query_plan
+from repository import AsyncFinancialDataRepository
 from retriever import SECDataRetriever
-from database import get_db_session
-from database import get_db_session
 from langchain_openai import ChatOpenAI
 from guardrail import InputGuardrail
+from answer_cache import get_answer_cache
+from entity_resolver import get_entity_resolver
+from context_builder import ContextBuilder, RAG_TOP_K
+from tracing import span, start_trace, token_usage, run_in_executor
+from admission import llm_slot
+from warmup import append_query_log
 import os
-import re
-
-# Entity Alias Mapping
-ENTITY_ALIASES = {
-    "Google": "GOOGL",
-    "Alphabet": "GOOGL",
-    "Facebook": "META",
-    "Meta Platforms": "META",
-    "Amazon": "AMZN",
-    "Apple": "AAPL",
-    "Microsoft": "MSFT",
-    "Nvidia": "NVDA",
-    "Tesla": "TSLA"
-}
+import json
+import time
+import asyncio
+from functools import cached_property
 
 class Orchestrator:
     def __init__(self, api_key: str):
+        self.api_key = api_key
         self.classifier = QueryClassifier(api_key=api_key)
         self.analysis_agent = AnalysisAgent()
         self.guardrail = InputGuardrail(api_key=api_key)
         
         # Initialize Repo
-        # Note: In a real app we'd manage the session lifecycle better (e.g. dependency injection)
-        self.db_session = next(get_db_session())
+        # Sessions are opened per operation from the pooled engines, not held for the whole request
         self.retriever = SECDataRetriever()
-        self.repo = FinancialDataRepository(self.db_session, self.retriever)
-        
-        self.vector_db = VectorDB(api_key=api_key)
+        self.async_repo = AsyncFinancialDataRepository(self.retriever)
         
+        self.answer_cache = get_answer_cache()
+        self.context_builder = ContextBuilder()
+
+    # Only RAG questions need the vector stack and the synthesis model; build them on first use
+    @cached_property
+    def vector_db(self):
+        from vector_store import VectorDB
+        return VectorDB(api_key=self.api_key)
+
+    @cached_property
+    def llm(self):
         # Summary LLM for RAG
-        self.llm = ChatOpenAI(
+        return ChatOpenAI(
             model="gpt-4o",
             temperature=0,
-            api_key=api_key
+            api_key=self.api_key,
+            # Report token usage on the final streamed chunk
+            stream_usage=True
         )
 
     def _normalize_query_entities(self, query: str) -> str:
         """
         Replace colloquial company names with valid tickers.
         """
-        normalized_query = query
-        for alias, ticker in ENTITY_ALIASES.items():
-            # Case insensitive replacement
-            pattern = re.compile(re.escape(alias), re.IGNORECASE)
-            normalized_query = pattern.sub(ticker, normalized_query)
-        return normalized_query
+        return get_entity_resolver().normalize(query)
+
+    def _intent_message(self, intent: dict) -> str:
+        if intent.get("source") == "fast_path":
+            return f"Intent detected: {intent.get('type')} (fast path)"
+        return f"Intent detected: {intent.get('type')}"
+
+    def _retrieve_context(self, normalized_query: str) -> dict:
+        """
+        Vector search for the RAG path, keeping the query embedding and chunk ids for the answer cache.
+        The chunks are then merged, deduplicated and trimmed to the context token budget.
+        """
+        embedding = None
+        if self.vector_db.mode != "lexical":
+            embedding = self.vector_db.embed_queries([normalized_query])[0]
+        chunks = self.vector_db.query_chunks(normalized_query, top_k=RAG_TOP_K, query_embedding=embedding)
+        texts = [text for _, text in chunks]
+        with span("context_build") as attrs:
+            context, context_stats = self.context_builder.build(texts)
+            attrs.update(tokens=context_stats["tokens_out"], tokens_saved=context_stats["tokens_saved"])
+        return {
+            "embedding": embedding,
+            "chunk_ids": [chunk_id for chunk_id, _ in chunks],
+            "chunks": texts,
+            "context": context,
+            "context_stats": context_stats
+        }
+
+    @staticmethod
+    def _plan_kind(intent: dict, plan: dict) -> str:
+        """
+        How a metric/comparison plan is answered: "single" (one number), "chart" (one metric
+        across companies and/or years) or "table" (several metrics).
+        """
+        if len(plan["metrics"]) > 1:
+            return "table"
+        explicit_years = {y for y in intent.get("years") or [] if y}
+        if (intent.get("type") == "metric" and len(plan["companies"]) <= 1
+                and len(explicit_years) <= 1 and not intent.get("year_range")):
+            return "single"
+        return "chart"
+
+    async def run_plan(self, intent: dict, partials: asyncio.Queue = None):
+        """
+        Answer a metric/comparison intent: the metric string, a chart payload or a markdown table.
+        Progress events are put on `partials` when given.
+        """
+        plan = build_query_plan(intent)
+        if not plan["companies"]:
+            return None
+        kind = self._plan_kind(intent, plan)
+        with span("plan", kind=kind, cells=len(plan["companies"]) * max(len(plan["metrics"]), 1) * len(plan["years"])):
+            return await self._run_plan(intent, plan, kind, partials)
+
+    async def _run_plan(self, intent: dict, plan: dict, kind: str, partials: asyncio.Queue = None):
+        if kind == "single":
+            if not plan["metrics"]:
+                return None
+            year = intent.get("year") or (plan["years"][0] if intent.get("years") else 0)
+            return await self.async_repo.get_metric(plan["companies"][0], plan["metrics"][0], year)
+
+        if kind == "chart":
+            metric = plan["metrics"][0] if plan["metrics"] else intent.get("metric")
+            chart_data = None
+            async for chart_data, done in self.analysis_agent.stream_comparison_data(self.async_repo, plan["companies"], metric, plan["years"]):
+                if not done and partials is not None:
+                    partials.put_nowait({"type": "partial", "data": chart_data})
+            return chart_data
+
+        # Several metrics: one batched lookup, rendered as a single table
+        values = {}
+        async for values, pending in self.analysis_agent.stream_plan_data(self.async_repo, plan):
+            if pending and partials is not None:
+                partials.put_nowait({"type": "log", "message": f"Fetching from SEC EDGAR API: {', '.join(sorted(pending))}..."})
+        return self.analysis_agent.table(plan, values)
+
+    @staticmethod
+    def rag_prompt(chunks, normalized_query: str) -> str:
+        context = "\n\n".join(chunks)
+        return f"""
+                You are a financial analyst helper. Use the following context to answer the user's question.
+                
+                Context:
+                {context}
+                
+                Question: {normalized_query}
+                
+                Answer concisely based ONLY on the context provided.
+                Format your answer in clean Markdown:
+                - Use bullet points for lists.
+                - Use **bold** for key numbers or terms.
+                - Keep paragraphs short.
+                """
+
+    async def _prefetch(self, intent: dict, normalized_query: str, partials: asyncio.Queue):
+        """
+        Speculatively start the data work for a classified query while the guardrail is still running.
+        Returns the fetched data, or the exception it raised, so errors surface only once the query is allowed.
+        Progress events for charts/tables are queued on `partials` (ended by None) rather than sent, for the same reason.
+        """
+        q_type = intent.get("type")
 
-    async def handle_query(self, user_query: str):
+        # Blocking clients run in the default executor. Cancelling this task stops us waiting on them,
+        # but an in-flight thread or SEC fetch still finishes (at worst it warms the metric cache).
+        try:
+            if q_type == "rag":
+                return await run_in_executor(self._retrieve_context, normalized_query)
+            if q_type not in ("metric", "comparison"):
+                return None
+
+            return await self.run_plan(intent, partials)
+        except Exception as e:
+            return e
+        finally:
+            partials.put_nowait(None)
+
+    async def handle_query(self, user_query: str, trace: bool = False):
+        """
+        Async generator for user queries. Yields log events and the final result, then a
+        `trace` event with per-stage timings when `trace` is set.
         """
-        Async generator for user queries. Yields log events and the final result.
+        with start_trace("chat") as request_trace:
+            with span("chat"):
+                async for event in self._handle_query(user_query):
+                    yield event
+        if trace:
+            yield json.dumps({"type": "trace", "data": request_trace.summary()}) + "\n\n"
+
+    async def _handle_query(self, user_query: str):
         """
-        import json
-        import asyncio
-        import re
+        Yields log events and the final result.
 
+        The guardrail and the intent classifier run concurrently. As soon as the intent is known,
+        the repository lookup / vector search starts speculatively; it is cancelled if the guardrail
+        blocks, and nothing is released to the user until the guardrail has allowed the query.
+        """
         # 1. Normalize Query Entities (Google -> GOOGL, etc.)
         # This helps the classifier and any downstream logic that expects tickers or specific names
         normalized_query = self._normalize_query_entities(user_query)
         if normalized_query != user_query:
             yield json.dumps({"type": "log", "message": f"Normalizing entities: '{user_query}' -> '{normalized_query}'"}) + "\n\n"
         
-        # 2. Classify (using Normalized Query)
-        # Note: We still pass original query to guardrail? No, usually normalized is better if it resolves ambiguity.
-        # But guardrail checks for off-topic which might be subtle. Let's pass original to guardrail to be safe?
-        # Actually, let's pass normalized to everything for consistency.
-        
         yield json.dumps({"type": "log", "message": f"Analyzing query: '{normalized_query}'..."}) + "\n\n"
         
-        # Guardrail Check
+        # 2. Guardrail + Classify, concurrently
         yield json.dumps({"type": "log", "message": "Guardrail: Checking query relevance..."}) + "\n\n"
+        guard_task = asyncio.create_task(self.guardrail.check_safety(normalized_query))
+        intent_task = asyncio.create_task(self.classifier.aclassify(normalized_query))
+        prefetch_task = None
+        partials = asyncio.Queue()
+        intent = None
+
         try:
-            safety_result = await self.guardrail.check_safety(normalized_query)
-            if not safety_result['allowed']:
-                yield json.dumps({"type": "log", "message": f"Guardrail Blocked: {safety_result.get('reason', 'Off-topic')}"}) + "\n\n"
-                yield json.dumps({"type": "result", "data": f"I cannot answer that. {safety_result.get('reason', 'It is off-topic')}. I specialize in financial analysis."}) + "\n\n"
-                return
-        except Exception as e:
-            # If guardrail fails, log it but maybe proceed with caution or fail open/closed?
-            # Creating a fail-open behavior for now to avoid blocking valid queries on error
-            yield json.dumps({"type": "log", "message": f"Guardrail warning: {e}"}) + "\n\n"
+            pending = {guard_task, intent_task}
+            while guard_task in pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
 
-        await asyncio.sleep(0.1)  # Tiny yield to ensure FLUSH
+                if intent_task in done:
+                    intent = intent_task.result()
+                    yield json.dumps({"type": "log", "message": self._intent_message(intent)}) + "\n\n"
+                    prefetch_task = asyncio.create_task(self._prefetch(intent, normalized_query, partials))
+
+                if guard_task in done:
+                    try:
+                        safety_result = guard_task.result()
+                    except Exception as e:
+                        # Fail open: a broken guardrail shouldn't block valid queries
+                        yield json.dumps({"type": "log", "message": f"Guardrail warning: {e}"}) + "\n\n"
+                        safety_result = {"allowed": True}
+
+                    if not safety_result['allowed']:
+                        yield json.dumps({"type": "log", "message": f"Guardrail Blocked: {safety_result.get('reason', 'Off-topic')}"}) + "\n\n"
+                        yield json.dumps({"type": "result", "data": f"I cannot answer that. {safety_result.get('reason', 'It is off-topic')}. I specialize in financial analysis."}) + "\n\n"
+                        return
+
+            if intent is None:
+                intent = await intent_task
+                yield json.dumps({"type": "log", "message": self._intent_message(intent)}) + "\n\n"
+                prefetch_task = asyncio.create_task(self._prefetch(intent, normalized_query, partials))
 
-        try:
-            intent = self.classifier.classify(normalized_query)
-            yield json.dumps({"type": "log", "message": f"Intent detected: {intent.get('type')}"}) + "\n\n"
-            
             q_type = intent.get("type")
-            companies = intent.get("companies", [])
+            companies = intent.get("companies") or []
             metric = intent.get("metric")
             year = intent.get("year", 2024)
+
+            # Metric and comparison intents are query plans: companies x metrics x years
+            plan, kind = None, None
+            if q_type in ("metric", "comparison"):
+                plan = build_query_plan(intent)
+                kind = self._plan_kind(intent, plan)
+                if kind == "single":
+                    companies, metric = plan["companies"], (plan["metrics"] or [None])[0]
+                    year = intent.get("year") or (plan["years"][0] if intent.get("years") else 0)
             
-            # 3. Route
-            if q_type == "metric":
+            # 3. Route (data was already requested by the prefetch task)
+            if q_type == "metric" and kind == "single":
                 if not companies or not metric:
                     yield json.dumps({"type": "result", "data": "I couldn't identify the company or metric. Please try again."}) + "\n\n"
                     return
@@ -108,78 +254,98 @@ class Orchestrator:
                 ticker = companies[0]
                 yield json.dumps({"type": "log", "message": f"Checking database for {ticker} {metric} ({year})..."}) + "\n\n"
                 
-                # Simulate a small delay for "thinking" feel if it's too fast, or just proceed
-                await asyncio.sleep(0.2)
-                
-                try:
-                    # Note: synchronous call wrapped in async def works, but blocks the loop. 
-                    # For full async we'd need run_in_executor, but this is fine for now.
-                    result = self.repo.get_metric(ticker, metric, year)
-                    
-                    if result and "cached" in str(result).lower():
-                         yield json.dumps({"type": "log", "message": "Data found in cache."}) + "\n\n"
-                    else:
-                         yield json.dumps({"type": "log", "message": "Fetching from SEC EDGAR API..."}) + "\n\n"
-
-                    yield json.dumps({"type": "result", "data": f"{result}"}) + "\n\n"
-                except Exception as e:
-                    yield json.dumps({"type": "result", "data": f"Error fetching metric: {str(e)}"}) + "\n\n"
+                result = await prefetch_task
+                if isinstance(result, Exception):
+                    yield json.dumps({"type": "result", "data": f"Error fetching metric: {str(result)}"}) + "\n\n"
+                    return
+
+                if result and "cached" in str(result).lower():
+                     yield json.dumps({"type": "log", "message": "Data found in cache."}) + "\n\n"
+                else:
+                     yield json.dumps({"type": "log", "message": "Fetching from SEC EDGAR API..."}) + "\n\n"
+
+                yield json.dumps({"type": "result", "data": f"{result}"}) + "\n\n"
 
             elif q_type == "rag":
                 yield json.dumps({"type": "log", "message": "Searching knowledge base (Vector DB)..."}) + "\n\n"
-                await asyncio.sleep(0.2)
                 
                 # Search Vector DB
-                chunks = self.vector_db.query_vectors(normalized_query, top_k=3)
+                retrieved = await prefetch_task
+                if isinstance(retrieved, Exception):
+                    raise retrieved
+                chunks = retrieved["chunks"]
                 
                 if not chunks:
                     yield json.dumps({"type": "result", "data": "I couldn't find any relevant documents."}) + "\n\n"
                     return
                 
                 yield json.dumps({"type": "log", "message": f"Found {len(chunks)} relevant text chunks."}) + "\n\n"
+                stats = retrieved["context_stats"]
+                yield json.dumps({"type": "log", "message": f"Context: {stats['passages']} passages, {stats['tokens_out']} tokens ({stats['tokens_saved']} saved by merging, deduplication and budget)."}) + "\n\n"
+
+                # Frequent questions get their embeddings primed by the next warm-up
+                append_query_log(normalized_query)
+
+                # Same question scope, same chunks, near-identical question: reuse the earlier answer
+                cache_filters = {"companies": sorted(companies), "year": year}
+                with span("answer_cache") as attrs:
+                    cached_answer = self.answer_cache.lookup(normalized_query, retrieved["embedding"], cache_filters, retrieved["chunk_ids"])
+                    attrs["cache"] = "miss" if cached_answer is None else "hit"
+                if cached_answer is not None:
+                    yield json.dumps({"type": "log", "message": "Answer served from cache."}) + "\n\n"
+                    yield json.dumps({"type": "result", "data": cached_answer}) + "\n\n"
+                    return
                 
                 # Summarize with LLM
                 yield json.dumps({"type": "log", "message": "Synthesizing answer with GPT-4o..."}) + "\n\n"
                 
-                context = "\n\n".join(chunks)
-                prompt = f"""
-                You are a financial analyst helper. Use the following context to answer the user's question.
-                
-                Context:
-                {context}
-                
-                Question: {normalized_query}
+                prompt = self.rag_prompt(retrieved["context"], normalized_query)
                 
-                Answer concisely based ONLY on the context provided.
-                Format your answer in clean Markdown:
-                - Use bullet points for lists.
-                - Use **bold** for key numbers or terms.
-                - Keep paragraphs short.
-                """
-                
-                response = self.llm.invoke(prompt)
-                yield json.dumps({"type": "result", "data": f"{response.content}"}) + "\n\n"
+                # Stream tokens as they arrive so the user sees the answer forming (TTFT, not total time)
+                started = time.perf_counter()
+                first_token_at = None
+                parts = []
+                with span("synthesis", model=self.llm.model_name) as attrs:
+                    async with llm_slot():
+                        async for chunk in self.llm.astream(prompt):
+                            attrs.update(token_usage(chunk))
+                            if not chunk.content:
+                                continue
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            parts.append(chunk.content)
+                            yield json.dumps({"type": "token", "data": chunk.content}) + "\n\n"
+                    answer = "".join(parts)
+
+                    finished = time.perf_counter()
+                    ttft = (first_token_at or finished) - started
+                    attrs["ttft_ms"] = round(ttft * 1000, 1)
+                yield json.dumps({"type": "log", "message": f"Synthesis: first token {ttft:.2f}s, complete {finished - started:.2f}s."}) + "\n\n"
 
-            elif q_type == "comparison":
-                if not companies:
-                     yield json.dumps({"type": "result", "data": "Please specify which companies to compare."}) + "\n\n"
+                self.answer_cache.store(normalized_query, retrieved["embedding"], cache_filters, retrieved["chunk_ids"], answer)
+                # Full answer is still sent as one result event for clients that ignore tokens
+                yield json.dumps({"type": "result", "data": answer}) + "\n\n"
+
+            elif q_type in ("metric", "comparison"):
+                if not plan["companies"]:
+                     yield json.dumps({"type": "result", "data": "Please specify which companies to compare." if q_type == "comparison" else "I couldn't identify the company or metric. Please try again."}) + "\n\n"
                      return
                 
-                yield json.dumps({"type": "log", "message": f"Generating {metric} comparison for {', '.join(companies)}..."}) + "\n\n"
-                await asyncio.sleep(0.2)
-                
-                target_years = [year-2, year-1, year] if year and year > 0 else []
+                metric_names = ", ".join(plan["metrics"]) or str(metric)
+                year_span = f"{plan['years'][0]}-{plan['years'][-1]}" if len(plan["years"]) > 1 else str(plan["years"][0])
+                yield json.dumps({"type": "log", "message": f"Generating {metric_names} {kind} for {', '.join(plan['companies'])} ({year_span})..."}) + "\n\n"
                 
-                # This returns the chart JSON directly
-                chart_data = self.analysis_agent.generate_comparison_data(
-                    self.repo, 
-                    companies, 
-                    metric, 
-                    target_years
-                )
+                # Companies arrive one at a time (cached ones first); send each partial chart or progress log as it lands
+                while (event := await partials.get()) is not None:
+                    yield json.dumps(event) + "\n\n"
+
+                # Chart JSON or markdown table, built from one batched lookup
+                result = await prefetch_task
+                if isinstance(result, Exception):
+                    raise result
                 
-                yield json.dumps({"type": "log", "message": "Chart data generated."}) + "\n\n"
-                yield json.dumps({"type": "result", "data": chart_data}) + "\n\n"
+                yield json.dumps({"type": "log", "message": "Chart data generated." if kind == "chart" else "Table generated."}) + "\n\n"
+                yield json.dumps({"type": "result", "data": result}) + "\n\n"
                 
             else:
                 yield json.dumps({"type": "result", "data": "I'm not sure how to handle that request."}) + "\n\n"
@@ -188,6 +354,14 @@ class Orchestrator:
             import traceback
             traceback.print_exc()
             yield json.dumps({"type": "result", "data": f"An error occurred: {str(e)}"}) + "\n\n"
+        finally:
+            # Blocked query, client disconnect or error: don't leave speculative work running
+            for task in (guard_task, intent_task, prefetch_task):
+                if task is not None and not task.done():
+                    task.cancel()
             
     def close(self):
-        self.db_session.close()
+        """
+        Nothing is held between operations any more; kept so callers can manage the lifecycle uniformly.
+        """
+
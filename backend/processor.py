@@ -1,8 +1,7 @@
-from bs4 import BeautifulSoup
+import io
 import re
 import os
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import ChatOpenAI
+import functools
 
 # Alias dictionary for text-based metric extraction
 METRIC_ALIASES = {
@@ -25,26 +24,85 @@ METRIC_ALIASES = {
     ]
 }
 
+# Item 1A up to Item 1B / Item 2; filings mention it in the table of contents too, so the longest match wins
+RISK_FACTORS_PATTERN = re.compile(
+    r'(?i)(?:Item\s+1A[\.\s]*Risk\s+Factors)(.*?)(?:Item\s+(?:1B|2)[\.\s])',
+    re.DOTALL
+)
+
+# bs4, the text splitter and langchain_openai are imported in SECFilingProcessor, not here:
+# the query path imports this module for METRIC_ALIASES only and shouldn't pay for the ingestion stack.
 class SECFilingProcessor:
     def __init__(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
             is_separator_regex=False,
         )
-        # Initialize LLM for smart extraction fallback
-        self.llm = ChatOpenAI(
+
+    @functools.cached_property
+    def llm(self):
+        """
+        LLM for the smart extraction fallback. Built on first use, so ingestion workers that only
+        clean and chunk text never need an OpenAI client.
+        """
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
             model="gpt-4o-mini",
             temperature=0,
             api_key=os.getenv("OPENAI_API_KEY")
         )
 
+    def extract_document(self, submission, form_type: str = "10-K") -> str:
+        """
+        Return the body of the main document (the one whose <TYPE> is the form itself) of a full
+        submission text file. Exhibits, XBRL and images are dropped.
+
+        `submission` is the text, or any iterable of lines, e.g. a stream from the filing store:
+        lines are consumed one at a time, only the main document is kept in memory, and reading
+        stops at its </DOCUMENT>. Falls back to the first document if none has the form's type;
+        input that isn't a submission file is returned as is.
+        """
+        lines = io.StringIO(submission) if isinstance(submission, str) else submission
+        whole, first, main = [], None, None
+        current, in_text = None, False
+        for line in lines:
+            tag = line.lstrip()[:12].upper()
+            if tag.startswith("<DOCUMENT>"):
+                whole = None
+                current, in_text = None, False
+            elif whole is not None:
+                whole.append(line)
+            elif tag.startswith("<TYPE>") and current is None:
+                doc_type = line.strip()[len("<TYPE>"):].strip().upper()
+                if main is None and doc_type == form_type.upper():
+                    current = main = []
+                elif first is None:
+                    current = first = []
+            elif tag.startswith("<TEXT>"):
+                in_text = True
+            elif tag.startswith("</TEXT>"):
+                in_text = False
+            elif tag.startswith("</DOCUMENT>"):
+                if main is not None:
+                    break
+                current = None
+            elif in_text and current is not None:
+                current.append(line)
+
+        if whole is not None:
+            return "".join(whole)
+        return "".join(main if main is not None else first or [])
+
     def clean_html(self, html_content: str) -> str:
         """
         Clean HTML content by removing scripts, styles, and tables,
         and extracting text.
         """
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html_content, 'html.parser')
         
         # Remove script and style elements
@@ -59,22 +117,32 @@ class SECFilingProcessor:
         text = soup.get_text(separator=" ", strip=True)
         return text
 
+    def find_sections(self, text: str) -> dict:
+        """
+        Character offsets of known sections in cleaned filing text: {"risk_factors": [start, end]}.
+        Sections that aren't found are absent.
+        """
+        spans = [match.span(1) for match in RISK_FACTORS_PATTERN.finditer(text)]
+        if not spans:
+            return {}
+        start, end = max(spans, key=lambda span: span[1] - span[0])
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return {"risk_factors": [start, end]}
+
     def extract_risk_factors(self, text: str) -> str:
         """
         Extract the 'Item 1A. Risk Factors' section using Regex.
         """
-        pattern = re.compile(
-            r'(?i)(?:Item\s+1A[\.\\s]*Risk\s+Factors)(.*?)(?:Item\s+(?:1B|2)[\.\\s])',
-            re.DOTALL
-        )
-        
-        matches = pattern.findall(text)
+        sections = self.find_sections(text)
         
-        if not matches:
+        if "risk_factors" not in sections:
              return "Risk Factors section not found."
              
-        longest_match = max(matches, key=len)
-        return longest_match.strip()
+        start, end = sections["risk_factors"]
+        return text[start:end]
 
     def chunk_text(self, text: str) -> list:
         """
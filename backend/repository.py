@@ -1,6 +1,10 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from models import Company, FinancialMetric
+from models import Company, FinancialMetric, UnreportedMetric
 from retriever import SECDataRetriever
+from tracing import span, run_in_executor
 
 # Helper mapping for Phase 2
 TICKER_TO_CIK = {
@@ -13,6 +17,17 @@ TICKER_TO_CIK = {
     'META': '1326801'
 }
 
+# Standard list of tech giants to track: seeded by init_db, and the default warm-up universe (see warmup.py)
+SEED_COMPANIES = [
+    {"ticker": "AAPL", "name": "Apple Inc.", "sector": "Technology", "cik": "0000320193"},
+    {"ticker": "MSFT", "name": "Microsoft Corp", "sector": "Technology", "cik": "0000789019"},
+    {"ticker": "GOOGL", "name": "Alphabet Inc.", "sector": "Technology", "cik": "0001652044"},
+    {"ticker": "AMZN", "name": "Amazon.com Inc.", "sector": "Consumer Cyclical", "cik": "0001018724"},
+    {"ticker": "NVDA", "name": "NVIDIA Corp", "sector": "Technology", "cik": "0001045810"},
+    {"ticker": "TSLA", "name": "Tesla Inc.", "sector": "Automotive", "cik": "0001318605"},
+    {"ticker": "META", "name": "Meta Platforms Inc.", "sector": "Technology", "cik": "0001326801"},
+]
+
 # Comprehensive alias dictionary for different companies' XBRL tags
 METRIC_ALIASES = {
     "Revenue": [
@@ -39,6 +54,85 @@ METRIC_ALIASES = {
     ]
 }
 
+# Metrics find_annual_value can return, and so the cache can hold: it reads USD facts, and EPS is in USD/shares
+STORED_METRICS = [name for name in METRIC_ALIASES if name != "EPS"]
+
+def canonical_metric_name(metric_name: str) -> str:
+    """
+    Normalize metric name (Handle plural "Revenues" -> "Revenue")
+    This fixes the issue where "Revenues" wouldn't find the alias list for "Revenue"
+    """
+    if metric_name in ["Revenues", "Total Revenues", "Net Revenue", "Net Revenues"]:
+        return "Revenue"
+    elif metric_name in ["Net Income", "Net Earnings", "Net Loss"]:
+        return "Net Income"
+    # XBRL tags (what the classifier tends to return) map onto the alias group they belong to
+    for canonical, tags in METRIC_ALIASES.items():
+        if metric_name in tags:
+            return canonical
+    return metric_name
+
+def resolve_padded_cik(ticker: str) -> str:
+    """
+    Resolve a supported ticker to its 10-digit CIK.
+    """
+    cik = TICKER_TO_CIK.get(ticker.upper())
+    if not cik:
+        raise ValueError(f"Ticker {ticker} not found in supported list.")
+    return cik.zfill(10)
+
+def find_annual_value(facts: dict, metric_name: str, year: int) -> Optional[dict]:
+    """
+    Find the 10-K value of a metric for a fiscal year in a companyfacts payload.
+    Returns {"val", "form", "end"} or None.
+    """
+    canonical_name = canonical_metric_name(metric_name)
+
+    # Parse logic with robust alias matching
+    us_gaap = facts.get('facts', {}).get('us-gaap', {})
+    
+    # Get aliases for the requested metric (case-insensitive lookup)
+    # Use canonical name for lookup
+    metric_keys = METRIC_ALIASES.get(canonical_name, [canonical_name])
+    
+    # Also try direct match of original if not in aliases (fallback)
+    if metric_name not in metric_keys and metric_name != canonical_name:
+        metric_keys = [metric_name] + metric_keys
+
+    for key in metric_keys:
+        if key in us_gaap:
+            units = us_gaap[key].get('units', {}).get('USD', [])
+            
+            # Sort by end date descending to get most recent first
+            sorted_units = sorted([u for u in units if 'end' in u], key=lambda x: x['end'], reverse=True)
+            
+            for u in sorted_units:
+                # Match criteria:
+                # 1. Form is 10-K (annual filing)
+                # 2. Either fy matches the requested year OR end date year matches
+                end_date = u.get('end', '')
+                end_year = int(end_date[:4]) if end_date else 0
+                fy = u.get('fy', 0)
+                form = u.get('form', '')
+                
+                # For 10-K filings, check both fy field AND end date year
+                if form == '10-K':
+                    if fy == year or end_year == year:
+                        print(f"DEBUG: Found {key} for {year}: val={u['val']}, end={end_date}, fy={fy}")
+                        return {"val": u['val'], "form": form, "end": end_date}
+    return None
+
+def annual_report_years(facts: dict) -> set:
+    """
+    Fiscal years with a 10-K in a companyfacts payload: a metric missing from one of these isn't reported,
+    rather than not filed yet.
+    """
+    years = set()
+    for fact in facts.get('facts', {}).get('us-gaap', {}).values():
+        for rows in fact.get('units', {}).values():
+            years.update(u['fy'] for u in rows if u.get('form') == '10-K' and u.get('fy'))
+    return years
+
 class FinancialDataRepository:
     def __init__(self, db_session: Session, sec_retriever: SECDataRetriever):
         self.db = db_session
@@ -50,20 +144,11 @@ class FinancialDataRepository:
         Checks DB first. If missing, fetches from SEC API, saves to DB, then returns.
         """
         # 1. Resolve Ticker to CIK
-        cik = TICKER_TO_CIK.get(ticker.upper())
-        if not cik:
-            raise ValueError(f"Ticker {ticker} not found in supported list.")
-        
-        padded_cik = cik.zfill(10)
-
-        # Normalize metric name (Handle plural "Revenues" -> "Revenue")
-        # This fixes the issue where "Revenues" wouldn't find the alias list for "Revenue"
-        canonical_name = metric_name
-        if metric_name in ["Revenues", "Total Revenues", "Net Revenue", "Net Revenues"]:
-            canonical_name = "Revenue"
-        elif metric_name in ["Net Income", "Net Earnings", "Net Loss"]:
-            canonical_name = "Net Income"
-            
+        padded_cik = resolve_padded_cik(ticker)
+        cik = TICKER_TO_CIK[ticker.upper()]
+
+        canonical_name = canonical_metric_name(metric_name)
+
         print(f"DEBUG: Request for '{metric_name}' normalized to '{canonical_name}'")
 
         # 2. Check Database
@@ -98,63 +183,182 @@ class FinancialDataRepository:
 
         # Fetch facts
         facts = self.retriever.get_company_facts(cik)
+        found = find_annual_value(facts, metric_name, year)
         
-        # Parse logic with robust alias matching
-        us_gaap = facts.get('facts', {}).get('us-gaap', {})
-        
-        # Get aliases for the requested metric (case-insensitive lookup)
-        # Use canonical name for lookup
-        metric_keys = METRIC_ALIASES.get(canonical_name, [canonical_name])
-        
-        # Also try direct match of original if not in aliases (fallback)
-        if metric_name not in metric_keys and metric_name != canonical_name:
-            metric_keys = [metric_name] + metric_keys
-        
-        target_val = None
-        target_form = None
-        target_end_date = None
-
-        for key in metric_keys:
-            if key in us_gaap:
-                units = us_gaap[key].get('units', {}).get('USD', [])
-                
-                # Sort by end date descending to get most recent first
-                sorted_units = sorted([u for u in units if 'end' in u], key=lambda x: x['end'], reverse=True)
-                
-                for u in sorted_units:
-                    # Match criteria:
-                    # 1. Form is 10-K (annual filing)
-                    # 2. Either fy matches the requested year OR end date year matches
-                    end_date = u.get('end', '')
-                    end_year = int(end_date[:4]) if end_date else 0
-                    fy = u.get('fy', 0)
-                    form = u.get('form', '')
-                    
-                    # For 10-K filings, check both fy field AND end date year
-                    if form == '10-K':
-                        if fy == year or end_year == year:
-                            target_val = u['val']
-                            target_form = form
-                            target_end_date = end_date
-                            print(f"DEBUG: Found {key} for {year}: val={target_val}, end={target_end_date}, fy={fy}")
-                            break
-                
-                if target_val is not None:
-                    break
-        
-        if target_val is None:
+        if found is None:
              return f"Data not found for {year}"
 
         # 4. Save to Database
+        # Saved under the canonical name, which is what the lookup above queries
         new_metric = FinancialMetric(
             company_cik=padded_cik,
-            metric_name=metric_name,
-            value=target_val,
+            metric_name=canonical_name,
+            value=found["val"],
             fiscal_year=year,
             fiscal_period='FY',
-            form_type=target_form
+            form_type=found["form"]
         )
         self.db.add(new_metric)
         self.db.commit()
         
-        return f"${target_val:,.0f} (Fetched)"
+        return f"${found['val']:,.0f} (Fetched)"
+
+class AsyncFinancialDataRepository:
+    """
+    Async variant of FinancialDataRepository for use on the event loop.
+
+    Every operation opens its own short-lived AsyncSession from the pooled engine, so a connection
+    is only held for the query itself and never across the SEC fetch. The fetch (sync, rate-limited
+    `requests`) and the companyfacts parsing run in the default executor.
+    """
+
+    def __init__(self, sec_retriever: SECDataRetriever, session_factory=None):
+        if session_factory is None:
+            from database import get_async_sessionmaker
+            session_factory = get_async_sessionmaker()
+        self.session_factory = session_factory
+        self.retriever = sec_retriever
+
+    async def get_cached_value(self, padded_cik: str, canonical_name: str, year: int) -> Optional[float]:
+        with span("db_lookup") as attrs:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(FinancialMetric.value).where(
+                        FinancialMetric.company_cik == padded_cik,
+                        FinancialMetric.metric_name == canonical_name,
+                        FinancialMetric.fiscal_year == year,
+                        FinancialMetric.fiscal_period == 'FY'
+                    ).limit(1)
+                )
+                value = result.scalar_one_or_none()
+            attrs["cache"] = "miss" if value is None else "hit"
+            return value
+
+    def _fetch_annual_value(self, cik: str, metric_name: str, year: int) -> Optional[dict]:
+        facts = self.retriever.get_company_facts(cik)
+        return find_annual_value(facts, metric_name, year)
+
+    async def get_cached_values(self, padded_ciks: List[str], canonical_names: List[str], years: List[int]) -> Dict[Tuple[str, str, int], float]:
+        """
+        Every cached (cik, metric, year) cell across several companies, metrics and years, in a single query.
+        """
+        if not padded_ciks or not canonical_names or not years:
+            return {}
+        cells = len(padded_ciks) * len(canonical_names) * len(years)
+        with span("db_lookup", cells=cells) as attrs:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(
+                        FinancialMetric.company_cik, FinancialMetric.metric_name,
+                        FinancialMetric.fiscal_year, FinancialMetric.value
+                    ).where(
+                        FinancialMetric.company_cik.in_(padded_ciks),
+                        FinancialMetric.metric_name.in_(canonical_names),
+                        FinancialMetric.fiscal_year.in_(years),
+                        FinancialMetric.fiscal_period == 'FY'
+                    )
+                )
+                values = {}
+                for cik, name, year, value in result.all():
+                    values.setdefault((cik, name, year), value)
+            attrs["cached"] = len(values)
+            attrs["cache"] = "hit" if len(values) >= cells else "miss"
+            return values
+
+    async def get_unreported_cells(self, padded_ciks: List[str], canonical_names: List[str], years: List[int]) -> set:
+        """
+        (cik, metric, year) cells recorded as unreported, in a single query.
+        """
+        if not padded_ciks or not canonical_names or not years:
+            return set()
+        with span("db_lookup") as attrs:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(
+                        UnreportedMetric.company_cik, UnreportedMetric.metric_name, UnreportedMetric.fiscal_year
+                    ).where(
+                        UnreportedMetric.company_cik.in_(padded_ciks),
+                        UnreportedMetric.metric_name.in_(canonical_names),
+                        UnreportedMetric.fiscal_year.in_(years)
+                    )
+                )
+                cells = {tuple(row) for row in result.all()}
+            attrs["unreported"] = len(cells)
+            return cells
+
+    async def save_unreported(self, padded_cik: str, cells: set):
+        """
+        Record (metric_name, year) cells one company doesn't report. Cells already recorded are left as they are.
+        """
+        if not cells:
+            return
+        # Another request may record the same cells meanwhile; the retry then skips them
+        for attempt in range(2):
+            try:
+                with span("db_write", cells=len(cells)):
+                    async with self.session_factory() as session:
+                        async with session.begin():
+                            recorded = await session.execute(
+                                select(UnreportedMetric.metric_name, UnreportedMetric.fiscal_year).where(
+                                    UnreportedMetric.company_cik == padded_cik
+                                )
+                            )
+                            for metric_name, year in set(cells) - {tuple(row) for row in recorded.all()}:
+                                session.add(UnreportedMetric(company_cik=padded_cik, metric_name=metric_name, fiscal_year=year))
+                return
+            except IntegrityError:
+                if attempt:
+                    raise
+
+    async def get_company_facts(self, cik: str) -> dict:
+        return await run_in_executor(self.retriever.get_company_facts, cik)
+
+    async def save_metric(self, ticker: str, padded_cik: str, metric_name: str, year: int, found: dict):
+        await self.save_metrics(ticker, padded_cik, {(metric_name, year): found})
+
+    async def save_metrics(self, ticker: str, padded_cik: str, found_cells: Dict[Tuple[str, int], dict]):
+        """
+        Persist fetched (metric_name, year) values for one company in a single transaction.
+        """
+        if not found_cells:
+            return
+        # Two requests can miss on the same new company at once; the one that loses the Company insert retries
+        for attempt in range(2):
+            try:
+                with span("db_write", cells=len(found_cells)):
+                    async with self.session_factory() as session:
+                        async with session.begin():
+                            if await session.get(Company, padded_cik) is None:
+                                session.add(Company(cik=padded_cik, ticker=ticker.upper(), name=f"{ticker} Inc."))
+                            for (metric_name, year), found in found_cells.items():
+                                session.add(FinancialMetric(
+                                    company_cik=padded_cik,
+                                    metric_name=metric_name,
+                                    value=found["val"],
+                                    fiscal_year=year,
+                                    fiscal_period='FY',
+                                    form_type=found["form"]
+                                ))
+                return
+            except IntegrityError:
+                if attempt:
+                    raise
+
+    async def get_metric(self, ticker: str, metric_name: str, year: int) -> str:
+        """
+        Same contract as FinancialDataRepository.get_metric, without blocking the event loop.
+        """
+        padded_cik = resolve_padded_cik(ticker)
+        canonical_name = canonical_metric_name(metric_name)
+
+        value = await self.get_cached_value(padded_cik, canonical_name, year)
+        if value is not None:
+            return f"${value:,.0f} (Cached)"
+
+        print(f"DEBUG: Cache miss for {ticker} {canonical_name} {year}. Fetching from API...")
+        found = await run_in_executor(self._fetch_annual_value, TICKER_TO_CIK[ticker.upper()], metric_name, year)
+        if found is None:
+            return f"Data not found for {year}"
+
+        await self.save_metric(ticker, padded_cik, canonical_name, year, found)
+        return f"${found['val']:,.0f} (Fetched)"
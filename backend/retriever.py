@@ -1,10 +1,46 @@
 import os
+import datetime
 import requests
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from utils import RateLimiter
+from tracing import span
 
 load_dotenv()
 
+# EDGAR endpoints; overridable so benchmarks can point ingestion at a local stub (see fake_services.py)
+SEC_DATA_URL = os.getenv("SEC_DATA_URL", "https://data.sec.gov").rstrip("/")
+SEC_ARCHIVES_URL = os.getenv("SEC_ARCHIVES_URL", "https://www.sec.gov").rstrip("/")
+
+# SEC fair-access limit: 10 requests/second per client, shared by every request this process makes
+SEC_RATE_LIMIT = RateLimiter(max_calls=10, period=1.0)
+
+def fiscal_period(report_date: str, fiscal_year_end: str = None, form_type: str = "10-K") -> tuple:
+    """
+    (fiscal_year, fiscal_period) of a filing from its period end date (YYYY-MM-DD) and the company's
+    fiscal year end (MMDD, from the submissions API). Periods are "FY" for 10-K and "Q1".."Q3" for 10-Q.
+
+    A fiscal year is named after the calendar year it ends in (Apple's year ending 2023-09-30 is FY2023,
+    NVIDIA's ending 2024-01-28 is FY2024). 52/53-week years that spill a few days into January keep
+    the previous year's name. A quarter belongs to the fiscal year whose end follows it.
+    """
+    end = datetime.date.fromisoformat(report_date)
+
+    def year_name(day: datetime.date) -> int:
+        return day.year - 1 if day.month == 1 and day.day <= 7 else day.year
+
+    if not form_type.startswith("10-Q"):
+        return year_name(end), "FY"
+
+    fye_month, fye_day = (int(fiscal_year_end[:2]), int(fiscal_year_end[2:])) if fiscal_year_end else (12, 31)
+    # Next fiscal year end on or after the quarter end; a week of slack absorbs 52/53-week calendars
+    year_end = datetime.date(end.year, fye_month, min(fye_day, 28))
+    if year_end < end - datetime.timedelta(days=7):
+        year_end = year_end.replace(year=end.year + 1)
+    months_left = round((year_end - end).days / 30.44)
+    quarter = min(3, max(1, 4 - round(months_left / 3)))
+    return year_name(year_end), f"Q{quarter}"
+
 class SECDataRetriever:
     def __init__(self):
         self.user_agent = os.getenv("USER_AGENT")
@@ -15,11 +51,10 @@ class SECDataRetriever:
         self.headers = {
             "User-Agent": self.user_agent,
             "Accept-Encoding": "gzip, deflate",
-            "Host": "data.sec.gov"
+            "Host": urlparse(SEC_DATA_URL).netloc
         }
 
-    # Apply RateLimiter: 10 calls per 1 second
-    @RateLimiter(max_calls=10, period=1.0)
+    @SEC_RATE_LIMIT
     def _make_request(self, url: str) -> dict:
         try:
             response = requests.get(url, headers=self.headers, timeout=10)
@@ -38,6 +73,28 @@ class SECDataRetriever:
             print(f"Request failed: {e}")
             raise
 
+    @SEC_RATE_LIMIT
+    def _fetch_text(self, url: str) -> str:
+        """
+        Fetch a document from the EDGAR archive (www.sec.gov) as text. Returns None on 404.
+        """
+        headers = {k: v for k, v in self.headers.items() if k != "Host"}
+        try:
+            response = requests.get(url, headers=headers, timeout=30)
+
+            if response.status_code == 429:
+                raise Exception("Rate limit hit (429). Please slow down.")
+
+            if response.status_code == 404:
+                return None
+
+            response.raise_for_status()
+            return response.text
+
+        except requests.exceptions.RequestException as e:
+            print(f"Request failed: {e}")
+            raise
+
     def get_company_facts(self, cik: str) -> dict:
         """
         Fetch company facts for a given CIK.
@@ -45,9 +102,10 @@ class SECDataRetriever:
         """
         # Pad CIK to 10 digits (e.g., 320193 -> 0000320193)
         padded_cik = cik.zfill(10)
-        url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{padded_cik}.json"
+        url = f"{SEC_DATA_URL}/api/xbrl/companyfacts/CIK{padded_cik}.json"
         
-        data = self._make_request(url)
+        with span("sec_fetch", cik=padded_cik):
+            data = self._make_request(url)
         if data is None:
             raise ValueError(f"No data found for CIK: {cik}")
             
@@ -58,9 +116,10 @@ class SECDataRetriever:
         Fetch submissions history for a given CIK.
         """
         padded_cik = cik.zfill(10)
-        url = f"https://data.sec.gov/submissions/CIK{padded_cik}.json"
+        url = f"{SEC_DATA_URL}/submissions/CIK{padded_cik}.json"
         
-        data = self._make_request(url)
+        with span("sec_submissions", cik=padded_cik):
+            data = self._make_request(url)
         if data is None:
             raise ValueError(f"No data found for CIK: {cik}")
         
@@ -93,14 +152,81 @@ class SECDataRetriever:
                 # Let's check standard EDGAR URLs. usually /data/320193/ not /data/0000320193/
                 # I will try to use the stripped CIK for the URL path as is common practice.
                 
-                url = f"https://www.sec.gov/Archives/edgar/data/{int(cik)}/{acc_num_no_dashes}/{primary_doc}"
+                url = f"{SEC_ARCHIVES_URL}/Archives/edgar/data/{int(cik)}/{acc_num_no_dashes}/{primary_doc}"
                 
-                return {
+                metadata = {
                     "accessionNumber": acc_num,
                     "primaryDocument": primary_doc,
                     "url": url,
-                    "filingDate": recent.get('filingDate', [])[i]
+                    "filingDate": recent.get('filingDate', [])[i],
+                    "reportDate": recent.get('reportDate', [])[i] if recent.get('reportDate') else None
                 }
+                report_date = metadata["reportDate"] or metadata["filingDate"]
+                metadata["fiscalYear"], metadata["fiscalPeriod"] = fiscal_period(report_date, data.get('fiscalYearEnd'), form)
+                return metadata
                 
         raise ValueError(f"No filing of type {form_type} found for CIK: {cik}")
 
+    def get_submissions_page(self, name: str) -> dict:
+        """
+        Fetch one page of older filings listed in the submissions' `filings.files`.
+        """
+        url = f"{SEC_DATA_URL}/submissions/{name}"
+
+        with span("sec_submissions", page=name):
+            data = self._make_request(url)
+        if data is None:
+            raise ValueError(f"Submissions page not found: {name}")
+
+        return data
+
+    def get_filings(self, cik: str, form_types: tuple = ("10-K",), since: str = None) -> list:
+        """
+        Filings of the given form types, newest first, with fiscal year and period derived from their
+        report dates. Only filings made after `since` (YYYY-MM-DD) when given. Beyond the ~1000 most recent
+        filings, the submissions API pages older history into `filings.files`; those pages are fetched
+        only if they overlap the requested range.
+        """
+        data = self.get_submissions(cik)
+        fiscal_year_end = data.get('fiscalYearEnd')
+        columns = [data.get('filings', {}).get('recent', {})]
+        for page in data.get('filings', {}).get('files', []):
+            if since and page.get('filingTo', '9999') <= since:
+                continue
+            columns.append(self.get_submissions_page(page['name']))
+
+        filings = {}
+        for table in columns:
+            for i, form in enumerate(table.get('form', [])):
+                if form not in form_types:
+                    continue
+                filing_date = table['filingDate'][i]
+                if since and filing_date <= since:
+                    continue
+                report_date = (table.get('reportDate') or [None] * (i + 1))[i] or None
+                fiscal_year, period = fiscal_period(report_date or filing_date, fiscal_year_end, form)
+                filings[table['accessionNumber'][i]] = {
+                    "accessionNumber": table['accessionNumber'][i],
+                    "form": form,
+                    "filingDate": filing_date,
+                    "reportDate": report_date,
+                    "fiscalYear": fiscal_year,
+                    "fiscalPeriod": period,
+                    "primaryDocument": table['primaryDocument'][i]
+                }
+        return sorted(filings.values(), key=lambda f: f["filingDate"], reverse=True)
+
+    def get_filing_text(self, cik: str, accession_number: str) -> str:
+        """
+        Fetch the complete submission text file of a filing (every document, each wrapped in <DOCUMENT> tags).
+        """
+        acc_num_no_dashes = accession_number.replace("-", "")
+        url = f"{SEC_ARCHIVES_URL}/Archives/edgar/data/{int(cik)}/{acc_num_no_dashes}/{accession_number}.txt"
+
+        with span("sec_filing", accession=accession_number):
+            text = self._fetch_text(url)
+        if text is None:
+            raise ValueError(f"Filing {accession_number} not found for CIK: {cik}")
+
+        return text
+
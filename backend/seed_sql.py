@@ -1,32 +1,34 @@
 import asyncio
 import logging
-from orchestrator import Orchestrator
+from agents import AnalysisAgent, build_query_plan
+from repository import AsyncFinancialDataRepository
+from retriever import SECDataRetriever
+from database import dispose_async_engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 TARGET_TICKERS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'META']
+SEED_METRICS = ["Revenue", "Net Income", "Total Assets"]
+SEED_YEARS = [2023]
 
 async def seed():
-    logger.info("Initializing Orchestrator for SQL Seeding...")
-    orch = Orchestrator()
-    
-    for ticker in TARGET_TICKERS:
-        logger.info(f"--- Seeding {ticker} ---")
-        query = f"Analyze the Revenue, Net Income, and Total Assets for {ticker} for fiscal year 2023."
-        
-        try:
-            logger.info(f"Running query: '{query}'")
-            # Iterate (consume) the generator to trigger all tool calls
-            async for chunk in orch.handle_query(query):
-                pass 
-            logger.info(f"Finished {ticker}.")
-        except Exception as e:
-            logger.error(f"Error seeding {ticker}: {e}")
-            
-    # Cleanup
-    if hasattr(orch, 'close'):
-        orch.close()
+    # One query plan for every ticker: cached cells come from a single query and each company
+    # needs one companyfacts download, instead of a classifier round trip per ticker
+    plan = build_query_plan({"type": "metric", "companies": TARGET_TICKERS, "metrics": SEED_METRICS, "years": SEED_YEARS})
+    logger.info(f"Seeding {len(plan['companies'])} companies x {plan['metrics']} x {plan['years']}...")
+
+    repo = AsyncFinancialDataRepository(SECDataRetriever())
+    agent = AnalysisAgent()
+    values = {}
+    try:
+        async for values, pending in agent.stream_plan_data(repo, plan):
+            if pending:
+                logger.info(f"Waiting on SEC data for: {', '.join(sorted(pending))}")
+    finally:
+        await dispose_async_engine()
+
+    print(agent.table(plan, values))
     logger.info("SQL Seeding Complete.")
 
 if __name__ == "__main__":
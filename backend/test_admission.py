@@ -0,0 +1,94 @@
+"""
+Test Script: admission slots are returned however a streamed response ends
+
+Each case runs in a fresh interpreter against the offline stand-ins (the database and the SEC URLs are read
+at import time) and calls the app directly over ASGI, so the client can drop at a chosen point.
+"""
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _run_isolated(case: str):
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ)
+        env.update({
+            "VECTOR_BACKEND": "local",
+            "LOCAL_INDEX_DIR": work_dir,
+            "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'test.db')}",
+            "OPENAI_API_KEY": "sk-test",
+            "USER_AGENT": "test test@example.com",
+            "WARMUP_ENABLED": "false"
+        })
+        env.pop("ASYNC_DATABASE_URL", None)
+        out = subprocess.run([sys.executable, "-c", f"import test_admission as t; t.{case}()"],
+                             cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+        print(out.stdout)
+        assert out.returncode == 0, out.stderr[-4000:]
+
+async def _call(app, path: str, payload: dict, spec_version: str, fail_body: bool) -> list:
+    """
+    One request whose client is gone as soon as the body is read. With fail_body, sending a body
+    chunk fails the way a closed socket does under ASGI 2.4 servers.
+    """
+    messages = [{"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        # A real server's send yields to the loop, which is when the disconnect listener gets in
+        await asyncio.sleep(0.01)
+        if fail_body and message["type"] == "http.response.body":
+            raise OSError("Connection reset by peer")
+        sent.append(message["type"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "client": ("test", 1), "server": ("test", 80),
+        "headers": [(b"content-type", b"application/json"), (b"authorization", b"Bearer sk-test")]
+    }
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # ClientDisconnect / OSError: the server would drop the connection
+        pass
+    # Pooled connections belong to this event loop (and aiosqlite's threads would block exit), as at app shutdown
+    from database import dispose_async_engine
+    await dispose_async_engine()
+    return sent
+
+def _case_disconnect():
+    from fake_services import FakeEdgar, FakeOpenAI
+
+    with FakeEdgar() as edgar, FakeOpenAI() as openai:
+        os.environ.update({"SEC_DATA_URL": edgar.url, "SEC_ARCHIVES_URL": edgar.url, "OPENAI_BASE_URL": f"{openai.url}/v1"})
+        from database import init_db
+        init_db()
+        _disconnect_each_endpoint()
+
+def _disconnect_each_endpoint():
+    from main import app
+    from admission import get_admission_controller
+
+    requests = [("/chat", {"query": "AAPL revenue 2023"}), ("/batch", {"queries": ["AAPL revenue 2023"]})]
+    for path, payload in requests:
+        # Disconnect before the body iterator starts, then a send failing mid-stream
+        for spec_version, fail_body in (("2.3", False), ("2.4", True)):
+            sent = asyncio.run(_call(app, path, payload, spec_version, fail_body))
+            stats = get_admission_controller().stats()
+            assert stats["active"] == 0 and stats["waiting"] == 0, (path, spec_version, sent, stats)
+    print("✅ admission slots released after early disconnects on /chat and /batch")
+
+def test_disconnect_releases_slot():
+    _run_isolated("_case_disconnect")
+
+if __name__ == "__main__":
+    test_disconnect_releases_slot()
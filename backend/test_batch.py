@@ -0,0 +1,58 @@
+"""
+Test Script: /batch guardrail and classification show up in the per-stage metrics
+"""
+import asyncio
+from types import SimpleNamespace
+from guardrail import InputGuardrail
+from agents import QueryClassifier
+from tracing import STAGE_LATENCY, start_trace
+
+class StubLLM:
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+
+    async def ainvoke(self, _prompt):
+        self.calls += 1
+        return SimpleNamespace(content=self.content)
+
+class StubChain(StubLLM):
+    async def ainvoke(self, _inputs):
+        self.calls += 1
+        return {"type": "rag", "companies": ["AAPL"]}
+
+def _stage_count(stage: str) -> int:
+    series = STAGE_LATENCY._series.get((stage,))
+    return series[-1] if series else 0
+
+def test_batch_stages_recorded():
+    queries = ["What are the risks for Apple?", "Summarize Apple's competition", "AAPL revenue 2023"]
+    guardrail = InputGuardrail(api_key="sk-test")
+    guardrail.llm = StubLLM('{"allowed": true, "reason": "finance"}')
+    classifier = QueryClassifier(api_key="sk-test")
+    classifier.chain = StubChain("")
+
+    before = {stage: _stage_count(stage) for stage in ("guardrail", "classifier")}
+
+    async def run():
+        with start_trace("batch") as trace:
+            safety, intents = await asyncio.gather(
+                guardrail.check_safety_many(queries, 2),
+                classifier.aclassify_many(queries, 2)
+            )
+        return safety, intents, trace.summary()
+
+    safety, intents, summary = asyncio.run(run())
+    assert all(s["allowed"] for s in safety)
+    assert guardrail.llm.calls == len(queries)
+    # The metric question takes the fast path; only the other two reach the LLM
+    assert [i.get("source") for i in intents][-1] == "fast_path"
+    assert classifier.chain.calls == len(queries) - 1
+
+    assert _stage_count("guardrail") - before["guardrail"] == len(queries)
+    assert _stage_count("classifier") - before["classifier"] == len(queries)
+    assert set(summary["stages"]) == {"guardrail", "classifier"}, summary["stages"]
+    print(f"✅ batch stages: {summary['stages']}")
+
+if __name__ == "__main__":
+    test_batch_stages_recorded()
@@ -0,0 +1,102 @@
+"""
+Test Script: chunk manifest diffing across filing keys
+
+Each case runs in a fresh interpreter: database.py and the local indexes read their locations from the
+environment at import time, so the scratch database / index directory must be set before anything loads.
+"""
+import os
+import sys
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _run_isolated(case: str):
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ)
+        env.update({
+            "VECTOR_BACKEND": "local",
+            "RETRIEVAL_MODE": "hybrid",
+            "LOCAL_INDEX_DIR": work_dir,
+            "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'test.db')}",
+            "OPENAI_API_KEY": "sk-test",
+            "USER_AGENT": "test test@example.com"
+        })
+        env.pop("ASYNC_DATABASE_URL", None)
+        out = subprocess.run([sys.executable, "-c", f"import test_chunk_manifest as t; t.{case}()"],
+                             cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        print(out.stdout)
+        assert out.returncode == 0, out.stderr[-4000:]
+
+def _indexed(filing_key: str) -> set:
+    from database import SessionLocal
+    from models import IndexedChunk
+
+    with SessionLocal() as session:
+        return {row.chunk_id for row in session.query(IndexedChunk).filter(IndexedChunk.filing_key == filing_key)}
+
+def _case_legacy_discovery():
+    from fake_services import FakeOpenAI, fake_embedding
+    from database import SessionLocal
+    from vector_store import VectorDB
+
+    with FakeOpenAI() as openai:
+        os.environ["OPENAI_BASE_URL"] = f"{openai.url}/v1"
+        db = VectorDB(api_key="sk-test")
+        # A quarterly filing indexed through the manifest, and a pre-manifest annual filing with positional ids
+        db.upsert_chunks(["Quarterly supply risk.", "Quarterly demand risk."], {"company": "AAPL", "year": 2026, "filing_key": "AAPL_2026_Q1"})
+        quarterly = _indexed("AAPL_2026_Q1")
+        legacy = ["AAPL_2026_0", "AAPL_2026_1"]
+        db.local_index.add(legacy, [fake_embedding(t).tolist() for t in ("old one", "old two")])
+        db.lexical_index.add_documents(legacy, ["old one", "old two"])
+
+        with SessionLocal() as session:
+            existing = db._existing_chunk_ids(session, "AAPL_2026")
+        assert set(existing) == set(legacy), existing
+
+        summary = db.upsert_chunks(["Annual report text."], {"company": "AAPL", "year": 2026, "filing_key": "AAPL_2026"})
+        assert summary["deleted"] == 2, summary
+        assert _indexed("AAPL_2026_Q1") == quarterly
+        assert all(chunk_id in db.local_index._id_to_pos for chunk_id in quarterly)
+        assert not any(chunk_id in db.local_index._id_to_pos for chunk_id in legacy)
+    print("✅ legacy discovery only matches positional ids")
+
+def _case_annual_after_quarters():
+    import asyncio
+    from fake_services import FakeEdgar, FakeOpenAI
+
+    with FakeEdgar(years=3, filing_kb=20) as edgar, FakeOpenAI() as openai:
+        # retriever reads the SEC URLs at import time, and the stand-ins only have ports once started
+        os.environ.update({"SEC_DATA_URL": edgar.url, "SEC_ARCHIVES_URL": edgar.url, "OPENAI_BASE_URL": f"{openai.url}/v1"})
+        import batch_ingest
+
+        # The usual incremental order: a year's 10-Qs are indexed before its 10-K is filed
+        companies = {"AAPL": "320193"}
+        asyncio.run(batch_ingest.main(companies, form_types=("10-Q",), years=2))
+        quarterly = {key: _indexed(key) for key in _filing_keys()}
+        assert quarterly, "no quarterly filings indexed"
+
+        asyncio.run(batch_ingest.main(companies, form_types=("10-K",), years=2))
+        annual_keys = sorted(set(_filing_keys()) - set(quarterly))
+        # The 10-K's key is a prefix of its quarters' keys (AAPL_2025 / AAPL_2025_Q1)
+        assert any(key.startswith(f"{annual}_") for annual in annual_keys for key in quarterly), (annual_keys, sorted(quarterly))
+        for key, chunk_ids in quarterly.items():
+            assert chunk_ids and _indexed(key) == chunk_ids, f"{key} lost chunks"
+    print(f"✅ {len(quarterly)} quarterly filings kept their chunks after {', '.join(annual_keys)} was indexed")
+
+def _filing_keys() -> list:
+    from database import SessionLocal
+    from models import IndexedChunk
+
+    with SessionLocal() as session:
+        return sorted({key for (key,) in session.query(IndexedChunk.filing_key).distinct()})
+
+def test_legacy_discovery():
+    _run_isolated("_case_legacy_discovery")
+
+def test_annual_after_quarters():
+    _run_isolated("_case_annual_after_quarters")
+
+if __name__ == "__main__":
+    test_legacy_discovery()
+    test_annual_after_quarters()
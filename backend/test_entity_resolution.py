@@ -1,30 +1,49 @@
 """
 Test Script: Entity Resolution Logic
 """
-import asyncio
-from orchestrator import Orchestrator
+from entity_resolver import EntityResolver, get_entity_resolver
 
-async def test_normalization():
+def test_normalization():
     print("=" * 60)
     print("TEST: Entity Resolution Normalization")
     print("=" * 60)
-    
-    orch = Orchestrator()
-    
+
+    resolver = get_entity_resolver()
+
     test_queries = [
         "What is the revenue for Google in 2023?",
         "Show me Alphabet's net income",
         "Compare Facebook and Apple",
         "Analysis for Meta Platforms"
     ]
-    
+
     for q in test_queries:
-        normalized = orch._normalize_query_entities(q)
+        normalized = resolver.normalize(q)
         print(f"Original:   '{q}'")
         print(f"Normalized: '{normalized}'")
         print("-" * 40)
-        
-    orch.close()
+
+def test_word_boundaries():
+    print("=" * 60)
+    print("TEST: Word Boundaries and Longest Match")
+    print("=" * 60)
+
+    resolver = EntityResolver.build(aliases={"Apple": "AAPL", "Meta": "META", "Meta Platforms": "META", "Bank of America": "BAC", "Bank": "XBNK"})
+
+    cases = {
+        "Pineapple exports": "Pineapple exports",
+        "Apple's revenue": "AAPL's revenue",
+        "apple revenue": "AAPL revenue",
+        "Metadata for Meta Platforms": "Metadata for META",
+        "Bank of America vs Bank": "BAC vs XBNK"
+    }
+
+    for q, expected in cases.items():
+        normalized = resolver.normalize(q)
+        status = "✅" if normalized == expected else "❌"
+        print(f"{status} '{q}' -> '{normalized}' (expected '{expected}')")
+        assert normalized == expected, f"'{q}' -> '{normalized}', expected '{expected}'"
 
 if __name__ == "__main__":
-    asyncio.run(test_normalization())
+    test_normalization()
+    test_word_boundaries()
@@ -0,0 +1,49 @@
+"""
+Test Script: FilingStore content addressing
+"""
+import os
+import tempfile
+from filing_store import FilingStore
+from processor import SECFilingProcessor
+
+DOCUMENTS = (
+    "<DOCUMENT>\n<TYPE>10-K\n<SEQUENCE>1\n<FILENAME>aapl-10k.htm\n<TEXT>\n<html><p>Risk factors.</p></html>\n</TEXT>\n</DOCUMENT>\n"
+    "</SEC-DOCUMENT>\n"
+)
+
+def _submission(accession: str, filed: str) -> str:
+    return (
+        f"<SEC-DOCUMENT>{accession}.txt : {filed}\n<SEC-HEADER>{accession}.hdr.sgml : {filed}\n"
+        f"ACCESSION NUMBER:\t\t{accession}\nCONFORMED SUBMISSION TYPE:\t10-K\n"
+        f"CONFORMED PERIOD OF REPORT:\t20230930\nFILED AS OF DATE:\t\t{filed}\nCENTRAL INDEX KEY:\t\t\t0000320193\n"
+        "</SEC-HEADER>\n" + DOCUMENTS
+    )
+
+def test_identical_documents_share_a_blob():
+    """
+    Two submissions differing only in their SEC header (accession, dates) are stored and cleaned once.
+    """
+    with tempfile.TemporaryDirectory() as root:
+        store = FilingStore(root)
+        first = store.put(_submission("0000320193-23-000106", "20231103"))
+        second = store.put(_submission("0000320193-23-000107", "20231104"))
+        assert first == second
+
+        blobs = [name for _, _, names in os.walk(os.path.join(root, "blobs")) for name in names]
+        assert blobs == [f"{first}.zst"], blobs
+
+        # Header fields are still indexed per accession
+        assert store.get("0000320193-23-000106")["filing_date"] == "2023-11-03"
+        assert store.get("0000320193-23-000107")["filing_date"] == "2023-11-04"
+        assert store.get("0000320193-23-000107")["report_date"] == "2023-09-30"
+
+        store.put_cleaned(first, "Risk factors.", {})
+        assert store.get_cleaned(store.get("0000320193-23-000107")["hash"]) == ("Risk factors.", {})
+
+        with store.open_text(second) as lines:
+            assert "Risk factors." in SECFilingProcessor().extract_document(lines, "10-K")
+        store.close()
+    print("✅ identical documents stored and cleaned once")
+
+if __name__ == "__main__":
+    test_identical_documents_share_a_blob()
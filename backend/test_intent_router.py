@@ -0,0 +1,37 @@
+"""
+Test Script: fast-path intent router against the labeled queries
+"""
+import json
+from intent_router import FastIntentRouter
+from entity_resolver import get_entity_resolver
+from bench_intent_router import FIXTURE_PATH, same_intent
+
+def _labeled() -> list:
+    with open(FIXTURE_PATH) as f:
+        return json.load(f)
+
+def test_expected_fallbacks():
+    """
+    Quarters, growth, margins, forecasts and negations aren't annual metric lookups: the fast path must
+    leave them to the LLM rather than answer a different question.
+    """
+    router = FastIntentRouter()
+    resolver = get_entity_resolver()
+    for item in _labeled():
+        if item.get("fast_path") is False:
+            routed = router.route(resolver.normalize(item["query"]))
+            assert routed is None, f"'{item['query']}' -> {routed}, expected an LLM fallback"
+            print(f"✅ LLM fallback: {item['query']}")
+
+def test_fast_path_agrees_with_labels():
+    router = FastIntentRouter()
+    resolver = get_entity_resolver()
+    for item in _labeled():
+        routed = router.route(resolver.normalize(item["query"]))
+        if routed:
+            assert same_intent(routed, item["expected"]), f"'{item['query']}' -> {routed}, expected {item['expected']}"
+            print(f"✅ fast path: {item['query']}")
+
+if __name__ == "__main__":
+    test_expected_fallbacks()
+    test_fast_path_agrees_with_labels()
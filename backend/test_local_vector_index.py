@@ -0,0 +1,86 @@
+"""
+Test Script: LocalVectorIndex crash recovery and tombstones
+"""
+import os
+import tempfile
+import numpy as np
+from local_vector_index import LocalVectorIndex
+
+DIM = 16
+
+def _vectors(n: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+def test_interrupted_append():
+    """
+    A crash after the vectors (and codes) were appended but before their ids were leaves extra rows
+    without ids. Reloading must cut them off so later ids still map to their own vectors.
+    """
+    for quantization in ("none", "int8", "binary"):
+        with tempfile.TemporaryDirectory() as path:
+            first, orphan, second = _vectors(4, 1), _vectors(3, 2), _vectors(4, 3)
+            index = LocalVectorIndex(path, dim=DIM, quantization=quantization)
+            index.add([f"a{i}" for i in range(4)], first)
+
+            # Interrupted add(): vectors and codes written, ids.txt never updated
+            normalized = orphan / np.linalg.norm(orphan, axis=1, keepdims=True)
+            with open(os.path.join(path, "vectors.f32"), "ab") as f:
+                f.write(normalized.tobytes())
+            if quantization != "none":
+                index._append_codes(normalized)
+
+            index = LocalVectorIndex(path, dim=DIM, quantization=quantization)
+            assert len(index) == 4
+            index.add([f"b{i}" for i in range(4)], second)
+
+            for reloaded in (index, LocalVectorIndex(path, dim=DIM, quantization=quantization)):
+                for i, vector in enumerate(second):
+                    top_id, _ = reloaded.search(vector.tolist(), top_k=1)[0]
+                    assert top_id == f"b{i}", f"{quantization}: b{i} -> {top_id}"
+                for i, vector in enumerate(first):
+                    top_id, _ = reloaded.search(vector.tolist(), top_k=1)[0]
+                    assert top_id == f"a{i}", f"{quantization}: a{i} -> {top_id}"
+        print(f"✅ {quantization}")
+
+def test_torn_id_line():
+    """
+    A partially written last id is dropped along with its vector row.
+    """
+    with tempfile.TemporaryDirectory() as path:
+        vectors = _vectors(3, 4)
+        index = LocalVectorIndex(path, dim=DIM)
+        index.add(["x0", "x1"], vectors[:2])
+        with open(os.path.join(path, "vectors.f32"), "ab") as f:
+            f.write((vectors[2] / np.linalg.norm(vectors[2])).tobytes())
+        with open(os.path.join(path, "ids.txt"), "a") as f:
+            f.write("x")
+
+        index = LocalVectorIndex(path, dim=DIM)
+        assert index.ids == ["x0", "x1"]
+        index.add(["y"], vectors[2:])
+        assert LocalVectorIndex(path, dim=DIM).search(vectors[2].tolist(), top_k=1)[0][0] == "y"
+        print("✅ torn id line")
+
+def test_readded_ids():
+    """
+    Re-adding an id tombstones its old row, which keeps the same vector. With a shortlist longer than the
+    live rows, those tombstones must not take result slots.
+    """
+    for quantization in ("none", "int8", "binary"):
+        with tempfile.TemporaryDirectory() as path:
+            vectors = _vectors(4, 5)
+            index = LocalVectorIndex(path, dim=DIM, quantization=quantization)
+            index.add([f"a{i}" for i in range(4)], vectors)
+            index.add(["a0", "a1"], vectors[:2])
+
+            for reloaded in (index, LocalVectorIndex(path, dim=DIM, quantization=quantization)):
+                hits = reloaded.search(vectors[0].tolist(), top_k=3)
+                assert len(hits) == 3, f"{quantization}: {hits}"
+                assert len({doc_id for doc_id, _ in hits}) == 3, f"{quantization}: {hits}"
+                assert hits[0][0] == "a0", f"{quantization}: {hits}"
+        print(f"✅ re-added ids, {quantization}")
+
+if __name__ == "__main__":
+    test_interrupted_append()
+    test_torn_id_line()
+    test_readded_ids()
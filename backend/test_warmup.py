@@ -0,0 +1,63 @@
+"""
+Test Script: warm-up over a warm database makes no SEC requests
+
+Runs in a fresh interpreter: database.py and the retriever read the database and SEC locations from the
+environment at import time.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _run_isolated(case: str):
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'test.db')}",
+            "USER_AGENT": "test test@example.com"
+        })
+        env.pop("ASYNC_DATABASE_URL", None)
+        out = subprocess.run([sys.executable, "-c", f"import test_warmup as t; t.{case}()"],
+                             cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+        print(out.stdout)
+        assert out.returncode == 0, out.stderr[-4000:]
+
+def _case_warm_boot():
+    from fake_services import FakeEdgar
+
+    class NoGrossProfit(FakeEdgar):
+        # Some companies have no gross profit line at all
+        def company_facts(self, cik: str) -> dict:
+            facts = super().company_facts(cik)
+            del facts["facts"]["us-gaap"]["GrossProfit"]
+            return facts
+
+    with NoGrossProfit(years=3) as edgar:
+        os.environ.update({"SEC_DATA_URL": edgar.url, "SEC_ARCHIVES_URL": edgar.url})
+        from database import init_db, dispose_async_engine
+        from warmup import warm_facts
+        init_db()
+
+        async def boots():
+            try:
+                first = await warm_facts(["AAPL", "MSFT"], [2024, 2025])
+                requests = edgar.requests
+                second = await warm_facts(["AAPL", "MSFT"], [2024, 2025])
+                return first, second, edgar.requests - requests
+            finally:
+                await dispose_async_engine()
+
+        first, second, requests = asyncio.run(boots())
+    # 2 companies x 2 years x the five metrics the cache can hold (EPS isn't one), less the unreported GrossProfit
+    assert first["fetched"] == 2 * 2 * 4, first
+    assert second["fetched"] == 0 and requests == 0, (second, requests)
+    print(f"✅ second warm-up: {second['cells']} cells from the database, {requests} SEC requests")
+
+def test_warm_boot_makes_no_requests():
+    _run_isolated("_case_warm_boot")
+
+if __name__ == "__main__":
+    test_warm_boot_makes_no_requests()
@@ -0,0 +1,226 @@
+import os
+import time
+import asyncio
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Upper bounds (seconds) of the per-stage latency histogram buckets
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# How often the event-loop lag probe wakes up (seconds); 0 disables it
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    """
+    Minimal Prometheus histogram with labels, rendered in the text exposition format.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {series[-1]}")
+        return lines
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, label_values: tuple, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, label_values)} {value}")
+        return lines
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, label_values: tuple, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+# Everything /metrics renders; other modules add their own with register()
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+STAGE_LATENCY = register(Histogram("sovereign_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",)))
+STAGE_ERRORS = register(Counter("sovereign_stage_errors_total", "Pipeline stages that raised.", ("stage", "error")))
+STAGE_CACHE = register(Counter("sovereign_stage_cache_total", "Cache hits and misses seen by pipeline stages.", ("stage", "result")))
+LLM_TOKENS = register(Counter("sovereign_llm_tokens_total", "LLM tokens used, by stage.", ("stage", "kind")))
+EVENT_LOOP_LAG = register(Histogram("sovereign_event_loop_lag_seconds", "How late the event loop ran a timer; every stream on the worker waits as long.", (), LOOP_LAG_BUCKETS))
+
+class Trace:
+    """
+    Spans recorded for one request. Stages running in other tasks or executor threads add to the same
+    trace as long as they inherited the request's context.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, started: float, elapsed: float, attrs: dict):
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "start_ms": round((started - self.started) * 1000, 1),
+                "ms": round(elapsed * 1000, 1),
+                **attrs
+            })
+
+    def summary(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        stages = {}
+        for s in spans:
+            stages[s["stage"]] = round(stages.get(s["stage"], 0) + s["ms"], 1)
+        return {
+            "name": self.name,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": stages,
+            "spans": spans
+        }
+
+_current_trace = contextvars.ContextVar("sovereign_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def start_trace(name: str):
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Async generator finalized from another context (client disconnect); nothing to restore
+            pass
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time a pipeline stage. The yielded dict can be filled in while the stage runs; the keys
+    `cache` ("hit"/"miss"), `prompt_tokens` and `completion_tokens` are also exported as metrics.
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        STAGE_ERRORS.inc((stage, attrs["error"]))
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.observe((stage,), elapsed)
+        if attrs.get("cache") in ("hit", "miss"):
+            STAGE_CACHE.inc((stage, attrs["cache"]))
+        for kind in ("prompt", "completion"):
+            if attrs.get(f"{kind}_tokens"):
+                LLM_TOKENS.inc((stage, kind), attrs[f"{kind}_tokens"])
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, started, elapsed, attrs)
+
+def token_usage(message) -> dict:
+    """
+    prompt/completion token counts from a LangChain message's usage metadata, when the provider reported them.
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    if not usage:
+        return {}
+    return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
+
+def run_in_executor(fn, *args):
+    """
+    loop.run_in_executor on the default executor, carrying the current context so spans in the thread join the trace.
+    """
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(None, functools.partial(contextvars.copy_context().run, fn, *args))
+
+async def monitor_event_loop(interval: float = LOOP_LAG_INTERVAL):
+    """
+    Sleep in short ticks and record how late each wake-up is. Runs until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe((), max(0.0, loop.time() - started - interval))
+
+def render_metrics(cache_stats: Dict[str, dict] = None) -> str:
+    """
+    Everything in Prometheus text format. `cache_stats` maps a cache name to its stats() dict.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    if cache_stats:
+        lines += ["# HELP sovereign_cache_lookups_total Lookups served by each shared cache.",
+                  "# TYPE sovereign_cache_lookups_total counter"]
+        for cache, stats in sorted(cache_stats.items()):
+            for result in ("hits", "disk_hits", "misses"):
+                if result in stats:
+                    lines.append(f'sovereign_cache_lookups_total{{cache="{_escape(cache)}",result="{result}"}} {stats[result]}')
+        lines += ["# HELP sovereign_cache_entries Entries held by each shared cache.",
+                  "# TYPE sovereign_cache_entries gauge"]
+        for cache, stats in sorted(cache_stats.items()):
+            lines.append(f'sovereign_cache_entries{{cache="{_escape(cache)}"}} {stats.get("size", 0)}')
+    return "\n".join(lines) + "\n"
@@ -1,30 +1,79 @@
+import os
 import time
 import functools
+import threading
 from collections import deque
 
+# Local on-disk artifacts (BM25 index, chunk store, etc.) live here
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "index_data")
+
 class RateLimiter:
     def __init__(self, max_calls: int, period: float = 1.0):
         self.max_calls = max_calls
         self.period = period
         self.timestamps = deque()
+        # Calls come from several executor threads at once (concurrent SEC fetches);
+        # waiters queue on the lock, so the window is never overrun
+        self.lock = threading.Lock()
 
     def __call__(self, func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            now = time.time()
-            # Remove timestamps older than the period
-            while self.timestamps and now - self.timestamps[0] > self.period:
-                self.timestamps.popleft()
-            
-            if len(self.timestamps) >= self.max_calls:
-                sleep_time = self.timestamps[0] + self.period - now
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
-                # Re-check time after sleeping
+            with self.lock:
                 now = time.time()
+                # Remove timestamps older than the period
                 while self.timestamps and now - self.timestamps[0] > self.period:
                     self.timestamps.popleft()
+                
+                if len(self.timestamps) >= self.max_calls:
+                    sleep_time = self.timestamps[0] + self.period - now
+                    if sleep_time > 0:
+                        time.sleep(sleep_time)
+                    # Re-check time after sleeping
+                    now = time.time()
+                    while self.timestamps and now - self.timestamps[0] > self.period:
+                        self.timestamps.popleft()
 
-            self.timestamps.append(time.time())
+                self.timestamps.append(time.time())
             return func(*args, **kwargs)
         return wrapper
+
+class TokenBucket:
+    """
+    Async limiter for a per-minute budget (e.g. embedding tokens per minute).
+    `await bucket.acquire(n)` waits until `n` units are available; the budget refills continuously.
+    Requests larger than the whole budget are let through once the bucket is full, rather than never.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated = time.monotonic()
+        self.lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """
+        Take `amount` units, waiting as needed. Returns the seconds spent waiting.
+        """
+        import asyncio
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        waited = 0.0
+        # Waiters are served in order, so a large request isn't starved by a stream of small ones
+        async with self.lock:
+            self._refill()
+            needed = min(amount, self.capacity)
+            while self.available < needed:
+                delay = (needed - self.available) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.available -= amount
+        return waited
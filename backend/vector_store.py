@@ -1,26 +1,128 @@
 import os
+import re
 import time
-from typing import List
-from openai import OpenAI
-from pinecone import Pinecone, ServerlessSpec
+import threading
+from typing import List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from lexical_index import get_bm25_index
+from chunk_store import get_chunk_store, content_hash
+from local_vector_index import get_local_vector_index
+from database import SessionLocal, engine
+from models import IndexedChunk
+from embedding_cache import get_embedding_cache, normalize_query
+from answer_cache import get_answer_cache
+from tracing import span
+from admission import embedding_slot
 
 load_dotenv()
 
+# "hybrid": Pinecone + BM25 fused with RRF, "vector": Pinecone only, "lexical": BM25 only (no network)
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+
+# "pinecone": managed index, "local": in-process quantized index (see local_vector_index.py)
+VECTOR_BACKENDS = ("pinecone", "local")
+
+# Pinecone caps delete requests at 1000 ids
+DELETE_BATCH_SIZE = 1000
+
+_MANIFEST_READY = False
+
+# Max concurrent index lookups in query_vectors_many
+QUERY_CONCURRENCY = 8
+
+# openai and pinecone are imported where first used: lexical/local deployments never load them,
+# and one Pinecone client + index handle is shared by every VectorDB in the process.
+_PINECONE_LOCK = threading.Lock()
+_PINECONE_CLIENT = None
+_PINECONE_INDEXES = {}
+_ENSURED_INDEXES = set()
+
+# Serializes writes to the shared local BM25 index when several filings are written concurrently
+_LOCAL_WRITE_LOCK = threading.Lock()
+
+def get_pinecone_client():
+    global _PINECONE_CLIENT
+    with _PINECONE_LOCK:
+        if _PINECONE_CLIENT is None:
+            from pinecone import Pinecone
+            _PINECONE_CLIENT = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        return _PINECONE_CLIENT
+
+def get_pinecone_index(index_name: str):
+    """
+    Shared handle for an existing index. Resolving the host costs a describe_index round trip,
+    paid once per process (or never, when PINECONE_INDEX_HOST is set).
+    """
+    pc = get_pinecone_client()
+    with _PINECONE_LOCK:
+        if index_name not in _PINECONE_INDEXES:
+            host = os.getenv("PINECONE_INDEX_HOST")
+            _PINECONE_INDEXES[index_name] = pc.Index(index_name, host=host) if host else pc.Index(index_name)
+        return _PINECONE_INDEXES[index_name]
+
+# Standard reciprocal-rank-fusion constant (Cormack et al.)
+RRF_K = 60
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+    """
+    Fuse several ranked id lists into one. Each list contributes 1 / (k + rank).
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
 class VectorDB:
-    def __init__(self, api_key: str):
-        self.openai_client = OpenAI(api_key=api_key)
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    def __init__(self, api_key: str = None, mode: str = None):
+        self.mode = mode or os.getenv("RETRIEVAL_MODE", "hybrid")
+        if self.mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{self.mode}'. Expected one of {RETRIEVAL_MODES}.")
+
         self.index_name = "sec-financial-index"
-        
-        # Ensure index exists
-        self.get_or_create_index(self.index_name)
-        self.index = self.pc.Index(self.index_name)
+        self.lexical_index = get_bm25_index() if self.mode != "vector" else None
+        # Chunk text lives locally; vectors only carry ids and small filter fields
+        self.chunk_store = get_chunk_store()
+        self.embedding_cache = get_embedding_cache()
+
+        self.backend = os.getenv("VECTOR_BACKEND", "pinecone")
+        if self.backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{self.backend}'. Expected one of {VECTOR_BACKENDS}.")
+        self._index = None
+        self.local_index = None
+
+        # Lexical-only mode never touches OpenAI or Pinecone
+        if self.mode == "lexical":
+            self.openai_client = None
+            return
+
+        from openai import OpenAI
+        self.openai_client = OpenAI(api_key=api_key)
+        if self.backend == "local":
+            self.local_index = get_local_vector_index()
+
+    @property
+    def index(self):
+        """
+        Pinecone index handle, connected on first use. Queries assume the index exists;
+        ingestion creates it (upsert_chunks -> get_or_create_index).
+        """
+        if self._index is None and self.backend == "pinecone" and self.mode != "lexical":
+            self._index = get_pinecone_index(self.index_name)
+        return self._index
+
+    @property
+    def pc(self):
+        return get_pinecone_client()
 
     def get_or_create_index(self, index_name: str):
         """
-        Check if index exists, else create it.
+        Check if index exists, else create it. Checked once per process.
         """
+        if index_name in _ENSURED_INDEXES:
+            return
+        from pinecone import ServerlessSpec
         existing_indexes = [i.name for i in self.pc.list_indexes()]
         
         if index_name not in existing_indexes:
@@ -40,6 +142,7 @@ class VectorDB:
             print(f"Index '{index_name}' created successfully.")
         else:
             print(f"Index '{index_name}' already exists.")
+        _ENSURED_INDEXES.add(index_name)
 
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
@@ -49,64 +152,287 @@ class VectorDB:
             # OpenAI recommends replacing newlines with spaces for best results
             texts = [t.replace("\n", " ") for t in texts]
             
-            response = self.openai_client.embeddings.create(
-                input=texts,
-                model="text-embedding-3-small"
-            )
+            with embedding_slot():
+                response = self.openai_client.embeddings.create(
+                    input=texts,
+                    model="text-embedding-3-small"
+                )
             return [data.embedding for data in response.data]
         except Exception as e:
             print(f"Error generating embeddings: {e}")
             raise
 
-    def upsert_chunks(self, chunks: List[str], metadata_base: dict):
+    def _ensure_manifest_table(self):
+        global _MANIFEST_READY
+        if not _MANIFEST_READY:
+            IndexedChunk.__table__.create(bind=engine, checkfirst=True)
+            _MANIFEST_READY = True
+
+    def _existing_chunk_ids(self, session, filing_key: str) -> Dict[str, str]:
         """
-        Generate embeddings for chunks and upsert to Pinecone.
+        Chunk ids currently indexed for a filing, mapped to their content hash.
+        Filings indexed before the manifest existed are discovered by their positional ids,
+        {filing_key}_{n} (hash unknown).
         """
-        print(f"Generating embeddings for {len(chunks)} chunks...")
-        embeddings = self.generate_embeddings(chunks)
-        
-        vectors = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            # Create a unique ID for each chunk
-            chunk_id = f"{metadata_base['company']}_{metadata_base['year']}_{i}"
-            
-            # Prepare metadata
-            metadata = metadata_base.copy()
-            metadata["text"] = chunk
-            
-            vectors.append({
-                "id": chunk_id,
-                "values": embedding,
-                "metadata": metadata
-            })
-            
-        print(f"Upserting {len(vectors)} vectors to Pinecone...")
-        # Batch upsert (Pinecone recommends batches of 100-200 if vectors are large, 
-        # but for small text chunks, larger batches might work. We'll stick to a safe 100.)
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)
-            
+        rows = session.query(IndexedChunk).filter(IndexedChunk.filing_key == filing_key).all()
+        if rows:
+            return {row.chunk_id: row.content_hash for row in rows}
+
+        # The prefix alone also matches other filings whose key extends this one
+        # (AAPL_2026_Q1_<hash> under AAPL_2026); only the old positional format is this filing's
+        prefix = f"{filing_key}_"
+        legacy_pattern = re.compile(re.escape(prefix) + r"\d+")
+        candidates = set()
+        if self.index is not None:
+            for id_batch in self.index.list(prefix=prefix):
+                candidates.update(id_batch)
+        elif self.local_index is not None:
+            candidates.update(doc_id for doc_id in self.local_index.ids if doc_id.startswith(prefix))
+        if self.lexical_index is not None:
+            candidates.update(doc_id for doc_id in self.lexical_index.doc_ids if doc_id.startswith(prefix))
+        return {doc_id: None for doc_id in candidates if legacy_pattern.fullmatch(doc_id)}
+
+    def _delete_vectors(self, chunk_ids: List[str]):
+        if self.local_index is not None:
+            self.local_index.delete(chunk_ids)
+        elif self.index is not None:
+            # Pinecone caps deletes at 1000 ids per request
+            for i in range(0, len(chunk_ids), DELETE_BATCH_SIZE):
+                self.index.delete(ids=chunk_ids[i:i + DELETE_BATCH_SIZE])
+
+    def prepare_chunks(self, chunks: List[str], metadata_base: dict) -> dict:
+        """
+        First half of upsert_chunks: diff a filing's chunks against its manifest.
+
+        Chunk ids are derived from content hashes, so unchanged chunks keep their id across
+        re-ingests and duplicates collapse. Returns the sync plan: the new/changed chunks to embed
+        and add (`add_ids` / `add_texts`), the stale ones to delete, and a summary.
+        """
+        filing_key = metadata_base.get("filing_key") or f"{metadata_base['company']}_{metadata_base['year']}"
+        if self.backend == "pinecone" and self.mode != "lexical":
+            self.get_or_create_index(self.index_name)
+
+        new_chunks = {}
+        for chunk in chunks:
+            h = content_hash(chunk)
+            new_chunks.setdefault(f"{filing_key}_{h[:16]}", (h, chunk))
+
+        self._ensure_manifest_table()
+        with SessionLocal() as session:
+            existing = self._existing_chunk_ids(session, filing_key)
+        to_add = [chunk_id for chunk_id in new_chunks if existing.get(chunk_id) != new_chunks[chunk_id][0]]
+        to_delete = [chunk_id for chunk_id in existing if chunk_id not in new_chunks]
+
+        return {
+            "filing_key": filing_key,
+            "metadata": metadata_base,
+            "add_ids": to_add,
+            "add_texts": [new_chunks[chunk_id][1] for chunk_id in to_add],
+            "add_hashes": [new_chunks[chunk_id][0] for chunk_id in to_add],
+            "delete_ids": to_delete,
+            "summary": {"filing": filing_key, "added": len(to_add), "deleted": len(to_delete),
+                        "unchanged": len(new_chunks) - len(to_add)}
+        }
+
+    def write_chunks(self, plan: dict, embeddings: List[List[float]] = None) -> dict:
+        """
+        Second half of upsert_chunks: apply a plan from prepare_chunks. `embeddings` follow plan["add_ids"]
+        (None in lexical mode). Chunk text goes to the local ChunkStore and BM25 index, vectors to the
+        vector backend, and the manifest is updated last, only once the indexes hold the new state.
+        """
+        filing_key, to_add, to_delete = plan["filing_key"], plan["add_ids"], plan["delete_ids"]
+        add_texts = plan["add_texts"]
+        if not to_add and not to_delete:
+            return plan["summary"]
+
+        if to_add:
+            self.chunk_store.put_many(to_add, add_texts)
+
+        if self.lexical_index is not None:
+            # The BM25 index is one shared in-memory structure saved as a whole; one writer at a time
+            with _LOCAL_WRITE_LOCK:
+                print("Updating local BM25 index...")
+                self.lexical_index.remove_documents(to_delete)
+                self.lexical_index.add_documents(to_add, add_texts)
+                self.lexical_index.save()
+
+        if to_add and self.mode != "lexical":
+            if self.local_index is not None:
+                print(f"Adding {len(embeddings)} vectors to local index ({self.local_index.quantization})...")
+                self.local_index.add(to_add, embeddings)
+            else:
+                vectors = []
+                for chunk_id, embedding in zip(to_add, embeddings):
+                    vectors.append({
+                        "id": chunk_id,
+                        "values": embedding,
+                        # Filter fields only; the text itself is fetched from the ChunkStore
+                        "metadata": {k: v for k, v in plan["metadata"].items() if k != "filing_key"}
+                    })
+
+                print(f"Upserting {len(vectors)} vectors to Pinecone...")
+                # Batch upsert (Pinecone recommends batches of 100-200 if vectors are large, 
+                # but for small text chunks, larger batches might work. We'll stick to a safe 100.)
+                batch_size = 100
+                for i in range(0, len(vectors), batch_size):
+                    batch = vectors[i:i + batch_size]
+                    self.index.upsert(vectors=batch)
+
+        if to_delete:
+            print(f"Deleting {len(to_delete)} stale vectors...")
+            if self.mode != "lexical":
+                self._delete_vectors(to_delete)
+            self.chunk_store.delete_many(to_delete)
+            # Cached RAG answers built on these chunks are now stale
+            get_answer_cache().invalidate_chunks(to_delete)
+
+        # Record the new state only after the index has been updated
+        with SessionLocal() as session:
+            if to_delete:
+                session.query(IndexedChunk).filter(IndexedChunk.chunk_id.in_(to_delete)).delete(synchronize_session=False)
+            for chunk_id, h in zip(to_add, plan["add_hashes"]):
+                session.merge(IndexedChunk(chunk_id=chunk_id, filing_key=filing_key, content_hash=h))
+            session.commit()
+
+        return plan["summary"]
+
+    def upsert_chunks(self, chunks: List[str], metadata_base: dict) -> dict:
+        """
+        Sync a filing's chunks into the index.
+
+        Chunk ids are derived from content hashes and diffed against the filing's manifest:
+        only new chunks are embedded and upserted, chunks no longer produced are deleted,
+        and an unchanged filing moves no data at all.
+        Chunk text goes to the local ChunkStore, and is indexed in the local BM25 index
+        (unless in vector-only mode).
+        """
+        plan = self.prepare_chunks(chunks, metadata_base)
+        summary = plan["summary"]
+        if not plan["add_ids"] and not plan["delete_ids"]:
+            print(f"{plan['filing_key']}: {summary['unchanged']} chunks unchanged, nothing to sync.")
+            return summary
+        print(f"{plan['filing_key']}: {summary['added']} new/changed, {summary['deleted']} stale, {summary['unchanged']} unchanged chunks.")
+
+        embeddings = None
+        if plan["add_ids"] and self.mode != "lexical":
+            print(f"Generating embeddings for {len(plan['add_ids'])} chunks...")
+            embeddings = self.generate_embeddings(plan["add_texts"])
+
+        self.write_chunks(plan, embeddings)
         print("Upsert complete.")
+        return summary
 
-    def query_vectors(self, query_text: str, top_k: int = 3) -> List[str]:
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed query texts, serving repeats from the shared embedding cache.
+        All cache misses are embedded together in a single OpenAI call.
+        """
+        with span("embedding", queries=len(queries)) as attrs:
+            embeddings = [self.embedding_cache.get(q) for q in queries]
+            missing = {}
+            for i, (q, embedding) in enumerate(zip(queries, embeddings)):
+                if embedding is None:
+                    # Near-identical queries in the same batch share one embedding
+                    missing.setdefault(normalize_query(q), (q, []))[1].append(i)
+
+            attrs["cache"] = "miss" if missing else "hit"
+            attrs["embedded"] = len(missing)
+            if missing:
+                fresh = self.generate_embeddings([q for q, _ in missing.values()])
+                for (q, positions), embedding in zip(missing.values(), fresh):
+                    self.embedding_cache.put(q, embedding)
+                    for i in positions:
+                        embeddings[i] = embedding
+            return embeddings
+
+    def _vector_search(self, query_embedding: List[float], top_k: int) -> List[str]:
         """
-        Query the Pinecone index for similar text chunks.
+        Query the vector backend. Returns chunk ids ordered by similarity.
         """
-        # Generate embedding for the query
-        query_embedding = self.generate_embeddings([query_text])[0]
+        if self.local_index is not None:
+            with span("vector_query", backend="local", top_k=top_k):
+                return [doc_id for doc_id, _ in self.local_index.search(query_embedding, top_k=top_k)]
         
-        # Query Pinecone
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
+        # Query Pinecone (ids only: keeps responses small)
+        with span("vector_query", backend="pinecone", top_k=top_k):
+            results = self.index.query(
+                vector=query_embedding,
+                top_k=top_k,
+                include_metadata=False
+            )
         
-        matches = []
-        for match in results['matches']:
-            if match.get('metadata') and 'text' in match['metadata']:
-                matches.append(match['metadata']['text'])
-                
-        return matches
+        return [match['id'] for match in results['matches']]
+
+    def fetch_texts(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """
+        Batch-fetch chunk texts from the local ChunkStore.
+        Falls back to Pinecone metadata for legacy vectors ingested with inline text.
+        """
+        with span("chunk_fetch", chunks=len(chunk_ids)) as attrs:
+            texts = self.chunk_store.get_many(chunk_ids)
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in texts]
+
+            attrs["pinecone_fallback"] = len(missing)
+            if missing and self.index is not None:
+                response = self.index.fetch(ids=missing)
+                for chunk_id, vector in response.vectors.items():
+                    if vector.metadata and 'text' in vector.metadata:
+                        texts[chunk_id] = vector.metadata['text']
+            return texts
+
+    def _retrieve_ids(self, query_text: str, top_k: int, query_embedding: List[float] = None) -> List[str]:
+        if self.mode == "lexical":
+            with span("lexical_query", top_k=top_k):
+                return [doc_id for doc_id, _ in self.lexical_index.search(query_text, top_k=top_k)]
+
+        if query_embedding is None:
+            query_embedding = self.embed_queries([query_text])[0]
+
+        if self.mode == "vector" or len(self.lexical_index) == 0:
+            return self._vector_search(query_embedding, top_k)
+
+        # Pull a deeper candidate pool from each retriever so fusion has something to re-order
+        candidates = max(top_k * 4, 20)
+        vector_hits = self._vector_search(query_embedding, candidates)
+        with span("lexical_query", top_k=candidates):
+            lexical_hits = [doc_id for doc_id, _ in self.lexical_index.search(query_text, top_k=candidates)]
+        return reciprocal_rank_fusion([vector_hits, lexical_hits])[:top_k]
+
+    def query_chunks(self, query_text: str, top_k: int = 3, query_embedding: List[float] = None) -> List[Tuple[str, str]]:
+        """
+        Like query_vectors, but returns (chunk_id, text) pairs.
+        """
+        chunk_ids = self._retrieve_ids(query_text, top_k, query_embedding)
+        texts = self.fetch_texts(chunk_ids)
+        return [(chunk_id, texts[chunk_id]) for chunk_id in chunk_ids if chunk_id in texts]
+
+    def query_vectors(self, query_text: str, top_k: int = 3) -> List[str]:
+        """
+        Query for similar text chunks.
+        In hybrid mode, Pinecone and BM25 candidates are fused with reciprocal-rank fusion.
+        """
+        return [text for _, text in self.query_chunks(query_text, top_k)]
+
+    def query_chunks_many(self, queries: List[str], top_k: int = 3, query_embeddings: List[List[float]] = None) -> List[List[Tuple[str, str]]]:
+        """
+        Batched query_chunks: one embedding call for all queries (unless embeddings are passed in),
+        index lookups run concurrently, one text fetch for every chunk. Results follow the query order.
+        """
+        if not queries:
+            return []
+
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries) if self.mode != "lexical" else [None] * len(queries)
+
+        with ThreadPoolExecutor(max_workers=min(QUERY_CONCURRENCY, len(queries))) as pool:
+            id_lists = list(pool.map(lambda args: self._retrieve_ids(args[0], top_k, args[1]), zip(queries, query_embeddings)))
+
+        # One local batch fetch for every chunk across all queries
+        texts = self.fetch_texts(list(dict.fromkeys(chunk_id for ids in id_lists for chunk_id in ids)))
+        return [[(chunk_id, texts[chunk_id]) for chunk_id in ids if chunk_id in texts] for ids in id_lists]
+
+    def query_vectors_many(self, queries: List[str], top_k: int = 3) -> List[List[str]]:
+        """
+        Batched query_vectors. Results are returned in the same order as the queries.
+        """
+        return [[text for _, text in chunks] for chunks in self.query_chunks_many(queries, top_k)]
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import Counter
+from typing import List
+from tracing import span, run_in_executor
+
+# Off by default: on serverless the instance may be frozen between requests, so background work is wasted
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() in ("1", "true", "yes")
+# Hot universe; empty means the seed list (repository.SEED_COMPANIES)
+WARMUP_TICKERS = [t.strip().upper() for t in os.getenv("WARMUP_TICKERS", "").split(",") if t.strip()]
+WARMUP_YEARS = [int(y) for y in os.getenv("WARMUP_YEARS", "").split(",") if y.strip()]
+# Seconds to wait after startup before warming, so the first real requests aren't competing with it
+WARMUP_DELAY = float(os.getenv("WARMUP_DELAY", "0"))
+WARMUP_TOP_QUERIES = int(os.getenv("WARMUP_TOP_QUERIES", "50"))
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "4"))
+
+# JSONL log of RAG questions (one {"ts", "query"} per line); the warm-up embeds the most frequent ones
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH")
+# Only the tail of the log is read, so old traffic ages out
+QUERY_LOG_TAIL = int(os.getenv("QUERY_LOG_TAIL", "100000"))
+
+_log_lock = threading.Lock()
+
+def append_query_log(query: str, path: str = None):
+    """
+    Record a question for future warm-ups. No-op unless QUERY_LOG_PATH is set; never raises.
+    """
+    path = path or QUERY_LOG_PATH
+    if not path:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "query": query}) + "\n"
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e:
+        print(f"Query log write failed: {e}")
+
+def top_logged_queries(path: str, n: int, tail: int = QUERY_LOG_TAIL) -> List[str]:
+    """
+    The `n` most frequent questions in the last `tail` lines of the log (plain text or JSONL),
+    counting near-identical phrasings together.
+    """
+    from embedding_cache import normalize_query
+
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()[-tail:]
+
+    counts = Counter()
+    first_seen = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            query = json.loads(line)["query"] if line.startswith("{") else line
+        except (ValueError, KeyError):
+            continue
+        key = normalize_query(query)
+        counts[key] += 1
+        first_seen.setdefault(key, query)
+    return [first_seen[key] for key, _ in counts.most_common(n)]
+
+def _import_pipeline():
+    # The first /chat would otherwise pay these imports (see main.py)
+    import orchestrator  # noqa: F401
+    import batch  # noqa: F401
+    return "loaded"
+
+async def warm_connections(n: int = WARMUP_DB_CONNECTIONS) -> int:
+    """
+    Open `n` pooled connections at once so the async engine's pool is populated before traffic arrives.
+    """
+    from sqlalchemy import text
+    from database import get_async_sessionmaker
+
+    session_factory = get_async_sessionmaker()
+
+    async def ping():
+        async with session_factory() as session:
+            await session.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(n)))
+    return n
+
+async def warm_facts(tickers: List[str], years: List[int]) -> dict:
+    """
+    Fetch every metric the cache can hold for the hot tickers as one query plan: cached cells come from one
+    DB query and each company costs at most one companyfacts download, through the shared SEC rate limiter.
+    Cells a company doesn't report are recorded as such, so a warm database means no downloads at all.
+    """
+    from agents import AnalysisAgent, build_query_plan, DEFAULT_COMPARISON_YEARS
+    from repository import AsyncFinancialDataRepository, STORED_METRICS
+    from retriever import SECDataRetriever
+
+    plan = build_query_plan({
+        "type": "metric",
+        "companies": tickers,
+        "metrics": STORED_METRICS,
+        "years": years or DEFAULT_COMPARISON_YEARS
+    })
+    repo = AsyncFinancialDataRepository(SECDataRetriever())
+    cached, values = None, {}
+    async for values, pending in AnalysisAgent().stream_plan_data(repo, plan):
+        if cached is None:
+            cached = len(values)
+    return {"companies": len(plan["companies"]), "cells": len(values), "fetched": len(values) - (cached or 0)}
+
+def warm_vector_stack(queries: List[str]) -> dict:
+    """
+    Build the OpenAI/Pinecone clients and embed the most frequent logged questions into the shared embedding cache.
+    Needs a server-side OPENAI_API_KEY (requests normally bring their own key).
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return {"skipped": "OPENAI_API_KEY not set"}
+
+    from vector_store import VectorDB
+
+    vector_db = VectorDB(api_key=api_key)
+    if vector_db.mode == "lexical":
+        return {"skipped": "lexical retrieval mode"}
+    # Resolves the Pinecone index host and opens its connection pool
+    if vector_db.index is not None:
+        vector_db.index.describe_index_stats()
+
+    misses = vector_db.embedding_cache.misses
+    if queries:
+        vector_db.embed_queries(queries)
+    return {"queries": len(queries), "embedded": vector_db.embedding_cache.misses - misses}
+
+async def run_warmup() -> dict:
+    """
+    Background warm-up started from main.py. Each step is independent: a failure is logged and the rest carry on.
+    """
+    if WARMUP_DELAY:
+        await asyncio.sleep(WARMUP_DELAY)
+
+    started = time.perf_counter()
+    summary = {}
+
+    async def step(name, make_coro):
+        try:
+            with span(f"warmup_{name}"):
+                summary[name] = await make_coro()
+        except Exception as e:
+            print(f"Warm-up step '{name}' failed: {e}")
+            summary[name] = {"error": str(e)}
+
+    await step("imports", lambda: run_in_executor(_import_pipeline))
+
+    tickers = WARMUP_TICKERS
+    if not tickers:
+        from repository import SEED_COMPANIES
+        tickers = [c["ticker"] for c in SEED_COMPANIES]
+    queries = await run_in_executor(top_logged_queries, QUERY_LOG_PATH, WARMUP_TOP_QUERIES)
+
+    # SEC, the database pool and OpenAI/Pinecone are independent; warm them side by side
+    await asyncio.gather(
+        step("connections", warm_connections),
+        step("facts", lambda: warm_facts(tickers, WARMUP_YEARS)),
+        step("vector", lambda: run_in_executor(warm_vector_stack, queries))
+    )
+
+    summary["elapsed_s"] = round(time.perf_counter() - started, 2)
+    print(f"Warm-up complete: {summary}")
+    return summary
@@ -181,20 +181,43 @@ const ChatInterface = () => {
                 return;
             }
 
+            if (response.status === 503) {
+                // Admission control turned the request away: the body is {"detail": ...}, not an event stream
+                const body = await response.json().catch(() => ({}));
+                const retryAfter = response.headers.get('Retry-After');
+                setMessages(prev => prev.map(msg =>
+                    msg.id === aiMessageId
+                        ? {
+                            ...msg,
+                            content: `The service is busy right now (${body.detail || 'at capacity'}). Please retry${retryAfter ? ` in ${retryAfter}s` : ' shortly'}.`,
+                            isError: true,
+                            isDone: true
+                        }
+                        : msg
+                ));
+                setIsLoading(false);
+                return;
+            }
+
+            if (!response.ok) throw new Error(`Server error (${response.status})`);
             if (!response.body) throw new Error('No readable stream');
 
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
             let done = false;
+            let buffer = '';
 
             while (!done) {
                 const { value, done: doneReading } = await reader.read();
                 done = doneReading;
-                const chunkValue = decoder.decode(value);
+                buffer += decoder.decode(value, { stream: !done });
 
                 // Split by double newline as per standard SSE or just JSON objects
-                // Our backend sends `json + "\n\n"`.
-                const lines = chunkValue.split('\n\n').filter(Boolean);
+                // Our backend sends `json + "\n\n"`. Token events are small, so keep any
+                // partial event at the end of a read for the next one.
+                const parts = buffer.split('\n\n');
+                buffer = done ? '' : parts.pop();
+                const lines = parts.filter(Boolean);
 
                 for (const line of lines) {
                     try {
@@ -208,6 +231,18 @@ const ChatInterface = () => {
                                     ...msg,
                                     thinkingSteps: [...msg.thinkingSteps, data.message]
                                 };
+                            } else if (data.type === 'token') {
+                                return {
+                                    ...msg,
+                                    content: msg.content + data.data
+                                };
+                            } else if (data.type === 'partial') {
+                                // Comparison chart with some companies still loading
+                                return {
+                                    ...msg,
+                                    content: data.data,
+                                    isChart: true
+                                };
                             } else if (data.type === 'result') {
                                 return {
                                     ...msg,